@@ -0,0 +1,105 @@
+"""Scan response shaping and fast, gzip-negotiated JSON serialization"""
+from typing import Dict, List
+import asyncio
+import gzip
+import json
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard json module
+    orjson = None
+
+
+GROUP_KEYS = ("exact_duplicates", "superset_subset_duplicates", "near_duplicates")
+INTERNAL_FIELDS = ("fingerprints",)  # Only needed during detection
+GZIP_MIN_SIZE = 1024
+
+
+def strip_file_fields(files: List[Dict], include_text: bool = False) -> None:
+    """Drop internal fields (and extracted text unless requested) from file dicts, in place"""
+    for file in files:
+        for field in INTERNAL_FIELDS:
+            file.pop(field, None)
+        if not include_text:
+            file.pop("extracted_text", None)
+
+
+def compact_results(results: Dict) -> Dict:
+    """
+    Normalize a find_all_duplicates result into a file table plus index references
+
+    Every file that appears in a group is listed once in "files"; groups refer to it
+    by position ("primary" and "duplicates" instead of "primary_file" and
+    "duplicate_files"). Files that are in no group are not listed.
+    """
+    files = []
+    positions = {}
+
+    def ref(file: Dict) -> int:
+        if file["id"] not in positions:
+            positions[file["id"]] = len(files)
+            files.append(file)
+        return positions[file["id"]]
+
+    compact = {key: value for key, value in results.items() if key not in GROUP_KEYS}
+    for key in GROUP_KEYS:
+        groups = []
+        for group in results.get(key, []):
+            entry = {k: v for k, v in group.items() if k not in ("primary_file", "duplicate_files")}
+            entry["primary"] = ref(group["primary_file"])
+            entry["duplicates"] = [ref(f) for f in group["duplicate_files"]]
+            groups.append(entry)
+        compact[key] = groups
+
+    compact["format"] = "compact"
+    compact["files"] = files
+    return compact
+
+
+def _dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+
+
+def _encode(content, use_gzip: bool, level: int):
+    body = _dumps(content)
+    if use_gzip and len(body) >= GZIP_MIN_SIZE:
+        return gzip.compress(body, compresslevel=level), True
+    return body, False
+
+
+async def json_response(content, request: Request, gzip_level: int = 5) -> Response:
+    """
+    Serialize content (orjson when installed) and gzip it if the client accepts gzip
+
+    Serialization and compression run in a worker thread: scan results can be tens of
+    MB, which would otherwise stall every other request on the event loop.
+    """
+    accepts_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    body, compressed = await asyncio.to_thread(_encode, content, accepts_gzip, gzip_level)
+
+    headers = {"Vary": "Accept-Encoding"}
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+
+def encode_json_gzip(content, level: int = 5) -> bytes:
+    """Serialized, gzip-compressed content for storing (see gzipped_json_response)"""
+    return gzip.compress(_dumps(content), compresslevel=level)
+
+
+async def gzipped_json_response(body: bytes, request: Request) -> Response:
+    """Serve stored gzip JSON as-is to clients that accept gzip, decompressed otherwise"""
+    headers = {"Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = await asyncio.to_thread(gzip.decompress, body)
+    return Response(content=body, media_type="application/json", headers=headers)
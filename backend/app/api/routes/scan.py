@@ -1,21 +1,56 @@
 """Scan endpoints - stateless, no database"""
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import asyncio
+import json
+import time
 
+from app.api.responses import (
+    compact_results,
+    encode_json_gzip,
+    gzipped_json_response,
+    json_response,
+    strip_file_fields,
+)
 from app.scanner.google_drive_client import GoogleDriveClient
-from app.scanner.hasher import compute_sha256_optimized
-from app.scanner.duplicate_finder import find_all_duplicates
-from app.scanner.text_extractor import extract_text_from_file
+from app.scanner.local_fs_client import LocalFileSystemClient, scan_local_files
+from app.scanner.fingerprint import winnow_fingerprints
+from app.scanner.scan_index import get_scan_index
+from app.scanner.job_store import get_job_store
+from app.scanner.scan_budget import ScanBudget, ScanStopped, effective_limit
+from app.scanner.scheduler import get_scheduler, tenant_key
+from app.config import settings
+from app.scanner.hasher import (
+    confirm_hash_buckets,
+    hash_async_stream,
+    hash_file_content,
+    tiered_content_hashes,
+)
+from app.scanner.duplicate_finder import iter_duplicate_stages, summarize_duplicates
+from app.scanner.text_extractor import extract_text_from_file, is_text_extractable
 
 router = APIRouter()
 
 
-class ScanRequest(BaseModel):
+class ScanLimits(BaseModel):
+    # Per-scan budgets; can only tighten the server-wide SCAN_MAX_* limits
+    max_files: Optional[int] = None
+    max_bytes: Optional[int] = None
+    max_text_bytes: Optional[int] = None
+    max_seconds: Optional[float] = None
+
+
+class ScanRequest(ScanLimits):
     google_token: str
     folder_ids: list[str] = []  # List of folder IDs to scan
     include_subfolders: bool = True  # Whether to recursively scan subfolders
+    listing_mode: Optional[str] = None  # "folders" or "flat"; defaults to DRIVE_LISTING_MODE
+    response_format: str = "full"  # "full" (nested file dicts) or "compact" (file table + indexes)
+    include_text: bool = False  # Include each file's extracted_text in the response
+    tenant_id: Optional[str] = None  # Fair-share key; defaults to one derived from the token
 
 
 @router.get("/test-token")
@@ -45,70 +80,145 @@ async def test_token(google_token: str):
         return {"error": f"Test failed: {str(e)}"}
 
 
-@router.post("/scan")
-async def scan_files(request: ScanRequest):
+async def process_drive_files(
+    drive: GoogleDriveClient,
+    files: List[Dict],
+    progress: Optional[Callable[[Dict], None]] = None,
+    budget: Optional[ScanBudget] = None,
+    tenant: Optional[str] = None
+) -> Tuple[List[Dict], List[Dict]]:
     """
-    Scan Google Drive files and find duplicates - all in memory, no database
+    Hash and extract text for listed files (index lookup, tiered hashing, downloads)
+    
+    Args:
+        drive: Authenticated Google Drive client
+        files: File dicts from list_all_files
+        progress: Optional callback receiving progress event dicts
+        budget: Optional per-scan limits; once exhausted, downloads stop and the
+            files processed so far are returned
+        tenant: Tenant key; downloads then draw from the scheduler's shared pool of
+            download slots in weighted fair order
     
-    Returns results immediately
+    Returns:
+        (processed_files, errors)
     """
-    try:
-        # Initialize Google Drive client
-        drive = GoogleDriveClient(request.google_token)
-        
-        # Get files from selected folders
-        print("=" * 50)
-        print("Starting Google Drive scan...")
-        print(f"Token preview: {request.google_token[:20]}...")
-        print(f"Selected folders: {request.folder_ids}")
-        print(f"Include subfolders: {request.include_subfolders}")
-        
-        if not request.folder_ids:
-            raise HTTPException(status_code=400, detail="No folders selected. Please select at least one folder to scan.")
-        
-        files = await drive.list_all_files(
-            folder_ids=request.folder_ids,
-            include_subfolders=request.include_subfolders
+    # Process files: download, hash, extract text
+    processed_files = []
+    errors = []
+    total = len(files)
+    
+    # Reuse results for files unchanged since a previous scan (same ID, modified time, size, ETag)
+    scan_index = get_scan_index()
+    # "full": hashes cover whole files (earlier entries sampled files over 10MB)
+    index_provider = f"google_drive:{settings.hash_algorithm}:full"
+    if scan_index:
+        cached = scan_index.lookup_many(index_provider, files)
+        try:
+            for file in files:
+                if file["id"] in cached:
+                    if budget:
+                        # Reused text is held in memory just like freshly extracted text
+                        budget.check()
+                        budget.reserve_text(len(cached[file["id"]]["extracted_text"] or ""))
+                    file.update(cached[file["id"]])
+                    processed_files.append(file)
+        except ScanStopped:
+            pass  # Over budget: the files reused so far are the result
+        files = [f for f in files if f["id"] not in cached]
+        print(f"Scan index: {len(processed_files)} unchanged files reused, {len(files)} to download")
+    new_files_start = len(processed_files)
+    
+    scheduler = get_scheduler() if tenant else None
+    
+    async def limited(download):
+        if scheduler:
+            async with scheduler.download_slot(tenant):
+                return await download()
+        return await download()
+    
+    async def limited_stream(chunks):
+        if scheduler:
+            async with scheduler.download_slot(tenant):
+                async for chunk in chunks:
+                    yield chunk
+        else:
+            async for chunk in chunks:
+                yield chunk
+    
+    # Large files without extractable text only need a hash: use size / Range-sampled
+    # tiers so most of them are never downloaded in full
+    tiered_files = [
+        f for f in files
+        if f.get("size", 0) >= settings.tiered_hash_min_size
+        and not is_text_extractable(f.get("mime_type", ""), f.get("name", ""))
+    ]
+    if tiered_files:
+        print(f"Tiered hashing {len(tiered_files)} large non-text files...")
+        tiered_ids = {f["id"] for f in tiered_files}
+        files = [f for f in files if f["id"] not in tiered_ids]
+        fetch_range = lambda f, start, end: limited(lambda: drive.get_file_range(f["id"], start, end))
+        stream_content = lambda f: limited_stream(drive.stream_file_content(f["id"]))
+        if budget:
+            # Count sampled ranges and full streams against the download budget
+            fetch_range = lambda f, start, end: budget.fetch(
+                lambda: limited(lambda: drive.get_file_range(f["id"], start, end))
+            )
+            stream_content = lambda f: budget.stream(limited_stream(drive.stream_file_content(f["id"])))
+        hashes = await tiered_content_hashes(
+            tiered_files,
+            fetch_range=fetch_range,
+            stream_content=stream_content,
+            algorithm=settings.hash_algorithm,
+            # Reused files were hashed in full: new files of the same size may copy them
+            known_sizes={f.get("size", 0) for f in processed_files[:new_files_start]}
         )
-        print(f"Found {len(files)} files total")
-        print("=" * 50)
-        
-        if len(files) == 0:
-            return {
-                "status": "completed",
-                "total_files": 0,
-                "exact_duplicates": [],
-                "near_duplicates": [],
-                "total_duplicate_groups": 0,
-                "total_duplicate_files": 0,
-                "total_storage_savings_bytes": 0,
-                "message": "No files found. Make sure you have files in your Google Drive."
-            }
-        
-        # Process files: download, hash, extract text
-        processed_files = []
-        errors = []
-        
-        print(f"Processing {len(files)} files...")
-        for i, file in enumerate(files):
+        for file in tiered_files:
+            if budget and budget.stopped and hashes[file["id"]] is None:
+                continue  # Not hashed because the budget ran out: leave it out of the results
+            file["content_hash"] = hashes[file["id"]]
+            file["extracted_text"] = None
+            processed_files.append(file)
+    
+    print(f"Processing {len(files)} files...")
+    downloaded = [None] * len(files)
+    pending = iter(enumerate(files))
+    done_count = 0
+    
+    def report_progress() -> None:
+        if progress:
+            progress({"event": "progress", "stage": "processing", "processed": total - len(files) + done_count, "total": total})
+    
+    async def download_worker():
+        # Workers pull files in listing order; several downloads are in flight per scan
+        nonlocal done_count
+        for i, file in pending:
             try:
                 print(f"Processing file {i+1}/{len(files)}: {file.get('name', 'Unknown')} ({file.get('size', 0)} bytes)")
                 
                 # Download file content
-                content = await drive.get_file_content(file["id"])
+                if budget:
+                    budget.reserve_download(file.get("size", 0))
+                content = await limited(lambda: drive.get_file_content(file["id"]))
+                if budget:
+                    budget.charge_download(len(content))
                 
-                # Compute optimized hash (faster for large files)
-                file["content_hash"] = compute_sha256_optimized(content)
+                # Hash the whole content on the hashing thread pool
+                file["content_hash"] = await hash_file_content(content, settings.hash_algorithm)
                 
-                # Extract text for content-based duplicate detection
-                extracted_text = extract_text_from_file(
+                # Extract text for content-based duplicate detection (off the event loop,
+                # so other downloads keep flowing)
+                extracted_text = await asyncio.to_thread(
+                    extract_text_from_file,
                     content,
                     file.get("mime_type", ""),
                     file.get("name", "")
                 )
                 
                 if extracted_text:
+                    if budget:
+                        budget.reserve_text(len(extracted_text))
                     file["extracted_text"] = extracted_text
+                    file["fingerprints"] = await asyncio.to_thread(winnow_fingerprints, extracted_text)
                     print(f"  ✅ Extracted {len(extracted_text)} characters of text")
                 else:
                     file["extracted_text"] = None
@@ -118,8 +228,10 @@ async def scan_files(request: ScanRequest):
                 # Only keep hash and extracted text
                 del content
                 
-                processed_files.append(file)
+                downloaded[i] = file
                 
+            except ScanStopped:
+                return
             except Exception as e:
                 # Skip files we can't access
                 error_msg = f"Error processing {file.get('name', 'Unknown')}: {str(e)}"
@@ -128,27 +240,457 @@ async def scan_files(request: ScanRequest):
                     "file_name": file.get("name", "Unknown"),
                     "error": str(e)
                 })
-                continue
-        
-        print(f"Successfully processed {len(processed_files)} files")
-        if errors:
-            print(f"Errors processing {len(errors)} files")
-        
-        # Find duplicates
-        results = find_all_duplicates(processed_files)
-        
+            finally:
+                done_count += 1
+                report_progress()
+    
+    report_progress()  # Reused and tier-hashed files are already done
+    workers = max(1, min(settings.scan_download_concurrency, len(files)))
+    await asyncio.gather(*(download_worker() for _ in range(workers)))
+    processed_files.extend(f for f in downloaded if f is not None)
+    
+    # Index new results before bucket confirmation so stored hashes stay in one algorithm
+    if scan_index:
+        scan_index.store_many(index_provider, processed_files[new_files_start:])
+    
+    # Non-cryptographic bucket hashes (xxhash) are confirmed with SHA-256 where they collide
+    await confirm_hash_buckets(
+        processed_files,
+        rehash=lambda f: hash_async_stream(drive.stream_file_content(f["id"])),
+        algorithm=settings.hash_algorithm
+    )
+    
+    return processed_files, errors
+
+
+async def scan_response(results: Dict, files: List[Dict], response_format: str, include_text: bool, raw_request: Request):
+    """Shape scan results as requested and serialize them (orjson, gzip when accepted)"""
+    strip_file_fields(files, include_text)
+    if response_format == "compact":
+        results = compact_results(results)
+    return await json_response(results, raw_request, gzip_level=settings.response_gzip_level)
+
+
+async def run_drive_scan(
+    request: ScanRequest,
+    on_event: Optional[Callable[[Dict], None]] = None,
+    budget: Optional[ScanBudget] = None
+) -> Tuple[Dict, List[Dict]]:
+    """
+    List, process and compare the selected Drive folders
+    
+    The scan first waits for admission by the scheduler (reporting its queue position
+    through on_event). With a budget, the scan stops early once a limit is hit or it
+    is cancelled; the result then covers only what was processed and is flagged "partial".
+    
+    Args:
+        request: Scan parameters
+        on_event: Optional callback receiving event dicts as the scan runs: "progress"
+            (queued, listing, listed, processing, processed, comparing), then each
+            duplicate "group" as soon as it is final and a "stage_complete" per stage
+        budget: Optional per-scan limits and cancellation
+    
+    Returns:
+        (scan result dict, processed file dicts referenced by its groups)
+    """
+    tenant = tenant_key(request.google_token, request.tenant_id)
+    last_position = None
+    
+    def on_queued(position: int) -> None:
+        nonlocal last_position
+        if budget and budget.should_stop():
+            raise ScanStopped(budget.stopped_reason)  # Cancelled (or timed out) while queued
+        if on_event and position != last_position:
+            on_event({"event": "progress", "stage": "queued", "position": position})
+        last_position = position
+    
+    try:
+        async with get_scheduler().admitted(tenant, on_queued=on_queued):
+            if budget:
+                budget.start()  # Time spent queued does not count against max_seconds
+            return await _scan_drive(request, on_event, budget, tenant)
+    except ScanStopped:
+        results = {
+            "status": "cancelled" if budget.stopped_reason == "cancelled" else "completed",
+            **summarize_duplicates([], {}),
+            "files_processed": 0,
+            "files_failed": 0,
+            "errors": [],
+            "partial": True,
+            "stopped_reason": budget.reason,
+            "usage": budget.usage()
+        }
+        return results, []
+
+
+async def _scan_drive(
+    request: ScanRequest,
+    on_event: Optional[Callable[[Dict], None]],
+    budget: Optional[ScanBudget],
+    tenant: str
+) -> Tuple[Dict, List[Dict]]:
+    emit = on_event or (lambda event: None)
+    
+    # Initialize Google Drive client
+    drive = GoogleDriveClient(request.google_token)
+    emit({"event": "progress", "stage": "listing"})
+    
+    # Get files from selected folders
+    print("=" * 50)
+    print("Starting Google Drive scan...")
+    print(f"Token preview: {request.google_token[:20]}...")
+    print(f"Selected folders: {request.folder_ids}")
+    print(f"Include subfolders: {request.include_subfolders}")
+    
+    files = await drive.list_all_files(
+        folder_ids=request.folder_ids,
+        include_subfolders=request.include_subfolders,
+        mode=request.listing_mode
+    )
+    print(f"Found {len(files)} files total")
+    print("=" * 50)
+    if budget:
+        files = budget.limit_files(files)
+    emit({"event": "progress", "stage": "listed", "total": len(files)})
+    
+    if len(files) == 0:
         return {
             "status": "completed",
-            **results,
-            "files_processed": len(processed_files),
-            "files_failed": len(errors),
-            "errors": errors[:10] if errors else []  # Return first 10 errors
-        }
-        
+            "total_files": 0,
+            "exact_duplicates": [],
+            "near_duplicates": [],
+            "total_duplicate_groups": 0,
+            "total_duplicate_files": 0,
+            "total_storage_savings_bytes": 0,
+            "message": "No files found. Make sure you have files in your Google Drive."
+        }, []
+    
+    processed_files, errors = [], []
+    if not (budget and budget.should_stop()):
+        processed_files, errors = await process_drive_files(drive, files, on_event, budget, tenant)
+    
+    print(f"Successfully processed {len(processed_files)} files")
+    if errors:
+        print(f"Errors processing {len(errors)} files")
+    emit({
+        "event": "progress",
+        "stage": "processed",
+        "files_processed": len(processed_files),
+        "files_failed": len(errors)
+    })
+    
+    # Find duplicates off the event loop so concurrent scans share inference batches;
+    # each stage's groups are final (and emitted) as soon as the stage finishes
+    emit({"event": "progress", "stage": "comparing", "total": len(processed_files)})
+    stages = {}
+    stage_iter = iter_duplicate_stages(processed_files)
+    while True:
+        item = await asyncio.to_thread(next, stage_iter, None)
+        if item is None:
+            break
+        stage, groups = item
+        stages[stage] = groups
+        for group in groups:
+            emit({"event": "group", "stage": stage, "group": group})
+        emit({"event": "stage_complete", "stage": stage, "groups": len(groups)})
+        if budget and stage != "near" and budget.should_stop():
+            print(f"Stopping duplicate detection after the {stage} stage")
+            break
+    
+    results = {
+        "status": "completed",
+        **summarize_duplicates(processed_files, stages),
+        "files_processed": len(processed_files),
+        "files_failed": len(errors),
+        "errors": errors[:10] if errors else []  # Return first 10 errors
+    }
+    if budget:
+        results["status"] = "cancelled" if budget.stopped_reason == "cancelled" else "completed"
+        results["partial"] = budget.partial
+        results["stopped_reason"] = budget.reason
+        results["usage"] = budget.usage()
+    return results, processed_files
+
+
+def _check_scan_request(request: ScanRequest) -> None:
+    if not request.folder_ids:
+        raise HTTPException(status_code=400, detail="No folders selected. Please select at least one folder to scan.")
+    if request.response_format not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="response_format must be 'full' or 'compact'")
+    if request.listing_mode not in (None, "folders", "flat"):
+        raise HTTPException(status_code=400, detail="listing_mode must be 'folders' or 'flat'")
+
+
+def _make_budget(request: ScanLimits, job_id: str) -> ScanBudget:
+    """Budget from server limits tightened by the request, cancellable through the job store"""
+    store = get_job_store()
+    return ScanBudget(
+        max_files=effective_limit(settings.scan_max_files, request.max_files),
+        max_bytes=effective_limit(settings.scan_max_bytes, request.max_bytes),
+        max_text_bytes=effective_limit(settings.scan_max_text_bytes, request.max_text_bytes),
+        max_seconds=effective_limit(settings.scan_max_seconds, request.max_seconds),
+        cancel_check=lambda: store.is_cancel_requested(job_id)
+    )
+
+
+def _register_scan() -> str:
+    """Record a scan in the job store (server-generated ID) so it can be cancelled from any worker"""
+    return get_job_store().create(status="running")
+
+
+@router.post("/scan")
+async def scan_files(request: ScanRequest, raw_request: Request):
+    """
+    Scan Google Drive files and find duplicates - all in memory, no database
+    
+    Returns results immediately. Extracted text is left out unless include_text is set;
+    response_format="compact" lists each file once and refers to it by index from groups.
+    Scans that hit a budget return what was processed so far with "partial": true.
+    The scan_id is only returned with the result, so a scan that must be cancellable
+    should use /scan/stream (whose first event carries it) or /scan/jobs instead.
+    """
+    _check_scan_request(request)
+    scan_id = _register_scan()
+    store = get_job_store()
+    
+    try:
+        results, processed_files = await run_drive_scan(request, budget=_make_budget(request, scan_id))
+        store.finish(scan_id, None, status=results["status"])
+        return await scan_response(
+            {"scan_id": scan_id, **results}, processed_files, request.response_format, request.include_text, raw_request
+        )
     except Exception as e:
         import traceback
         error_detail = str(e)
         traceback.print_exc()
+        store.fail(scan_id, f"Scan failed: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"Scan failed: {error_detail}")
+
+
+# Background scan jobs: status lives in the shared job store, so any worker can answer polls
+_job_tasks = set()
+
+
+async def _run_scan_job(job_id: str, request: ScanRequest) -> None:
+    store = get_job_store()
+    last_write = 0.0
+    
+    def progress(event: Dict) -> None:
+        # Throttle progress writes; every worker polling the job reads them from SQLite
+        nonlocal last_write
+        if event["event"] != "progress":
+            return  # Groups are part of the stored result
+        now = time.monotonic()
+        if now - last_write >= 1.0 or event.get("stage") != "processing":
+            last_write = now
+            status = "queued" if event.get("stage") == "queued" else "running"
+            store.update(job_id, status=status, progress=event)
+    
+    try:
+        results, processed_files = await run_drive_scan(request, progress, _make_budget(request, job_id))
+        strip_file_fields(processed_files, request.include_text)
+        if request.response_format == "compact":
+            results = compact_results(results)
+        body = await asyncio.to_thread(encode_json_gzip, {"scan_id": job_id, **results}, settings.response_gzip_level)
+        store.finish(job_id, body, status=results["status"])
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        store.fail(job_id, f"Scan failed: {str(e)}")
+
+
+@router.post("/scan/jobs", status_code=202)
+async def create_scan_job(request: ScanRequest):
+    """
+    Start a scan in the background and return its job ID immediately
+    
+    Poll GET /scan/jobs/{job_id} for status/progress and fetch GET
+    /scan/jobs/{job_id}/result once it is completed. Works across API workers.
+    """
+    _check_scan_request(request)
+    
+    job_id = _register_scan()
+    get_job_store().update(job_id, status="queued")
+    task = asyncio.create_task(_run_scan_job(job_id, request))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/scan/queue")
+async def scan_queue():
+    """Running / queued scans and download slot usage of this API worker"""
+    return get_scheduler().stats()
+
+
+@router.get("/scan/jobs/{job_id}")
+async def get_scan_job(job_id: str):
+    """Status and latest progress event of a background scan"""
+    job = get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan job.")
+    return job
+
+
+@router.get("/scan/jobs/{job_id}/result")
+async def get_scan_job_result(job_id: str, raw_request: Request):
+    """Result of a completed background scan (same body as /scan)"""
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan job.")
+    if job["status"] not in ("completed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Scan job is {job['status']}, no result available.")
+    body = store.get_result(job_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="This scan returned its result directly; nothing is stored.")
+    return await gzipped_json_response(body, raw_request)
+
+
+@router.post("/scan/jobs/{job_id}/cancel")
+async def cancel_scan_job(job_id: str):
+    """
+    Cancel a running scan (background job or stream) by the ID it was given
+    
+    The scan stops at its next check and returns partial results: no new download
+    starts and tier-hashing streams stop at their next chunk, but a whole-file download
+    already under way still completes. Detection checks between stages, so a stage
+    that is running finishes first and only the remaining ones are skipped.
+    """
+    store = get_job_store()
+    if store.request_cancel(job_id):
+        return {"job_id": job_id, "status": "cancelling"}
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan job.")
+    raise HTTPException(status_code=409, detail=f"Scan job is already {job['status']}.")
+
+
+def _without_fields(value, fields: Tuple[str, ...]):
+    """Copy of an event with the given keys removed at any depth (files are still in use)"""
+    if isinstance(value, dict):
+        return {k: _without_fields(v, fields) for k, v in value.items() if k not in fields}
+    if isinstance(value, list):
+        return [_without_fields(v, fields) for v in value]
+    return value
+
+
+def _format_event(event: Dict, stream_format: str, include_text: bool = False) -> str:
+    """Serialize one event as an NDJSON line or a Server-Sent Events message"""
+    fields = ("fingerprints",) if include_text else ("fingerprints", "extracted_text")
+    data = json.dumps(jsonable_encoder(_without_fields(event, fields)))
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+@router.post("/scan/stream")
+async def scan_files_stream(request: ScanRequest, format: str = "ndjson"):
+    """
+    Streaming variant of /scan: progress events, then each duplicate group as soon as
+    it is final (exact groups first, then superset/subset, then near), then a summary
+    
+    Args:
+        format: "ndjson" (one JSON object per line) or "sse" (text/event-stream)
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    _check_scan_request(request)
+    scan_id = _register_scan()
+    store = get_job_store()
+    budget = _make_budget(request, scan_id)
+    
+    async def events():
+        queue = asyncio.Queue()
+        status = "failed"
+        task = None
+        try:
+            yield _format_event({"event": "progress", "stage": "accepted", "scan_id": scan_id}, format)
+            
+            # Same scan as /scan, run as a task; relay its events while it runs
+            task = asyncio.create_task(run_drive_scan(request, queue.put_nowait, budget))
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield _format_event(event, format, request.include_text)
+            results, _ = task.result()
+            status = results["status"]
+            
+            # Groups were already streamed: the summary carries everything else
+            yield _format_event({
+                "event": "summary",
+                "scan_id": scan_id,
+                **{k: v for k, v in results.items() if not k.endswith("_duplicates")}
+            }, format)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _format_event({"event": "error", "detail": f"Scan failed: {str(e)}"}, format)
+        finally:
+            # Also reached when the client disconnects mid-stream: stop the work as well
+            # (cancelling the task also gives up its queue place or scan slot)
+            if task and not task.done():
+                budget.stop("cancelled", halt=True)
+                task.cancel()
+            if status == "failed":
+                store.fail(scan_id, "Scan failed or the client disconnected")
+            else:
+                store.finish(scan_id, None, status=status)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+class LocalScanRequest(ScanLimits):
+    folder_paths: list[str] = []  # Directories inside the configured local_scan_roots
+    include_subfolders: bool = True
+    response_format: str = "full"  # "full" or "compact", as for /scan
+    include_text: bool = False
+
+
+@router.post("/scan-local")
+async def scan_local(request: LocalScanRequest, raw_request: Request):
+    """
+    Scan a mounted directory tree (local disk / NAS share) for duplicates
+    
+    Only directories inside settings.local_scan_roots can be scanned. The same
+    budgets as /scan apply; bytes read from disk count as downloaded bytes.
+    """
+    if not settings.local_scan_roots:
+        raise HTTPException(status_code=404, detail="Local scanning is not enabled on this server.")
+    if request.response_format not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="response_format must be 'full' or 'compact'")
+    
+    scan_id = _register_scan()
+    store = get_job_store()
+    try:
+        client = LocalFileSystemClient(settings.local_scan_roots)
+        budget = _make_budget(request, scan_id)
+        files = []
+        results = await scan_local_files(
+            client,
+            folder_ids=request.folder_paths or None,
+            include_subfolders=request.include_subfolders,
+            algorithm=settings.hash_algorithm,
+            processed_files=files,
+            budget=budget
+        )
+        status = "cancelled" if budget.stopped_reason == "cancelled" else "completed"
+        store.finish(scan_id, None, status=status)
+        return await scan_response(
+            {"scan_id": scan_id, "status": status, **results}, files, request.response_format,
+            request.include_text, raw_request
+        )
+    except PermissionError as e:
+        store.fail(scan_id, str(e))
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        import traceback
+        error_detail = str(e)
+        traceback.print_exc()
+        store.fail(scan_id, f"Scan failed: {error_detail}")
         raise HTTPException(status_code=500, detail=f"Scan failed: {error_detail}")
 
 
@@ -165,25 +707,25 @@ async def approve_deletion(
     
     By default, moves files to trash (soft delete) for safety.
     Set permanent=True for permanent deletion.
+    
+    Files are deleted through the Drive batch endpoint (up to 100 per request), with
+    throttled items retried individually; "results" reports the outcome per file ID.
     """
     try:
         print(f"Delete request: {len(file_ids)} files, permanent={permanent}")
         drive = GoogleDriveClient(google_token)
+        delete_type = "permanently deleted" if permanent else "moved to trash"
+        
+        outcomes = await drive.batch_delete_files(file_ids, permanent=permanent)
         
         deleted_files = []
         errors = []
-        delete_type = "permanently deleted" if permanent else "moved to trash"
-        
-        for file_id in file_ids:
-            try:
-                print(f"{'Permanently deleting' if permanent else 'Moving to trash'} file: {file_id}")
-                await drive.delete_file(file_id, permanent=permanent)
+        for file_id, error in outcomes.items():
+            if error is None:
                 deleted_files.append(file_id)
-                print(f"Successfully {delete_type}: {file_id}")
-            except Exception as e:
-                error_msg = str(e)
-                print(f"Error {delete_type} {file_id}: {error_msg}")
-                errors.append({"file_id": file_id, "error": error_msg})
+            else:
+                print(f"Error {delete_type} {file_id}: {error}")
+                errors.append({"file_id": file_id, "error": error})
         
         if errors:
             print(f"Deletion completed with {len(errors)} errors")
@@ -194,6 +736,10 @@ async def approve_deletion(
             "status": "completed",
             "deleted_files": deleted_files,
             "errors": errors,
+            "results": {
+                file_id: {"status": "deleted"} if error is None else {"status": "error", "error": error}
+                for file_id, error in outcomes.items()
+            },
             "permanent": permanent,
             "message": f"{len(deleted_files)} file(s) {delete_type}"
         }
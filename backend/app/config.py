@@ -15,6 +15,80 @@ class Settings(BaseSettings):
         "https://script.googleusercontent.com"  # Apps Script direct requests
     ]
     
+    # Exact matching - non-text files at least this large are hashed in tiers (size, Range samples, full stream)
+    tiered_hash_min_size: int = 1024 * 1024
+    hash_algorithm: str = "sha256"  # "sha256", "blake2b" or "xxhash" (optional package, confirmed with SHA-256)
+    hash_workers: int = 0  # Hashing threads (0 = one per CPU core)
+    
+    # Persistent scan index (SQLite) - skips downloads of unchanged files; disabled if empty
+    scan_index_path: str = ""
+    scan_index_store_text: bool = True  # Needed to skip downloads of text files (stored zlib-compressed)
+    
+    # Local/NAS scanning via /api/scan-local - disabled unless at least one root directory is set
+    local_scan_roots: list[str] = []
+    
+    # Embeddings - "torch" (fp32), "quantized" (dynamic int8) or "onnx" (ONNX Runtime)
+    embedding_model: str = "all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"
+    embedding_onnx_path: str = ""  # Local .onnx file; downloaded from the model repo if empty
+    embedding_parity_check: bool = False  # Load fp32 once at startup to check the onnx backend (quantized always checks, for free)
+    embedding_min_parity: float = 0.98  # Fall back to fp32 if min cosine vs fp32 is below this
+    document_embedding_mode: str = "truncate"  # "truncate" or "chunks" (mean of representative windows)
+    document_max_chunks: int = 8  # Windows embedded per document in "chunks" mode
+    
+    # Persistent embedding store (memory-mapped, shared by worker processes); disabled if empty
+    embedding_store_dir: str = ""
+    embedding_store_dtype: str = "float16"  # "float16" or "int8"
+    
+    # Tiled similarity search
+    similarity_block_size: int = 1024  # Rows per tile
+    similarity_workers: int = 1  # Worker processes for tiles (1 = in-process, BLAS threads only)
+    similarity_max_neighbors: int = 50  # Neighbours kept per row in the first pass; rows that reach it are searched in full
+    
+    # Shared inference queue - coalesces encode calls from concurrent scans into batches
+    inference_batching: bool = True
+    inference_max_batch_size: int = 64
+    inference_max_wait_ms: float = 5.0
+    inference_workers: int = 2
+    
+    # Multi-worker mode - API workers get embeddings from one `python -m app.scanner.inference_server`
+    # process over this Unix socket instead of each loading the model; disabled if empty
+    inference_socket: str = ""
+    inference_authkey: str = ""  # Shared secret for the socket handshake; generated into <socket>.key (mode 0600) if empty
+    inference_connect_timeout: float = 120.0  # Seconds a worker waits for the server to come up
+    
+    # Background scan jobs (/api/scan/jobs) - SQLite file shared by all workers on the host;
+    # defaults to a file in the temp directory
+    job_store_path: str = ""
+    job_ttl_seconds: int = 24 * 3600  # Finished jobs and their results are purged after this
+    
+    # Per-scan budgets (0 = unlimited); requests may only tighten them. A scan that hits one
+    # stops downloading and returns partial results
+    scan_max_files: int = 0
+    scan_max_bytes: int = 0  # Bytes downloaded, including Range samples
+    scan_max_text_bytes: int = 0  # Extracted text held in memory (characters)
+    scan_max_seconds: float = 0
+    
+    # Admission control and fair sharing (per API worker). Scans beyond scan_max_concurrent wait
+    # in a queue; download slots and inference batches are shared by tenant weight (default 1)
+    scan_max_concurrent: int = 2
+    download_slots: int = 16  # Concurrent downloads across all running scans
+    scan_download_concurrency: int = 4  # Concurrent downloads within one scan
+    tenant_weights: dict[str, float] = {}
+    
+    # Google Drive listing - "folders" (two queries per folder) or "flat" (page through the whole
+    # drive once and rebuild the folder tree locally; far fewer calls for deep trees)
+    drive_listing_mode: str = "folders"
+    
+    # Microsoft Graph listing - concurrent calls while enumerating OneDrive and SharePoint sites/drives
+    graph_list_concurrency: int = 8
+    
+    # Scan responses - gzip level used when the client sends Accept-Encoding: gzip
+    response_gzip_level: int = 5
+    
+    # Model warm-up at startup - "background" (serve /health immediately), "blocking" or "off" (load on first scan)
+    model_warmup: str = "background"
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,12 +1,44 @@
 """FastAPI application - Stateless, no database"""
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import settings
 
+_warmup_task = None
+_warmup_error = None
+
+
+async def _warm_up_model():
+    """Load the embeddings model off the event loop"""
+    global _warmup_error
+    from app.scanner.duplicate_finder import warm_up_content_similarity
+    try:
+        await asyncio.to_thread(warm_up_content_similarity)
+        print("✅ Model warm-up complete")
+    except Exception as e:
+        print(f"Warning: Model warm-up failed: {e}")
+        _warmup_error = f"Model warm-up failed: {e}"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _warmup_task
+    if settings.model_warmup == "blocking":
+        await _warm_up_model()
+    elif settings.model_warmup == "background":
+        _warmup_task = asyncio.create_task(_warm_up_model())
+    yield
+    if _warmup_task and not _warmup_task.done():
+        _warmup_task.cancel()
+
+
 app = FastAPI(
     title="Intelligent Redundancy Scanner",
     description="Stateless duplicate file scanner for SharePoint/OneDrive",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -33,8 +65,35 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once the similarity model is loaded, 503 while it is still warming up
+    or if it failed to load
+    
+    Without sentence-transformers installed the scanner runs on TF-IDF similarity by
+    design; that reports ready with backend "tfidf".
+    """
+    from app.scanner.duplicate_finder import get_content_similarity, is_content_similarity_ready
+    if not is_content_similarity_ready():
+        status = "warming_up" if _warmup_task and not _warmup_task.done() else "not_loaded"
+        return JSONResponse(status_code=503, content={"status": status, "model_ready": False})
+    
+    content_sim = get_content_similarity()
+    error = content_sim.load_error or _warmup_error
+    if error:
+        return JSONResponse(status_code=503, content={
+            "status": "model_failed",
+            "model_ready": False,
+            "backend": content_sim.backend_name,
+            "error": error
+        })
+    if content_sim.model is None:
+        return {"status": "ready", "model_ready": False, "backend": "tfidf"}
+    return {"status": "ready", "model_ready": True, "backend": content_sim.backend_name}
+
+
 # Import routes
 from app.api.routes import scan
 
 app.include_router(scan.router, prefix="/api", tags=["scan"])
-
@@ -0,0 +1,84 @@
+"""Shared retry loop for provider batch endpoints (Drive multipart batch, Graph $batch)"""
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import random
+
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# One sub-request outcome: (HTTP status, error message or None, Retry-After seconds or None)
+ItemResult = Tuple[int, Optional[str], Optional[float]]
+
+
+def is_retryable(status: int, message: Optional[str]) -> bool:
+    """Throttling and transient server errors (Drive also signals rate limits with 403)"""
+    if status in RETRYABLE_STATUS:
+        return True
+    return status == 403 and bool(message) and "rate limit" in message.lower()
+
+
+async def execute_batched(
+    keys: List[Hashable],
+    send_batch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, ItemResult]]],
+    batch_size: int,
+    max_retries: int = 3,
+    concurrency: int = 2,
+    base_delay: float = 1.0
+) -> Dict[Hashable, Optional[str]]:
+    """
+    Run one sub-request per key through a batch endpoint, retrying failed items
+
+    Keys are split into batches of batch_size and sent with up to `concurrency`
+    batches in flight. Items that fail with a retryable status (or are missing from
+    a response, or whose whole batch request failed) are collected and re-sent in
+    new batches after an exponential backoff that honours Retry-After.
+
+    Args:
+        keys: One entry per sub-request (must be unique)
+        send_batch: Sends one batch, returns {key: (status, error, retry_after)}
+        batch_size: Provider limit on sub-requests per batch
+        max_retries: Extra attempts per item after the first
+        concurrency: Batches sent at the same time
+
+    Returns:
+        {key: None on success, or the final error message}
+    """
+    results = {}
+    pending = list(dict.fromkeys(keys))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch: List[Hashable]) -> Dict[Hashable, ItemResult]:
+        async with semaphore:
+            try:
+                return await send_batch(batch)
+            except Exception as e:
+                # Whole batch failed: network errors and 5xx are retried, 401 etc. are final
+                status = getattr(getattr(e, "response", None), "status_code", 503)
+                return {key: (status, str(e), None) for key in batch}
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        responses = await asyncio.gather(*(run(batch) for batch in batches))
+
+        retry = []
+        retry_after = 0.0
+        for batch, response in zip(batches, responses):
+            for key in batch:
+                status, error, item_retry_after = response.get(key, (503, "Missing from batch response", None))
+                if status < 400:
+                    results[key] = None
+                elif is_retryable(status, error) and attempt < max_retries:
+                    retry.append(key)
+                    retry_after = max(retry_after, item_retry_after or 0.0)
+                else:
+                    results[key] = error or f"HTTP {status}"
+
+        pending = retry
+        if pending:
+            delay = max(retry_after, base_delay * (2 ** attempt)) + random.uniform(0, base_delay / 2)
+            print(f"  🔁 Retrying {len(pending)} throttled/failed item(s) in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    return results
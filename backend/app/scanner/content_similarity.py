@@ -1,31 +1,146 @@
 """Content-based similarity using embeddings"""
 from typing import List, Optional
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from importlib.util import find_spec
+from itertools import islice
+import os
+import re
+from app.config import settings
+from app.scanner import embedding_backends
+from app.scanner.inference_service import MicroBatcher
+from app.scanner.inference_server import RemoteEncoder
+from app.scanner.embedding_store import EmbeddingStore
+from app.scanner.similarity_search import tiled_similarity
 
 
-# Try to import sentence-transformers, fallback to simple text similarity if not available
-try:
-    from sentence_transformers import SentenceTransformer
-    EMBEDDINGS_AVAILABLE = True
-except ImportError:
-    EMBEDDINGS_AVAILABLE = False
+# Check for sentence-transformers without importing it (torch takes seconds to import);
+# fallback to simple text similarity if not available
+EMBEDDINGS_AVAILABLE = find_spec("sentence_transformers") is not None
+if not EMBEDDINGS_AVAILABLE:
     print("Warning: sentence-transformers not installed. Using simple text similarity instead.")
 
+_WORD_RE = re.compile(r"\S+")
+_WORD_START_RE = re.compile(r"(?<!\S)\S")
+
+
+def cosine_similarity(a, b=None) -> np.ndarray:
+    """Cosine similarity between rows of a and b (numpy only, avoids importing sklearn)"""
+    a = np.asarray(a, dtype=np.float32)
+    b = a if b is None else np.asarray(b, dtype=np.float32)
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return a @ b.T
+
+
+def tfidf_vectors(texts: List[str]):
+    """
+    Model-free document vectors: TF-IDF rows, L2-normalized, as a scipy CSR matrix
+
+    Dot products between rows are cosine similarities, so the result can be searched
+    with tiled_similarity / similar_pairs like embeddings. None if there are no words.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    try:
+        return TfidfVectorizer(lowercase=True, token_pattern=r"\S+").fit_transform([t or "" for t in texts])
+    except ValueError:
+        return None
+
+
+def tfidf_similarity_matrix(texts: List[str]) -> np.ndarray:
+    """Dense NxN cosine similarity of tfidf_vectors rows (1 on the diagonal)"""
+    vectors = tfidf_vectors(texts)
+    if vectors is None:
+        return np.eye(len(texts))  # No words anywhere: nothing to compare
+    similarity = (vectors @ vectors.T).toarray()
+    np.fill_diagonal(similarity, 1.0)
+    return similarity
+
 
 class ContentSimilarity:
     """Calculate content similarity between documents"""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, use_remote: Optional[bool] = None):
+        """
+        Args:
+            backend: Embedding backend name; defaults to settings.embedding_backend
+            use_remote: Use the shared inference server instead of a local model;
+                defaults to True when settings.inference_socket is set
+        """
         self.model = None
-        if EMBEDDINGS_AVAILABLE:
+        self.backend_name = backend or settings.embedding_backend
+        self.load_error = None  # Why no model could be loaded, if one was expected
+        self._stores = {}
+        
+        if use_remote is None:
+            use_remote = bool(settings.inference_socket)
+        if use_remote:
+            # Multi-worker mode: one model in the inference server process, none in this worker
+            try:
+                self.model = RemoteEncoder(settings.inference_socket, settings.inference_connect_timeout)
+                self.backend_name = self.model.backend_name
+                print(f"✅ Using shared inference server at {settings.inference_socket}")
+            except Exception as e:
+                print(f"Warning: Could not reach inference server: {e}")
+                self.load_error = f"Could not reach inference server: {e}"
+            return
+        
+        if self.backend_name != "torch":
+            self.model = self._load_fast_backend(self.backend_name)
+        
+        if self.model is None and EMBEDDINGS_AVAILABLE:
             try:
                 # Use a lightweight model for embeddings
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
+                self.model = embedding_backends.load_backend("torch", settings.embedding_model)
+                self.backend_name = "torch"
+                self.load_error = None
                 print("✅ Loaded sentence-transformers model for content similarity")
             except Exception as e:
                 print(f"Warning: Could not load embeddings model: {e}")
+                self.load_error = f"Could not load embeddings model: {e}"
                 self.model = None
+        
+        if self.model is not None and settings.inference_batching:
+            # Route every encode call through the shared micro-batching queue
+            self.model = MicroBatcher(
+                self.model,
+                max_batch_size=settings.inference_max_batch_size,
+                max_wait_ms=settings.inference_max_wait_ms,
+                workers=settings.inference_workers
+            )
+    
+    def _load_fast_backend(self, name: str):
+        """Load an int8/ONNX backend, or None if unavailable or too far from fp32"""
+        try:
+            model = embedding_backends.load_backend(
+                name, settings.embedding_model, onnx_path=settings.embedding_onnx_path
+            )
+        except Exception as e:
+            print(f"Warning: Could not load '{name}' embedding backend, using torch: {e}")
+            self.load_error = f"Could not load '{name}' embedding backend: {e}"
+            return None
+        
+        # Quantized backends keep fp32 reference embeddings from their own load; others
+        # need a second (fp32) model in memory for a moment, so that check is opt-in
+        reference = getattr(model, "reference_embeddings", None)
+        if reference is not None or (settings.embedding_parity_check and EMBEDDINGS_AVAILABLE):
+            try:
+                if reference is None:
+                    reference = embedding_backends.load_backend("torch", settings.embedding_model)
+                parity = embedding_backends.check_parity(model, reference)
+                del reference
+            except Exception as e:
+                print(f"Warning: Parity check for '{name}' backend failed: {e}")
+                return model
+            
+            print(f"Embedding parity '{name}' vs fp32: min cosine {parity['min_cosine']:.4f}, "
+                  f"mean {parity['mean_cosine']:.4f}")
+            if parity["min_cosine"] < settings.embedding_min_parity:
+                print(f"Warning: '{name}' backend below parity threshold "
+                      f"{settings.embedding_min_parity}, using torch")
+                return None
+        
+        print(f"✅ Loaded '{name}' embedding backend for content similarity")
+        return model
     
     def compute_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
         """Compute embeddings for a list of texts"""
@@ -38,12 +153,128 @@ class ContentSimilarity:
             if not valid_texts:
                 return None
             
+            # Pre-truncating gives the same result as the tokenizer's own truncation
+            valid_texts = [self._truncate_to_budget(t) for t in valid_texts]
             embeddings = self.model.encode(valid_texts, show_progress_bar=False)
             return embeddings
         except Exception as e:
             print(f"Error computing embeddings: {e}")
             return None
     
+    def _token_budget(self) -> int:
+        """Maximum sequence length of the model, in tokens"""
+        return getattr(self.model, "max_seq_length", None) or 256
+    
+    def _truncate_to_budget(self, text: str, start: int = 0, budget: Optional[int] = None) -> str:
+        """
+        Cut text to the model's token budget before tokenizing
+        
+        Every whitespace-separated word is at least one token, so keeping `budget` words
+        never drops text the model would have seen. Only the needed prefix is scanned.
+        """
+        budget = budget or self._token_budget()
+        end = None
+        for end_match in islice(_WORD_RE.finditer(text, start), budget - 1, budget):
+            end = end_match.end()
+        if end is None:
+            return text[start:] if start else text
+        return text[start:end]
+    
+    def _representative_windows(self, text: str, max_chunks: int) -> List[str]:
+        """Up to max_chunks budget-sized windows spread evenly across the document"""
+        budget = self._token_budget()
+        first = self._truncate_to_budget(text, budget=budget)
+        if len(first) >= len(text) or max_chunks <= 1:
+            return [first]
+        
+        windows = [first]
+        covered = len(first)
+        step = len(text) / max_chunks
+        for k in range(1, max_chunks):
+            # Start each window at the beginning of a word, without overlapping the previous one
+            word = _WORD_START_RE.search(text, max(int(k * step), covered))
+            if not word:
+                break
+            window = self._truncate_to_budget(text, start=word.start(), budget=budget)
+            windows.append(window)
+            covered = word.start() + len(window)
+        return windows
+    
+    def embed_documents(
+        self,
+        texts: List[str],
+        mode: Optional[str] = None,
+        keys: Optional[List[str]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        One normalized embedding per document with bounded CPU per document
+        
+        Args:
+            texts: Non-empty document texts
+            mode: "truncate" (first token budget only) or "chunks" (mean of up to
+                document_max_chunks representative windows); defaults to settings
+            keys: Optional content hash per text; with an embedding store configured,
+                stored embeddings are reused and new ones persisted
+        
+        Returns:
+            len(texts) x dim array, or None if no model is loaded
+        """
+        if not self.model or not texts:
+            return None
+        
+        mode = mode or settings.document_embedding_mode
+        store = self._get_store(mode) if keys else None
+        if store is None:
+            return self._encode_documents(texts, mode)
+        
+        documents, found = store.get_many(keys)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            computed = self._encode_documents([texts[i] for i in missing], mode)
+            documents[missing] = computed
+            store.put_many([keys[i] for i in missing], computed)
+        return documents
+    
+    def _encode_documents(self, texts: List[str], mode: str) -> np.ndarray:
+        if mode == "chunks":
+            windows = [self._representative_windows(t, settings.document_max_chunks) for t in texts]
+        else:
+            windows = [[self._truncate_to_budget(t)] for t in texts]
+        
+        flat = [w for doc_windows in windows for w in doc_windows]
+        embeddings = np.asarray(self.model.encode(flat, show_progress_bar=False), dtype=np.float32)
+        
+        # Mean-pool each document's windows, then re-normalize
+        documents = []
+        offset = 0
+        for doc_windows in windows:
+            documents.append(embeddings[offset:offset + len(doc_windows)].mean(axis=0))
+            offset += len(doc_windows)
+        documents = np.vstack(documents)
+        return documents / np.clip(np.linalg.norm(documents, axis=1, keepdims=True), 1e-12, None)
+    
+    def _get_store(self, mode: str) -> Optional[EmbeddingStore]:
+        """Embedding store for this model/backend/mode, opened on first use (None if disabled)"""
+        if not settings.embedding_store_dir:
+            return None
+        
+        # Everything that changes a document's vector is part of the key: the windows
+        # depend on the token budget and, in "chunks" mode, on the number of windows
+        variant = f"{mode}{settings.document_max_chunks}" if mode == "chunks" else mode
+        namespace = f"{settings.embedding_model}-{self.backend_name}-{variant}-{self._token_budget()}t".replace("/", "_")
+        if namespace not in self._stores:
+            try:
+                dim = self._encode_documents(["dimension probe"], mode).shape[1]
+                self._stores[namespace] = EmbeddingStore(
+                    os.path.join(settings.embedding_store_dir, namespace),
+                    dim,
+                    dtype=settings.embedding_store_dtype
+                )
+            except Exception as e:
+                print(f"Warning: Could not open embedding store: {e}")
+                self._stores[namespace] = None
+        return self._stores[namespace]
+    
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """
         Calculate similarity between two texts
@@ -57,76 +288,68 @@ class ContentSimilarity:
         # Use embeddings if available
         if self.model:
             try:
-                embeddings = self.model.encode([text1, text2], show_progress_bar=False)
-                similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-                return float(similarity)
+                embeddings = self.embed_documents([text1, text2])
+                return float(embeddings[0] @ embeddings[1])
             except Exception as e:
                 print(f"Error in embedding similarity: {e}")
-                # Fallback to simple similarity
-                return self._simple_text_similarity(text1, text2)
-        else:
-            # Fallback to simple text similarity
-            return self._simple_text_similarity(text1, text2)
-    
-    def _simple_text_similarity(self, text1: str, text2: str) -> float:
-        """Simple text similarity using word overlap"""
-        from difflib import SequenceMatcher
         
-        # Normalize texts
-        text1 = text1.lower().strip()
-        text2 = text2.lower().strip()
-        
-        if not text1 or not text2:
-            return 0.0
-        
-        # Use SequenceMatcher for character-level similarity
-        similarity = SequenceMatcher(None, text1, text2).ratio()
-        
-        # Also calculate word-level similarity
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 or not words2:
-            return similarity
-        
-        # Jaccard similarity (word overlap)
-        intersection = len(words1 & words2)
-        union = len(words1 | words2)
-        word_similarity = intersection / union if union > 0 else 0.0
-        
-        # Combine character and word similarity
-        return (similarity * 0.4 + word_similarity * 0.6)
+        # Fallback: the TF-IDF cosine the near-duplicate search uses without a model
+        return float(tfidf_similarity_matrix([text1, text2])[0, 1])
     
     def batch_similarity_matrix(self, texts: List[str]) -> Optional[np.ndarray]:
         """
         Calculate similarity matrix for a batch of texts
         
         Returns:
-            NxN similarity matrix
+            NxN similarity matrix (dense: O(N^2) memory, see similarity_neighbors)
         """
         if not texts or len(texts) < 2:
             return None
         
         # Use embeddings if available
         if self.model:
-            embeddings = self.compute_embeddings(texts)
+            embeddings = self.embed_documents([t or "" for t in texts])
             if embeddings is not None:
                 return cosine_similarity(embeddings)
         
-        # Fallback: compute pairwise similarities
-        n = len(texts)
-        similarity_matrix = np.zeros((n, n))
+        return tfidf_similarity_matrix(texts)
+    
+    def similarity_neighbors(
+        self,
+        texts: List[str],
+        top_k: Optional[int] = 10,
+        threshold: Optional[float] = None,
+        keys: Optional[List[str]] = None
+    ):
+        """
+        Sparse similarity graph for a batch of texts - use instead of
+        batch_similarity_matrix when N is large
+        
+        Returns:
+            NxN scipy CSR matrix keeping the top_k neighbours per row (and/or those
+            at or above threshold), or None for fewer than 2 texts
+        """
+        if not texts or len(texts) < 2:
+            return None
+        
+        texts = [t or "" for t in texts]
+        embeddings = None
+        if self.model:
+            embeddings = self.embed_documents(texts, keys=keys)
         
-        for i in range(n):
-            for j in range(i, n):
-                if i == j:
-                    similarity_matrix[i][j] = 1.0
-                else:
-                    sim = self.calculate_similarity(texts[i], texts[j])
-                    similarity_matrix[i][j] = sim
-                    similarity_matrix[j][i] = sim
+        if embeddings is None:
+            # Fallback: TF-IDF rows are L2-normalized sparse vectors, tile over those
+            embeddings = tfidf_vectors(texts)
+            if embeddings is None:
+                return None
         
-        return similarity_matrix
+        return tiled_similarity(
+            embeddings,
+            top_k=top_k,
+            threshold=threshold,
+            block_size=settings.similarity_block_size,
+            workers=settings.similarity_workers
+        )
     
     def calculate_filename_similarity_embedding(self, name1: str, name2: str) -> float:
         """
@@ -1,24 +1,43 @@
 """Find duplicates - improved with content-based detection"""
-from typing import List, Dict
+from typing import Callable, List, Dict, Iterator, Optional, Set, Tuple
 from collections import defaultdict
+from itertools import combinations
+import threading
 from difflib import SequenceMatcher
 from app.scanner.hasher import compute_sha256_optimized
-from app.scanner.content_similarity import ContentSimilarity
+from app.scanner.content_similarity import ContentSimilarity, tfidf_vectors
 from app.scanner.text_extractor import extract_text_from_file, normalize_text
 from app.scanner.superset_detector import find_superset_subset_duplicates
+from app.scanner.similarity_search import similar_pairs
+from app.config import settings
 
 
 # Initialize content similarity (loads model once)
 _content_similarity = None
+_content_similarity_lock = threading.Lock()
 
 def get_content_similarity():
-    """Get or create ContentSimilarity instance (singleton)"""
+    """Get or create ContentSimilarity instance (singleton, safe to call from a warm-up thread)"""
     global _content_similarity
     if _content_similarity is None:
-        _content_similarity = ContentSimilarity()
+        with _content_similarity_lock:
+            if _content_similarity is None:
+                _content_similarity = ContentSimilarity()
     return _content_similarity
 
 
+def is_content_similarity_ready() -> bool:
+    """True once the ContentSimilarity singleton (and its model, if any) has been loaded"""
+    return _content_similarity is not None
+
+
+def warm_up_content_similarity() -> None:
+    """Load the model and run one tiny encode so the first scan doesn't pay for it"""
+    content_sim = get_content_similarity()
+    if content_sim.model:
+        content_sim.compute_embeddings(["warm up"])
+
+
 def find_exact_duplicates(files: List[Dict]) -> List[Dict]:
     """
     Find exact duplicates by content hash
@@ -58,6 +77,11 @@ def find_exact_duplicates(files: List[Dict]) -> List[Dict]:
     return duplicate_groups
 
 
+# Weights of calculate_filename_similarity
+FILENAME_CHAR_WEIGHT = 0.4  # Character-level ratio
+FILENAME_WORD_WEIGHT = 0.6  # Word-set Jaccard
+
+
 def calculate_filename_similarity(name1: str, name2: str) -> float:
     """Calculate filename similarity using multiple methods"""
     name1 = name1.lower().strip()
@@ -81,7 +105,7 @@ def calculate_filename_similarity(name1: str, name2: str) -> float:
         word_sim = 0.0
     
     # Combined score
-    return (char_sim * 0.4 + word_sim * 0.6)
+    return (char_sim * FILENAME_CHAR_WEIGHT + word_sim * FILENAME_WORD_WEIGHT)
 
 
 def calculate_metadata_similarity(file1: Dict, file2: Dict) -> float:
@@ -129,22 +153,223 @@ def calculate_metadata_similarity(file1: Dict, file2: Dict) -> float:
     return min(score, 1.0)
 
 
-def find_near_duplicates_improved(files: List[Dict], threshold: float = 0.75) -> List[Dict]:
+# Weights of combined_similarity; every signal scores at most 1
+CONTENT_WEIGHT = 0.5    # Content similarity (50%) - embeddings
+FILENAME_WEIGHT = 0.3   # Filename (30%) - embeddings
+METADATA_WEIGHT = 0.2   # Metadata (20%)
+# No content available, use filename + metadata
+NO_CONTENT_FILENAME_WEIGHT = 0.6
+NO_CONTENT_METADATA_WEIGHT = 0.4
+
+
+def combined_similarity(content_score: Optional[float], filename_score: float, metadata_score: float) -> float:
+    """
+    Weighted combined score
+    
+    Content is most important if available, otherwise rely on filename + metadata.
+    Files with text always use the content weights: a content score of 0 (nothing in
+    common) caps the pair at FILENAME_WEIGHT + METADATA_WEIGHT rather than letting a
+    matching name and date make two different documents near-duplicates.
+    
+    Args:
+        content_score: Content similarity, or None if a file has no text to compare
+    """
+    if content_score is not None:
+        return (
+            CONTENT_WEIGHT * content_score +
+            FILENAME_WEIGHT * filename_score +
+            METADATA_WEIGHT * metadata_score
+        )
+    return (
+        NO_CONTENT_FILENAME_WEIGHT * filename_score +
+        NO_CONTENT_METADATA_WEIGHT * metadata_score
+    )
+
+
+def min_content_score(threshold: float) -> float:
+    """
+    Lowest content score with which a text pair can still reach threshold
+    
+    Filename and metadata add at most FILENAME_WEIGHT + METADATA_WEIGHT, so pairs
+    below this content score can be skipped without scoring them.
+    """
+    max_other = FILENAME_WEIGHT + METADATA_WEIGHT
+    return max((threshold - max_other) / CONTENT_WEIGHT, 0.0)
+
+
+def min_filename_score(threshold: float) -> float:
+    """Lowest filename score with which a pair of files without text can reach threshold"""
+    return (threshold - NO_CONTENT_METADATA_WEIGHT) / NO_CONTENT_FILENAME_WEIGHT
+
+
+def _search_pairs(vectors, floor: float, max_neighbors: Optional[int]) -> Dict[Tuple[int, int], float]:
+    """similar_pairs with the configured tiling"""
+    return similar_pairs(
+        vectors,
+        floor,
+        top_k=max_neighbors or settings.similarity_max_neighbors,
+        block_size=settings.similarity_block_size,
+        workers=settings.similarity_workers
+    )
+
+
+def filename_candidate_pairs(
+    names: List[str],
+    min_score: float,
+    max_neighbors: Optional[int] = None
+) -> Set[Tuple[int, int]]:
+    """
+    Every pair whose calculate_filename_similarity can reach min_score, without N^2 scoring
+    
+    The character ratio adds at most FILENAME_CHAR_WEIGHT, so such pairs need a word
+    Jaccard of at least (min_score - FILENAME_CHAR_WEIGHT) / FILENAME_WORD_WEIGHT. The
+    cosine of binary word vectors is never below their Jaccard, so a similarity search
+    with that floor finds all of them (and some that the caller's scoring rejects).
+    """
+    min_words = (min_score - FILENAME_CHAR_WEIGHT) / FILENAME_WORD_WEIGHT
+    if min_words <= 0:
+        return set(combinations(range(len(names)), 2))
+    
+    # L2-normalized binary word vectors, split exactly as calculate_filename_similarity does
+    vocabulary = {}
+    indptr, indices, data = [0], [], []
+    for name in names:
+        words = {vocabulary.setdefault(word, len(vocabulary)) for word in name.lower().split()}
+        indices.extend(words)
+        data.extend([1.0 / max(len(words), 1) ** 0.5] * len(words))
+        indptr.append(len(indices))
+    if not vocabulary:
+        return set()
+    
+    from scipy import sparse
+    vectors = sparse.csr_matrix((data, indices, indptr), shape=(len(names), len(vocabulary)), dtype="float32")
+    return set(_search_pairs(vectors, min_words - 1e-6, max_neighbors))
+
+
+def cluster_similarity_graph(
+    num_nodes: int,
+    edges: Dict[Tuple[int, int], float],
+    threshold: float,
+    linkage: str = "average"
+) -> List[List[int]]:
+    """
+    Group nodes of a sparse similarity graph with union-find
+    
+    Edges at or above the threshold are merged strongest-first, so the result does
+    not depend on input order.
+    
+    Args:
+        num_nodes: Number of nodes (files)
+        edges: Scores keyed by (i, j) with i < j; pairs missing from the graph count as 0
+        threshold: Minimum score for an edge (and, for average/complete, for the linkage)
+        linkage: "single" (connected components), "average" (mean score between the two
+            clusters must reach the threshold) or "complete" (every pair must)
+    
+    Returns:
+        Clusters with more than one node, as sorted lists of node indices
+    """
+    if linkage not in ("single", "average", "complete"):
+        raise ValueError(f"Unknown linkage: {linkage}")
+    
+    parent = list(range(num_nodes))
+    members = {i: [i] for i in range(num_nodes)}
+    
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    
+    strong_edges = sorted(
+        ((pair, score) for pair, score in edges.items() if score >= threshold),
+        key=lambda item: (-item[1], item[0])
+    )
+    
+    for (i, j), _ in strong_edges:
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        
+        if linkage != "single":
+            cross_scores = [
+                edges.get((min(a, b), max(a, b)), 0.0)
+                for a in members[root_i]
+                for b in members[root_j]
+            ]
+            if linkage == "complete":
+                link = min(cross_scores)
+            else:
+                link = sum(cross_scores) / len(cross_scores)
+            if link < threshold:
+                continue
+        
+        # Union by size
+        if len(members[root_i]) < len(members[root_j]):
+            root_i, root_j = root_j, root_i
+        parent[root_j] = root_i
+        members[root_i].extend(members.pop(root_j))
+    
+    return [sorted(nodes) for nodes in members.values() if len(nodes) > 1]
+
+
+def _near_duplicate_group(
+    files: List[Dict],
+    cluster: List[int],
+    edges: Dict[Tuple[int, int], float],
+    detection_method: str
+) -> Dict:
+    """Build a near-duplicate group from a cluster using the stored edge scores"""
+    internal = {
+        pair: edges[pair] for pair in combinations(cluster, 2) if pair in edges
+    }
+    
+    # Primary is the most central member (highest total similarity to the rest)
+    centrality = defaultdict(float)
+    for (i, j), score in internal.items():
+        centrality[i] += score
+        centrality[j] += score
+    primary = max(cluster, key=lambda k: (centrality[k], files[k].get("last_modified") or "", -k))
+    duplicates = [files[k] for k in cluster if k != primary]
+    
+    return {
+        "group_type": "near",
+        "primary_file": files[primary],
+        "duplicate_files": duplicates,
+        "similarity_score": sum(internal.values()) / len(internal) if internal else 0.0,
+        "storage_savings_bytes": sum(f.get("size", 0) for f in duplicates),
+        "detection_method": detection_method
+    }
+
+
+def find_near_duplicates_improved(
+    files: List[Dict],
+    threshold: float = 0.75,
+    linkage: str = "average",
+    non_text_threshold: float = 0.85,
+    max_neighbors: Optional[int] = None
+) -> List[Dict]:
     """
     Find near-duplicates using multi-signal approach:
     - Filename similarity
     - Content similarity (if text extracted)
     - Metadata similarity (size, date, type)
     
+    Every candidate pair is scored once into a sparse similarity graph, which is then
+    clustered (see cluster_similarity_graph). Group scores come from the stored edges.
+    
     Args:
         files: List of file dicts with extracted text in 'extracted_text'
         threshold: Combined similarity threshold (0-1)
+        linkage: Cluster linkage: "single", "average" or "complete"
+        non_text_threshold: Higher threshold for files without text
+        max_neighbors: Neighbours per file in the first pass of each similarity search
+            (files with more are searched again in full); defaults to
+            settings.similarity_max_neighbors
     
     Returns:
         List of duplicate groups
     """
     duplicate_groups = []
-    processed = set()
     content_sim = get_content_similarity()
     
     # Filter files that have text content for content-based comparison
@@ -154,141 +379,93 @@ def find_near_duplicates_improved(files: List[Dict], threshold: float = 0.75) ->
     print(f"Files with extractable text: {len(files_with_text)}")
     print(f"Files without text (images, binaries): {len(files_without_text)}")
     
-    # Process files with text (content-based)
-    for i, file1 in enumerate(files_with_text):
-        if file1["id"] in processed:
-            continue
+    # Score text file pairs once (content-based)
+    texts = [normalize_text(f.get("extracted_text", "")) for f in files_with_text]
+    edges = {}
+    
+    # Embed every document and filename once up front (reusing stored embeddings by content hash)
+    doc_embeddings = name_embeddings = None
+    if content_sim.model and files_with_text:
+        try:
+            hashes = [f.get("content_hash") for f in files_with_text]
+            doc_embeddings = content_sim.embed_documents(texts, keys=hashes if all(hashes) else None)
+            name_embeddings = content_sim.embed_documents([f.get("name", "") for f in files_with_text])
+        except Exception as e:
+            print(f"Error precomputing embeddings, falling back to TF-IDF: {e}")
+            doc_embeddings = name_embeddings = None
+    
+    if doc_embeddings is None and files_with_text:
+        # No model: one TF-IDF matrix for all documents, searched the same way
+        doc_embeddings = tfidf_vectors(texts)
+    
+    content_scores = {}
+    if doc_embeddings is not None:
+        # Only pairs whose content similarity can still reach the threshold, found with a
+        # tiled top-k search instead of N^2 (see combined_similarity for pairs with no
+        # content in common)
+        content_scores = _search_pairs(doc_embeddings, min_content_score(threshold), max_neighbors)
+    
+    for i, j in sorted(content_scores):
+        file1 = files_with_text[i]
+        file2 = files_with_text[j]
         
-        similar_files = [file1]
-        text1 = normalize_text(file1.get("extracted_text", ""))
+        # Pre-filter: Quick metadata check to avoid expensive embedding computation
+        metadata_sim = calculate_metadata_similarity(file1, file2)
+        if metadata_sim < 0.3:  # Skip if metadata is very different
+            continue
         
-        for file2 in files_with_text[i+1:]:
-            if file2["id"] in processed:
-                continue
-            
-            # Pre-filter: Quick metadata check to avoid expensive embedding computation
-            metadata_sim = calculate_metadata_similarity(file1, file2)
-            if metadata_sim < 0.3:  # Skip if metadata is very different
-                continue
-            
-            # Use embeddings for filename similarity (better semantic matching)
+        # Use embeddings for filename similarity (better semantic matching)
+        if name_embeddings is not None:
+            filename_sim = float(name_embeddings[i] @ name_embeddings[j])
+        else:
             filename_sim = content_sim.calculate_filename_similarity_embedding(
                 file1.get("name", ""),
                 file2.get("name", "")
             )
-            
-            # Content similarity using embeddings
-            text2 = normalize_text(file2.get("extracted_text", ""))
-            content_sim_score = 0.0
-            if text1 and text2:
-                content_sim_score = content_sim.calculate_similarity(text1, text2)
-            
-            # Weighted combined score
-            # Content is most important if available, otherwise rely on filename + metadata
-            if content_sim_score > 0:
-                combined_score = (
-                    0.5 * content_sim_score +  # Content similarity (50%) - embeddings
-                    0.3 * filename_sim +        # Filename (30%) - embeddings
-                    0.2 * metadata_sim          # Metadata (20%)
-                )
-            else:
-                # No content available, use filename + metadata
-                combined_score = (
-                    0.6 * filename_sim +        # Filename (60%) - embeddings
-                    0.4 * metadata_sim           # Metadata (40%)
-                )
-            
-            if combined_score >= threshold:
-                similar_files.append(file2)
-                processed.add(file2["id"])
         
-        if len(similar_files) > 1:
-            # Calculate average similarity for the group
-            avg_similarity = 0.0
-            for file2 in similar_files[1:]:
-                filename_sim = calculate_filename_similarity(
-                    similar_files[0].get("name", ""),
-                    file2.get("name", "")
-                )
-                metadata_sim = calculate_metadata_similarity(similar_files[0], file2)
-                
-                text2 = normalize_text(file2.get("extracted_text", ""))
-                content_sim_score = 0.0
-                if text1 and text2:
-                    content_sim_score = content_sim.calculate_similarity(text1, text2)
-                
-                if content_sim_score > 0:
-                    score = 0.5 * content_sim_score + 0.3 * filename_sim + 0.2 * metadata_sim
-                else:
-                    score = 0.6 * filename_sim + 0.4 * metadata_sim
-                
-                avg_similarity += score
-            
-            avg_similarity = avg_similarity / len(similar_files[1:])
-            
-            duplicate_groups.append({
-                "group_type": "near",
-                "primary_file": similar_files[0],
-                "duplicate_files": similar_files[1:],
-                "similarity_score": avg_similarity,
-                "storage_savings_bytes": sum(f.get("size", 0) for f in similar_files[1:]),
-                "detection_method": "content-based" if text1 else "filename+metadata"
-            })
-            
-            processed.add(file1["id"])
+        # Content similarity (embedding or TF-IDF cosine)
+        content_sim_score = content_scores[(i, j)] if texts[i] and texts[j] else None
+        
+        edges[(i, j)] = combined_similarity(content_sim_score, filename_sim, metadata_sim)
     
-    # Process files without text (filename + metadata only)
-    for i, file1 in enumerate(files_without_text):
-        if file1["id"] in processed:
-            continue
+    for cluster in cluster_similarity_graph(len(files_with_text), edges, threshold, linkage):
+        duplicate_groups.append(
+            _near_duplicate_group(files_with_text, cluster, edges, "content-based")
+        )
+    
+    # Score files without text (filename + metadata only), again only the pairs whose
+    # filename can still reach the threshold instead of all N^2
+    edges = {}
+    names = [f.get("name", "") for f in files_without_text]
+    
+    for i, j in sorted(filename_candidate_pairs(names, min_filename_score(non_text_threshold), max_neighbors)):
+        file1 = files_without_text[i]
+        file2 = files_without_text[j]
         
-        similar_files = [file1]
+        metadata_sim = calculate_metadata_similarity(file1, file2)
+        if metadata_sim < 0.3:  # Cannot reach the non-text threshold
+            continue
         
-        for file2 in files_without_text[i+1:]:
-            if file2["id"] in processed:
-                continue
-            
-            filename_sim = calculate_filename_similarity(
-                file1.get("name", ""),
-                file2.get("name", "")
-            )
-            metadata_sim = calculate_metadata_similarity(file1, file2)
-            
-            # For files without text, use higher threshold
-            combined_score = 0.6 * filename_sim + 0.4 * metadata_sim
-            
-            if combined_score >= 0.85:  # Higher threshold for non-text files
-                similar_files.append(file2)
-                processed.add(file2["id"])
+        filename_sim = calculate_filename_similarity(names[i], names[j])
         
-        if len(similar_files) > 1:
-            duplicate_groups.append({
-                "group_type": "near",
-                "primary_file": similar_files[0],
-                "duplicate_files": similar_files[1:],
-                "similarity_score": 0.85,  # Approximate
-                "storage_savings_bytes": sum(f.get("size", 0) for f in similar_files[1:]),
-                "detection_method": "filename+metadata"
-            })
-            
-            processed.add(file1["id"])
+        edges[(i, j)] = combined_similarity(None, filename_sim, metadata_sim)
+    
+    # For files without text, use higher threshold
+    for cluster in cluster_similarity_graph(len(files_without_text), edges, non_text_threshold, linkage):
+        duplicate_groups.append(
+            _near_duplicate_group(files_without_text, cluster, edges, "filename+metadata")
+        )
     
     return duplicate_groups
 
 
-def find_all_duplicates(files: List[Dict]) -> Dict:
+def iter_duplicate_stages(files: List[Dict]) -> Iterator[Tuple[str, List[Dict]]]:
     """
-    Find both exact and near duplicates with improved algorithms
+    Run duplicate detection stage by stage, cheapest first
     
-    Returns:
-        {
-            "exact_duplicates": [...],
-            "near_duplicates": [...],
-            "total_files": int,
-            "total_duplicate_groups": int,
-            "total_duplicate_files": int,
-            "total_storage_savings_bytes": int
-        }
+    Yields (stage, groups) for "exact", "superset_subset" and "near" as soon as each
+    stage finishes. Groups are final when yielded: near-duplicate groups already
+    exclude files claimed by the exact and superset/subset stages.
     """
     print("=" * 50)
     print("Finding duplicates...")
@@ -297,12 +474,14 @@ def find_all_duplicates(files: List[Dict]) -> Dict:
     print("Step 1: Finding exact duplicates (content hash)...")
     exact = find_exact_duplicates(files)
     print(f"  Found {len(exact)} exact duplicate groups")
+    yield "exact", exact
     
     # Find superset/subset duplicates (advanced: smaller file contained in larger)
     print("Step 2: Finding superset/subset duplicates (smaller file in larger file)...")
     similarity_model = get_content_similarity()
     superset_subset = find_superset_subset_duplicates(files, similarity_model)
     print(f"  Found {len(superset_subset)} superset/subset groups")
+    yield "superset_subset", superset_subset
     
     # Find near duplicates (improved algorithm)
     print("Step 3: Finding near duplicates (content + filename + metadata)...")
@@ -331,15 +510,56 @@ def find_all_duplicates(files: List[Dict]) -> Dict:
                 filtered_near.append(group)
     
     print("=" * 50)
-    
-    all_groups = exact + superset_subset + filtered_near
+    yield "near", filtered_near
+
+
+def summarize_duplicates(files: List[Dict], stages: Dict[str, List[Dict]]) -> Dict:
+    """Build the find_all_duplicates result from per-stage groups"""
+    exact = stages.get("exact", [])
+    superset_subset = stages.get("superset_subset", [])
+    near = stages.get("near", [])
+    all_groups = exact + superset_subset + near
     
     return {
         "exact_duplicates": exact,
         "superset_subset_duplicates": superset_subset,
-        "near_duplicates": filtered_near,
+        "near_duplicates": near,
         "total_files": len(files),
         "total_duplicate_groups": len(all_groups),
         "total_duplicate_files": sum(len(g["duplicate_files"]) for g in all_groups),
         "total_storage_savings_bytes": sum(g["storage_savings_bytes"] for g in all_groups)
     }
+
+
+def find_all_duplicates(files: List[Dict], should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Find both exact and near duplicates with improved algorithms
+    
+    Args:
+        files: Processed file dicts
+        should_stop: Optional callable checked after each stage; once it returns True
+            the remaining stages are skipped and the result has "partial": True
+    
+    Returns:
+        {
+            "exact_duplicates": [...],
+            "near_duplicates": [...],
+            "total_files": int,
+            "total_duplicate_groups": int,
+            "total_duplicate_files": int,
+            "total_storage_savings_bytes": int
+        }
+    """
+    stages = {}
+    partial = False
+    for stage, groups in iter_duplicate_stages(files):
+        stages[stage] = groups
+        if should_stop and stage != "near" and should_stop():
+            print(f"Stopping duplicate detection after the {stage} stage")
+            partial = True
+            break
+    
+    results = summarize_duplicates(files, stages)
+    if partial:
+        results["partial"] = True
+    return results
@@ -0,0 +1,147 @@
+"""Inference backends for sentence embeddings (PyTorch fp32, dynamic int8, ONNX Runtime)"""
+from typing import List, Dict, Optional
+import numpy as np
+
+
+BACKENDS = ("torch", "quantized", "onnx")
+
+# Sentences used to compare a fast backend against the fp32 reference
+PARITY_SAMPLE_TEXTS = [
+    "Quarterly financial report for the northern region",
+    "Meeting notes: budget review and hiring plan for next year",
+    "The quick brown fox jumps over the lazy dog",
+    "Invoice #4821 - consulting services rendered in March",
+    "Project proposal draft v2 with updated timeline",
+    "Slide 3: Customer satisfaction survey results",
+]
+
+
+class TorchBackend:
+    """sentence-transformers model under full PyTorch in fp32 (reference backend)"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, show_progress_bar=show_progress_bar, batch_size=batch_size)
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    Same model with its Linear layers dynamically quantized to int8
+
+    The fp32 model is loaded first anyway, so its embeddings of PARITY_SAMPLE_TEXTS are
+    kept as reference_embeddings: the parity check needs no second model.
+    """
+
+    name = "quantized"
+
+    def __init__(self, model_name: str):
+        import torch
+        super().__init__(model_name)
+        self.reference_embeddings = np.asarray(self.encode(PARITY_SAMPLE_TEXTS), dtype=np.float32)
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime session with mean pooling and L2 normalization
+
+    Reproduces the sentence-transformers pipeline of all-MiniLM-L6-v2. If no local
+    model path is given, the ONNX export published with the model is downloaded.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, onnx_path: Optional[str] = None, max_seq_length: int = 256):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        if not onnx_path:
+            from huggingface_hub import hf_hub_download
+            onnx_path = hf_hub_download(repo_id, "onnx/model.onnx")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(repo_id)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_seq_length = max_seq_length
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            inputs = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over non-padding tokens, then L2 normalize
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append(pooled / np.clip(norms, 1e-12, None))
+
+        return np.vstack(batches).astype(np.float32) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+def load_backend(name: str, model_name: str, onnx_path: Optional[str] = None):
+    """
+    Create an embedding backend by name
+
+    Raises:
+        ValueError: Unknown backend name
+        ImportError / other exceptions: backend dependencies or model not available
+    """
+    if name == "torch":
+        return TorchBackend(model_name)
+    if name == "quantized":
+        return QuantizedTorchBackend(model_name)
+    if name == "onnx":
+        return OnnxBackend(model_name, onnx_path=onnx_path)
+    raise ValueError(f"Unknown embedding backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def check_parity(backend, reference, texts: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Compare a backend's embeddings with a reference backend (normally fp32 torch)
+
+    Args:
+        backend: Backend to check
+        reference: Reference backend, or its embeddings of the texts as an array
+        texts: Sample texts (default PARITY_SAMPLE_TEXTS)
+
+    Returns:
+        {"min_cosine": float, "mean_cosine": float} over the sample texts
+    """
+    texts = texts or PARITY_SAMPLE_TEXTS
+    candidate = np.asarray(backend.encode(texts), dtype=np.float32)
+    if isinstance(reference, np.ndarray):
+        expected = reference.astype(np.float32)
+    else:
+        expected = np.asarray(reference.encode(texts), dtype=np.float32)
+
+    candidate /= np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    expected /= np.clip(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12, None)
+    cosines = (candidate * expected).sum(axis=1)
+
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
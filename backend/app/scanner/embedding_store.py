@@ -0,0 +1,172 @@
+"""Persistent, memory-mapped embedding matrix keyed by content hash"""
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+
+KEY_BYTES = 16
+DTYPES = {"float16": np.float16, "int8": np.int8}
+
+
+def _key_digest(key: str) -> bytes:
+    """Fixed-width binary key for any content hash / identifier string"""
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding matrix stored as float16 or row-quantized int8
+
+    Layout of the store directory:
+        meta.json   - {"dim": int, "dtype": "float16" | "int8"}
+        vectors.bin - rows of `dim` values, memory-mapped read-only
+        scales.bin  - float32 scale per row (int8 only)
+        keys.bin    - 16-byte key digest per row; a row only counts once its key is written
+
+    Several worker processes can open the same directory: the data is shared through
+    the page cache, appends are serialized with a file lock, and readers pick up rows
+    written by others on refresh(). Opening reads only the key file, so it takes
+    milliseconds even for 100k+ rows.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str = "float16"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding store dtype: {dtype} (expected float16 or int8)")
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dim"] != dim or meta["dtype"] != dtype:
+                raise ValueError(
+                    f"Embedding store at {path} has dim={meta['dim']} dtype={meta['dtype']}, "
+                    f"expected dim={dim} dtype={dtype}"
+                )
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dim": dim, "dtype": dtype}, f)
+
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._scales_path = os.path.join(path, "scales.bin")
+        self._keys_path = os.path.join(path, "keys.bin")
+        self._lock_path = os.path.join(path, ".lock")
+        for file_path in (self._vectors_path, self._scales_path, self._keys_path):
+            open(file_path, "ab").close()
+
+        self._row_bytes = dim * np.dtype(DTYPES[dtype]).itemsize
+        self.index = {}
+        self.vectors = None
+        self.scales = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return _key_digest(key) in self.index
+
+    def refresh(self) -> None:
+        """Map rows appended since the last refresh (possibly by another process)"""
+        key_rows = os.path.getsize(self._keys_path) // KEY_BYTES
+        data_rows = os.path.getsize(self._vectors_path) // self._row_bytes
+        count = min(key_rows, data_rows)
+        if self.dtype == "int8":
+            count = min(count, os.path.getsize(self._scales_path) // 4)
+
+        if count > len(self.index):
+            with open(self._keys_path, "rb") as f:
+                f.seek(len(self.index) * KEY_BYTES)
+                raw = f.read((count - len(self.index)) * KEY_BYTES)
+            start = len(self.index)
+            for i in range(count - start):
+                self.index.setdefault(raw[i * KEY_BYTES:(i + 1) * KEY_BYTES], start + i)
+
+        if count and (self.vectors is None or len(self.vectors) != count):
+            self.vectors = np.memmap(self._vectors_path, dtype=DTYPES[self.dtype], mode="r", shape=(count, self.dim))
+            if self.dtype == "int8":
+                self.scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(count,))
+
+    def rows_for(self, keys: List[str]) -> np.ndarray:
+        """Row number of each key in the mapped matrix, -1 if missing"""
+        rows = np.array([self.index.get(_key_digest(key), -1) for key in keys], dtype=np.int64)
+        if (rows < 0).any():
+            self.refresh()
+            rows = np.array([self.index.get(_key_digest(key), -1) for key in keys], dtype=np.int64)
+        return rows
+
+    def get_many(self, keys: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up embeddings
+
+        Returns:
+            (len(keys) x dim float32 matrix with zero rows for misses, boolean found mask)
+        """
+        rows = self.rows_for(keys)
+        found = rows >= 0
+        result = np.zeros((len(keys), self.dim), dtype=np.float32)
+        if found.any():
+            result[found] = self._decode(rows[found])
+        return result, found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        matrix, found = self.get_many([key])
+        return matrix[0] if found[0] else None
+
+    def put_many(self, keys: List[str], embeddings: np.ndarray) -> None:
+        """Append embeddings for keys not yet stored"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(keys), self.dim)
+
+        with open(self._lock_path, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                new_rows = {}
+                for key, row in zip(keys, embeddings):
+                    digest = _key_digest(key)
+                    if digest not in self.index and digest not in new_rows:
+                        new_rows[digest] = row
+                if not new_rows:
+                    return
+
+                matrix = np.vstack(list(new_rows.values()))
+                if self.dtype == "int8":
+                    scales = np.abs(matrix).max(axis=1) / 127.0
+                    scales[scales == 0] = 1.0
+                    encoded = np.round(matrix / scales[:, None]).astype(np.int8)
+                    self._append(self._scales_path, scales.astype(np.float32).tobytes(), len(self.index) * 4)
+                else:
+                    encoded = matrix.astype(np.float16)
+
+                # Data before keys: a row is only visible once its key is written
+                self._append(self._vectors_path, encoded.tobytes(), len(self.index) * self._row_bytes)
+                self._append(self._keys_path, b"".join(new_rows.keys()), len(self.index) * KEY_BYTES)
+                self.refresh()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append(self, file_path: str, data: bytes, offset: int) -> None:
+        # Write at the committed offset so a torn write from a crashed writer is overwritten
+        with open(file_path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        values = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            values *= np.asarray(self.scales[rows], dtype=np.float32)[:, None]
+        return values
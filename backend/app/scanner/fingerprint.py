@@ -0,0 +1,133 @@
+"""Document fingerprinting with winnowing (MOSS approach) for candidate pair selection"""
+from typing import List, Dict, Iterable, Set
+from collections import defaultdict, deque
+import re
+import zlib
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _kgram_hashes(text: str, k: int) -> List[int]:
+    """
+    Hash every k-gram of normalized words
+
+    Uses crc32 rather than hash() so fingerprints are stable across processes
+    and can be persisted.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return []
+    if len(tokens) < k:
+        return [zlib.crc32(" ".join(tokens).encode("utf-8"))]
+
+    return [
+        zlib.crc32(" ".join(tokens[i:i + k]).encode("utf-8"))
+        for i in range(len(tokens) - k + 1)
+    ]
+
+
+def shingle_set(text: str, size: int = 3) -> Set[int]:
+    """Hashed set of all word shingles (every k-gram, no winnowing) for exact overlap tests"""
+    if not text:
+        return set()
+    return set(_kgram_hashes(text, size))
+
+
+def winnow_fingerprints(text: str, k: int = 5, window: int = 4) -> Set[int]:
+    """
+    Select document fingerprints by winnowing over k-gram hashes
+
+    In every window of `window` consecutive k-gram hashes the minimum (rightmost on
+    ties) is kept, which guarantees that any shared passage of at least
+    window + k - 1 words produces at least one shared fingerprint.
+
+    Args:
+        text: Document text (normalized internally)
+        k: Number of words per k-gram (default: 5)
+        window: Winnowing window size (default: 4)
+
+    Returns:
+        Set of fingerprint hashes
+    """
+    if not text:
+        return set()
+
+    hashes = _kgram_hashes(text, k)
+    if len(hashes) <= window:
+        return {min(hashes)} if hashes else set()
+
+    fingerprints = set()
+    candidates = deque()  # Indices with increasing hash values (monotonic queue)
+
+    for i, value in enumerate(hashes):
+        while candidates and hashes[candidates[-1]] >= value:
+            candidates.pop()
+        candidates.append(i)
+
+        if candidates[0] <= i - window:
+            candidates.popleft()
+
+        if i >= window - 1:
+            fingerprints.add(hashes[candidates[0]])
+
+    return fingerprints
+
+
+class FingerprintIndex:
+    """Inverted index from fingerprint to the files containing it"""
+
+    def __init__(self, max_posting_size: int = 1000):
+        """
+        Args:
+            max_posting_size: Fingerprints shared by more files than this are treated
+                as boilerplate and ignored when counting overlap
+        """
+        self.max_posting_size = max_posting_size
+        self.postings: Dict[int, List[str]] = defaultdict(list)
+        self.fingerprints: Dict[str, Set[int]] = {}
+
+    def add(self, file_id: str, fingerprints: Iterable[int]) -> None:
+        """Add a file's fingerprints to the index"""
+        fingerprints = set(fingerprints)
+        self.fingerprints[file_id] = fingerprints
+        for fingerprint in fingerprints:
+            self.postings[fingerprint].append(file_id)
+
+    def containment_candidates(self, file_id: str, min_containment: float = 0.6) -> Dict[str, float]:
+        """
+        Find files that contain most of this file's fingerprints
+
+        Args:
+            file_id: File whose content should be contained in the candidates
+            min_containment: Minimum fraction of this file's fingerprints a candidate must share
+
+        Returns:
+            Mapping of candidate file ID to fingerprint containment (0-1)
+        """
+        fingerprints = self.fingerprints.get(file_id)
+        if not fingerprints:
+            return {}
+
+        shared_counts = defaultdict(int)
+        counted = 0
+
+        for fingerprint in fingerprints:
+            posting = self.postings.get(fingerprint, [])
+            if len(posting) > self.max_posting_size:
+                continue  # Boilerplate, present almost everywhere
+            counted += 1
+            for other_id in posting:
+                if other_id != file_id:
+                    shared_counts[other_id] += 1
+
+        if counted == 0:
+            return {}
+
+        candidates = {}
+        for other_id, shared in shared_counts.items():
+            containment = shared / counted
+            if containment >= min_containment:
+                candidates[other_id] = containment
+
+        return candidates
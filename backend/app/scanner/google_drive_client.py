@@ -1,12 +1,65 @@
 """Google Drive API client"""
 import httpx
-from typing import List, Dict, Optional
+import json
+import re
+import uuid
+from collections import defaultdict, deque
+from typing import List, Dict, Optional, Set
+
+from app.scanner.batch_requests import ItemResult, execute_batched
+
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+def _file_record(file: Dict) -> Dict:
+    """Scanner file dict from a Drive files.list entry"""
+    return {
+        "id": file["id"],
+        "name": file["name"],
+        "size": int(file.get("size", 0)),
+        "mime_type": file.get("mimeType", ""),
+        "last_modified": file.get("modifiedTime"),
+        "web_url": file.get("webViewLink"),
+        "etag": file.get("md5Checksum"),
+        "source": "Google Drive"
+    }
+
+
+def _select_subtrees(items: List[Dict], roots: Set[str], include_subfolders: bool = True) -> Set[str]:
+    """
+    IDs of the selected folders and (optionally) every folder below them
+    
+    Args:
+        items: Flat listing with `parents`, as returned by files.list
+        roots: Selected folder IDs
+        include_subfolders: If False, only the roots themselves
+    """
+    selected = set(roots)
+    if not include_subfolders:
+        return selected
+    
+    children = defaultdict(list)
+    for item in items:
+        if item.get("mimeType") == FOLDER_MIME:
+            for parent in item.get("parents", []):
+                children[parent].append(item["id"])
+    
+    frontier = deque(roots)
+    while frontier:
+        for child in children.get(frontier.popleft(), []):
+            if child not in selected:
+                selected.add(child)
+                frontier.append(child)
+    return selected
 
 
 class GoogleDriveClient:
     """Client for Google Drive API"""
     
     BASE_URL = "https://www.googleapis.com/drive/v3"
+    BATCH_URL = "https://www.googleapis.com/batch/drive/v3"
+    BATCH_LIMIT = 100  # Drive accepts at most 100 calls per batch request
     
     def __init__(self, access_token: str):
         self.access_token = access_token
@@ -55,14 +108,26 @@ class GoogleDriveClient:
             except:
                 return {}
     
-    async def list_all_files(self, folder_ids: Optional[List[str]] = None, include_subfolders: bool = True) -> List[Dict]:
+    async def list_all_files(
+        self,
+        folder_ids: Optional[List[str]] = None,
+        include_subfolders: bool = True,
+        mode: Optional[str] = None
+    ) -> List[Dict]:
         """
         List all files from specified folders in Google Drive
         
         Args:
             folder_ids: List of folder IDs to scan. If None, scans entire Drive (legacy behavior)
             include_subfolders: If True, recursively scans all subfolders
+            mode: "folders" (two queries per folder) or "flat" (page through the whole
+                drive once, see list_all_files_flat); default settings.drive_listing_mode
         """
+        from app.config import settings
+        
+        if (mode or settings.drive_listing_mode) == "flat":
+            return await self.list_all_files_flat(folder_ids, include_subfolders)
+        
         all_files = []
         folders_to_scan = set(folder_ids or [])
         scanned_folders = set()
@@ -97,6 +162,102 @@ class GoogleDriveClient:
         print(f"\nTotal files found: {len(all_files)}")
         return all_files
     
+    async def list_all_files_flat(self, folder_ids: Optional[List[str]] = None, include_subfolders: bool = True) -> List[Dict]:
+        """
+        List files under the given folders from one flat listing of their drives
+        
+        Instead of querying folder by folder, every file and folder of each drive
+        involved (My Drive or a shared drive) is paged through once with its `parents`,
+        the folder tree is rebuilt in memory and files are kept if they sit in a
+        selected folder's subtree. A deep tree then costs a few dozen 1000-item pages
+        instead of two queries per folder.
+        
+        corpora=user also returns files merely shared with the user. Under selected
+        folders the subtree filter keeps exactly what the folder-by-folder listing
+        finds (including other people's files in those folders); a whole-drive scan
+        only lists files the user owns, as "Shared with me" is not part of My Drive.
+        
+        Args:
+            folder_ids: Folders to scan. If None, every file the user owns
+            include_subfolders: If False, only files directly in the selected folders
+        """
+        print("Listing files from Google Drive (flat listing)...")
+        
+        # Resolve aliases like "root" and find which drive each folder lives on
+        roots_by_drive: Dict[Optional[str], Set[str]] = defaultdict(set)
+        for folder_id in folder_ids or []:
+            try:
+                folder = await self._request("GET", f"/files/{folder_id}", params={
+                    "fields": "id, driveId",
+                    "supportsAllDrives": "true"
+                })
+            except Exception as e:
+                print(f"Error resolving folder {folder_id}: {e}")
+                continue
+            roots_by_drive[folder.get("driveId")].add(folder["id"])
+        if not folder_ids:
+            roots_by_drive[None] = set()
+        
+        all_files = []
+        seen_ids = set()
+        for drive_id, roots in roots_by_drive.items():
+            items = await self._list_drive_items(drive_id, owned_only=not folder_ids)
+            selected = _select_subtrees(items, roots, include_subfolders) if folder_ids else None
+            
+            for item in items:
+                if item.get("mimeType") == FOLDER_MIME or item["id"] in seen_ids:
+                    continue
+                if selected is not None and not selected.intersection(item.get("parents", [])):
+                    continue
+                # Only process files that have a size (can be downloaded)
+                if item.get("size"):
+                    seen_ids.add(item["id"])
+                    all_files.append(_file_record(item))
+            
+            if folder_ids:
+                print(f"  📁 {len(selected)} folder(s) selected on {drive_id or 'My Drive'}")
+        
+        print(f"\nTotal files found: {len(all_files)}")
+        return all_files
+    
+    async def _list_drive_items(self, drive_id: Optional[str] = None, owned_only: bool = False) -> List[Dict]:
+        """
+        Every non-trashed file and folder of a shared drive, or of the user's corpus if None
+        
+        Args:
+            drive_id: Shared drive ID, or None for the user's corpus
+            owned_only: Only items the user owns (corpora=user includes shared items)
+        """
+        items = []
+        page_token = None
+        pages = 0
+        
+        params = {
+            "q": "trashed=false and 'me' in owners" if owned_only and not drive_id else "trashed=false",
+            "fields": "nextPageToken, files(id, name, size, mimeType, modifiedTime, webViewLink, md5Checksum, parents)",
+            "pageSize": 1000,
+            "supportsAllDrives": "true",
+            "includeItemsFromAllDrives": "true",
+        }
+        if drive_id:
+            params.update({"corpora": "drive", "driveId": drive_id})
+        else:
+            params["corpora"] = "user"
+        
+        while True:
+            if page_token:
+                params["pageToken"] = page_token
+            result = await self._request("GET", "/files", params=params)
+            items.extend(result.get("files", []))
+            pages += 1
+            
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+        
+        print(f"  Listed {len(items)} items of {drive_id or 'My Drive'} in {pages} page(s)")
+        return items
+    
     async def _list_files_in_folder(self, folder_id: str) -> List[Dict]:
         """List all files (non-folders) in a specific folder"""
         files = []
@@ -109,7 +270,7 @@ class GoogleDriveClient:
                 
                 params = {
                     "q": query,
-                    "fields": "nextPageToken, files(id, name, size, mimeType, modifiedTime, webViewLink)",
+                    "fields": "nextPageToken, files(id, name, size, mimeType, modifiedTime, webViewLink, md5Checksum)",
                     "pageSize": 1000,
                 }
                 
@@ -122,15 +283,7 @@ class GoogleDriveClient:
                 for file in page_files:
                     # Only process files that have a size (can be downloaded)
                     if file.get("size"):
-                        files.append({
-                            "id": file["id"],
-                            "name": file["name"],
-                            "size": int(file.get("size", 0)),
-                            "mime_type": file.get("mimeType", ""),
-                            "last_modified": file.get("modifiedTime"),
-                            "web_url": file.get("webViewLink"),
-                            "source": "Google Drive"
-                        })
+                        files.append(_file_record(file))
                         print(f"    ✅ File: {file['name']} ({file.get('size', 0)} bytes)")
                     else:
                         print(f"    ⏭️  Skipping: {file['name']} (Google Workspace file)")
@@ -195,6 +348,41 @@ class GoogleDriveClient:
             response.raise_for_status()
             return response.content
     
+    async def get_file_range(self, file_id: str, start: int, end: int) -> bytes:
+        """Download bytes start..end (inclusive) of a file with an HTTP Range request"""
+        url = f"{self.BASE_URL}/files/{file_id}?alt=media"
+        headers = {**self.headers, "Range": f"bytes={start}-{end}"}
+        
+        async with httpx.AsyncClient() as client:
+            response = await client.get(url, headers=headers)
+            if response.status_code == 401:
+                raise httpx.HTTPStatusError(
+                    "Token expired or invalid",
+                    request=response.request,
+                    response=response
+                )
+            response.raise_for_status()
+            if response.status_code == 200:
+                # Server ignored the Range header and sent the whole file
+                return response.content[start:end + 1]
+            return response.content
+    
+    async def stream_file_content(self, file_id: str, chunk_size: int = 1024 * 1024):
+        """Download file content as an async stream of chunks (never held in memory whole)"""
+        url = f"{self.BASE_URL}/files/{file_id}?alt=media"
+        
+        async with httpx.AsyncClient() as client:
+            async with client.stream("GET", url, headers=self.headers) as response:
+                if response.status_code == 401:
+                    raise httpx.HTTPStatusError(
+                        "Token expired or invalid",
+                        request=response.request,
+                        response=response
+                    )
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    yield chunk
+    
     async def delete_file(self, file_id: str, permanent: bool = False) -> None:
         """
         Delete a file (soft delete to trash by default, or permanent)
@@ -210,7 +398,127 @@ class GoogleDriveClient:
             # Soft delete: move to trash
             await self._request("PATCH", f"/files/{file_id}", json={"trashed": True})
     
+    async def batch_delete_files(
+        self,
+        file_ids: List[str],
+        permanent: bool = False,
+        max_retries: int = 3
+    ) -> Dict[str, Optional[str]]:
+        """
+        Trash (or permanently delete) many files through the multipart batch endpoint
+        
+        Sends up to BATCH_LIMIT calls per HTTP request; items that are throttled or hit
+        a transient error are retried individually in later batches.
+        
+        Args:
+            file_ids: IDs of files to delete
+            permanent: If True, permanently delete. If False, move to trash (default)
+            max_retries: Extra attempts for throttled / transiently failing items
+        
+        Returns:
+            {file_id: None if deleted, else the error message}
+        """
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            return await execute_batched(
+                file_ids,
+                lambda batch: self._send_delete_batch(client, batch, permanent),
+                batch_size=self.BATCH_LIMIT,
+                max_retries=max_retries
+            )
+    
+    async def _send_delete_batch(
+        self,
+        client: httpx.AsyncClient,
+        file_ids: List[str],
+        permanent: bool
+    ) -> Dict[str, ItemResult]:
+        """Send one multipart/mixed batch; returns {file_id: (status, error, retry_after)}"""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for i, file_id in enumerate(file_ids):
+            if permanent:
+                call = f"DELETE /drive/v3/files/{file_id} HTTP/1.1\r\n\r\n"
+            else:
+                call = (
+                    f"PATCH /drive/v3/files/{file_id}?fields=id HTTP/1.1\r\n"
+                    "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                    '{"trashed": true}'
+                )
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <item-{i}>\r\n\r\n"
+                f"{call}\r\n"
+            )
+        body = "".join(parts) + f"--{boundary}--\r\n"
+        
+        response = await client.post(
+            self.BATCH_URL,
+            content=body.encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {self.access_token}",
+                "Content-Type": f"multipart/mixed; boundary={boundary}"
+            }
+        )
+        if response.status_code == 401:
+            raise httpx.HTTPStatusError(
+                "Token expired or invalid. Please sign in again.",
+                request=response.request,
+                response=response
+            )
+        response.raise_for_status()
+        
+        results = {}
+        for index, status, error, retry_after in _parse_batch_response(response):
+            if index is not None and 0 <= index < len(file_ids):
+                results[file_ids[index]] = (status, error, retry_after)
+        return results
+    
     async def restore_file(self, file_id: str) -> None:
         """Restore a file from trash"""
         await self._request("PATCH", f"/files/{file_id}", json={"trashed": False})
 
+
+
+def _parse_batch_response(response: httpx.Response):
+    """
+    Split a multipart/mixed batch response into per-call results
+    
+    Yields:
+        (item index from Content-ID, HTTP status, error message or None, Retry-After seconds or None)
+    """
+    match = re.search(r'boundary="?([^";]+)"?', response.headers.get("content-type", ""))
+    if not match:
+        raise ValueError("Batch response is not multipart/mixed")
+    
+    for part in response.text.split(f"--{match.group(1)}"):
+        part = part.strip()
+        if not part or part == "--":
+            continue
+        
+        # Part headers, blank line, then the embedded HTTP response
+        part_headers, _, http_response = part.replace("\r\n", "\n").partition("\n\n")
+        content_id = re.search(r"Content-ID:\s*<response-item-(\d+)>", part_headers, re.IGNORECASE)
+        status_line, _, rest = http_response.partition("\n")
+        status_match = re.match(r"HTTP/[\d.]+\s+(\d{3})", status_line)
+        if not status_match:
+            continue
+        status = int(status_match.group(1))
+        headers, _, body = rest.partition("\n\n")
+        
+        error = None
+        if status >= 400:
+            error = body.strip() or f"HTTP {status}"
+            try:
+                error = json.loads(body).get("error", {}).get("message", error)
+            except ValueError:
+                pass
+            error = f"Google Drive API error: {status} - {error}"
+        
+        retry_after = re.search(r"^Retry-After:\s*(\d+)", headers, re.IGNORECASE | re.MULTILINE)
+        yield (
+            int(content_id.group(1)) if content_id else None,
+            status,
+            error,
+            float(retry_after.group(1)) if retry_after else None
+        )
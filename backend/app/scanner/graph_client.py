@@ -1,13 +1,18 @@
 """Microsoft Graph API client - no database needed"""
 import httpx
-from typing import List, Dict, Optional
+from collections import deque
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import asyncio
+import time
+
+from app.scanner.batch_requests import ItemResult, execute_batched, is_retryable
 
 
 class GraphClient:
     """Client for Microsoft Graph API"""
     
     BASE_URL = "https://graph.microsoft.com/v1.0"
+    BATCH_LIMIT = 20  # JSON $batch accepts at most 20 requests
     
     def __init__(self, access_token: str):
         self.access_token = access_token
@@ -15,137 +20,255 @@ class GraphClient:
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
+        self.crawl_stats = {}  # Throughput of the last iter_files crawl
     
-    async def _request(self, method: str, endpoint: str, **kwargs) -> Dict:
-        """Make API request"""
-        url = f"{self.BASE_URL}{endpoint}"
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        client: Optional[httpx.AsyncClient] = None,
+        **kwargs
+    ) -> Dict:
+        """Make API request (on the given client, e.g. one shared by a whole crawl)"""
+        if client is None:
+            async with httpx.AsyncClient() as client:
+                return await self._request(method, endpoint, client, **kwargs)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method,
-                url,
-                headers=self.headers,
-                **kwargs
+        url = f"{self.BASE_URL}{endpoint}"
+        response = await client.request(
+            method,
+            url,
+            headers=self.headers,
+            **kwargs
+        )
+        if response.status_code == 401:
+            # Token might be expired or invalid
+            error_detail = "Token expired or invalid. Get a fresh token from Graph Explorer."
+            try:
+                error_json = response.json()
+                error_detail = error_json.get("error", {}).get("message", error_detail)
+            except:
+                pass
+            raise httpx.HTTPStatusError(
+                f"Graph API error: {response.status_code} - {error_detail}",
+                request=response.request,
+                response=response
             )
-            if response.status_code == 401:
-                # Token might be expired or invalid
-                error_detail = "Token expired or invalid. Get a fresh token from Graph Explorer."
-                try:
-                    error_json = response.json()
-                    error_detail = error_json.get("error", {}).get("message", error_detail)
-                except:
-                    pass
-                raise httpx.HTTPStatusError(
-                    f"Graph API error: {response.status_code} - {error_detail}",
-                    request=response.request,
-                    response=response
-                )
-            elif response.status_code >= 400:
-                error_detail = response.text
-                try:
-                    error_json = response.json()
-                    error_detail = error_json.get("error", {}).get("message", error_detail)
-                except:
-                    pass
-                raise httpx.HTTPStatusError(
-                    f"Graph API error: {response.status_code} - {error_detail}",
-                    request=response.request,
-                    response=response
-                )
-            return response.json()
-    
-    async def get_user_drive(self) -> Dict:
+        elif response.status_code >= 400:
+            error_detail = response.text
+            try:
+                error_json = response.json()
+                error_detail = error_json.get("error", {}).get("message", error_detail)
+            except:
+                pass
+            raise httpx.HTTPStatusError(
+                f"Graph API error: {response.status_code} - {error_detail}",
+                request=response.request,
+                response=response
+            )
+        return response.json()
+    
+    @staticmethod
+    def _listing_client(concurrency: int) -> httpx.AsyncClient:
+        """One connection pool for a whole listing, sized for its concurrent calls"""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+    
+    async def get_user_drive(self, client: Optional[httpx.AsyncClient] = None) -> Dict:
         """Get user's OneDrive"""
-        result = await self._request("GET", "/me/drive")
+        result = await self._request("GET", "/me/drive", client)
         return result
     
-    async def get_sites(self) -> List[Dict]:
+    async def get_sites(self, client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
         """Get SharePoint sites user has access to"""
         try:
             # Try to get sites - might fail if no permissions
-            result = await self._request("GET", "/me/sites?$select=id,name,webUrl")
+            result = await self._request("GET", "/me/sites?$select=id,name,webUrl", client)
             return result.get("value", [])
         except Exception:
             # If user doesn't have Sites.Read.All, return empty list
             return []
     
-    async def get_drives(self, site_id: str) -> List[Dict]:
+    async def get_drives(self, site_id: str, client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
         """Get document libraries for a site"""
-        result = await self._request("GET", f"/sites/{site_id}/drives")
+        result = await self._request("GET", f"/sites/{site_id}/drives", client)
         return result.get("value", [])
     
-    async def list_files(self, drive_id: str, folder_id: str = "root", recursive: bool = True) -> List[Dict]:
-        """List files in a drive/folder"""
-        files = []
-        folders_to_process = [(drive_id, folder_id)]
-        processed_folders = set()  # Avoid processing same folder twice
-        max_depth = 10  # Prevent infinite loops
-        depth = 0
-        
-        while folders_to_process and depth < max_depth:
-            current_drive_id, current_folder_id = folders_to_process.pop(0)
-            depth += 1
-            
-            # Skip if already processed
-            folder_key = f"{current_drive_id}:{current_folder_id}"
-            if folder_key in processed_folders:
-                continue
-            processed_folders.add(folder_key)
-            
+    # Only the fields needed to build file records (and to tell files from folders)
+    LIST_SELECT = "id,name,size,file,folder,lastModifiedDateTime,webUrl,eTag,parentReference"
+    PAGE_SIZE = 999  # Largest $top accepted for driveItem children
+    LISTING_QUEUE_SIZE = 10000  # Files listed ahead of a slower caller before crawls wait
+    
+    async def _get_page(self, endpoint: str, client: Optional[httpx.AsyncClient] = None, max_retries: int = 3) -> Dict:
+        """GET one listing page, backing off on throttling (429/503 with Retry-After)"""
+        for attempt in range(max_retries + 1):
+            try:
+                return await self._request("GET", endpoint, client)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if not is_retryable(status, str(e)) or attempt == max_retries:
+                    raise
+                retry_after = e.response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+                print(f"    🔁 Graph throttled listing ({status}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+    
+    async def iter_files(
+        self,
+        drive_id: str,
+        folder_id: str = "root",
+        recursive: bool = True,
+        concurrency: Optional[int] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        client: Optional[httpx.AsyncClient] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield the files of a drive/folder, crawling subfolders concurrently
+        
+        Folders wait in a FIFO frontier and `concurrency` workers take folders from it,
+        page through their children ($top=999, minimal $select) and push subfolders
+        back. Every folder is visited once, however deep the tree. Throughput stats of
+        the last crawl are kept in self.crawl_stats.
+        
+        Args:
+            drive_id: Drive to list
+            folder_id: Folder to start from ("root" for the whole drive)
+            recursive: Descend into subfolders
+            concurrency: Folders listed at the same time (default settings.graph_list_concurrency)
+            semaphore: Shared limit on Graph calls in flight (e.g. across several drives)
+            client: HTTP client to list with (e.g. shared across several drives); by
+                default one client (connection pool) is opened for this crawl
+        """
+        from app.config import settings
+        
+        workers = max(concurrency or settings.graph_list_concurrency, 1)
+        own_client = client is None
+        if own_client:
+            client = self._listing_client(workers)
+        frontier = deque([folder_id])
+        seen = {folder_id}
+        active = [0]
+        changed = asyncio.Condition()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.LISTING_QUEUE_SIZE)
+        done = object()
+        stats = {"folders": 0, "items": 0, "files": 0, "pages": 0, "errors": 0}
+        started = time.monotonic()
+        
+        async def next_folder() -> Optional[str]:
+            async with changed:
+                while not frontier and active[0]:
+                    await changed.wait()
+                if not frontier:
+                    changed.notify_all()  # Crawl finished: wake the other idle workers
+                    return None
+                active[0] += 1
+                return frontier.popleft()
+        
+        async def crawl(current_folder_id: str) -> None:
             # Handle "root" folder specially
             if current_folder_id == "root":
-                endpoint = f"/drives/{current_drive_id}/root/children"
+                endpoint = f"/drives/{drive_id}/root/children"
             else:
-                endpoint = f"/drives/{current_drive_id}/items/{current_folder_id}/children"
+                endpoint = f"/drives/{drive_id}/items/{current_folder_id}/children"
+            endpoint += f"?$top={self.PAGE_SIZE}&$select={self.LIST_SELECT}"
             
-            try:
-                folder_name = "root" if current_folder_id == "root" else current_folder_id
-                print(f"  Scanning folder: {folder_name} (depth {depth})")
+            while endpoint:
+                if semaphore:
+                    async with semaphore:
+                        result = await self._get_page(endpoint, client)
+                else:
+                    result = await self._get_page(endpoint, client)
+                stats["pages"] += 1
+                
+                subfolders = []
+                for item in result.get("value", []):
+                    stats["items"] += 1
+                    if "file" in item:  # It's a file
+                        stats["files"] += 1
+                        await queue.put({
+                            "id": item["id"],
+                            "name": item["name"],
+                            "size": item.get("size", 0),
+                            "last_modified": item.get("lastModifiedDateTime"),
+                            "web_url": item.get("webUrl"),
+                            "etag": item.get("eTag"),
+                            "drive_id": drive_id,
+                            "path": item.get("parentReference", {}).get("path", "")
+                        })
+                    elif "folder" in item and recursive and item["id"] not in seen:
+                        seen.add(item["id"])
+                        subfolders.append(item["id"])
+                
+                if subfolders:
+                    async with changed:
+                        frontier.extend(subfolders)
+                        changed.notify_all()
                 
-                while endpoint:
-                    result = await self._request("GET", endpoint)
-                    items = result.get("value", [])
-                    
-                    print(f"    Found {len(items)} items in folder")
-                    
-                    if len(items) == 0:
-                        print(f"    ⚠️ Empty folder or no access")
-                    
-                    for item in items:
-                        if "file" in item:  # It's a file
-                            files.append({
-                                "id": item["id"],
-                                "name": item["name"],
-                                "size": item.get("size", 0),
-                                "last_modified": item.get("lastModifiedDateTime"),
-                                "web_url": item.get("webUrl"),
-                                "drive_id": current_drive_id,
-                                "path": item.get("parentReference", {}).get("path", "")
-                            })
-                            print(f"      ✅ File: {item['name']} ({item.get('size', 0)} bytes)")
-                        elif "folder" in item and recursive:  # It's a folder
-                            # Add folder to process list
-                            folders_to_process.append((current_drive_id, item["id"]))
-                            print(f"      📁 Folder: {item['name']} (will scan)")
-                    
-                    # Check for next page
-                    next_link = result.get("@odata.nextLink", "")
-                    if next_link:
-                        # Handle full URL or relative path
-                        if next_link.startswith("http"):
-                            endpoint = next_link.replace(self.BASE_URL, "")
-                        else:
-                            endpoint = next_link
-                    else:
-                        endpoint = None
+                # Next page link is a full URL that keeps $top/$select
+                next_link = result.get("@odata.nextLink", "")
+                endpoint = next_link.replace(self.BASE_URL, "") if next_link else None
+        
+        async def worker() -> None:
+            while True:
+                current_folder_id = await next_folder()
+                if current_folder_id is None:
+                    return
+                try:
+                    await crawl(current_folder_id)
+                except Exception as e:
+                    stats["errors"] += 1
+                    print(f"    ❌ Error listing files from folder {current_folder_id}: {e}")
+                finally:
+                    stats["folders"] += 1
+                    if stats["folders"] % 500 == 0:
+                        self._report_crawl(stats, started, len(frontier))
+                    async with changed:
+                        active[0] -= 1
+                        changed.notify_all()
+        
+        async def run() -> None:
+            try:
+                await asyncio.gather(*(worker() for _ in range(workers)))
             except Exception as e:
-                print(f"    ❌ Error listing files from folder {current_folder_id}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+                print(f"    ❌ Error listing drive {drive_id}: {e}")
+            # Not reached when cancelled: the reader is gone and the queue may be full
+            await queue.put(done)
         
-        print(f"  Total files found: {len(files)}")
-        return files
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            await task
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.crawl_stats = self._report_crawl(stats, started, 0)
+            if own_client:
+                await client.aclose()
+    
+    @staticmethod
+    def _report_crawl(stats: Dict, started: float, queued: int) -> Dict:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        report = {
+            **stats,
+            "seconds": round(elapsed, 3),
+            "folders_per_second": round(stats["folders"] / elapsed, 1),
+            "items_per_second": round(stats["items"] / elapsed, 1)
+        }
+        print(
+            f"  📂 {stats['folders']} folders, {stats['items']} items ({stats['files']} files) in "
+            f"{elapsed:.1f}s - {report['folders_per_second']} folders/s, {report['items_per_second']} items/s"
+            + (f", {queued} folders queued" if queued else "")
+        )
+        return report
+    
+    async def list_files(self, drive_id: str, folder_id: str = "root", recursive: bool = True) -> List[Dict]:
+        """List files in a drive/folder (see iter_files)"""
+        return [file async for file in self.iter_files(drive_id, folder_id, recursive)]
     
     async def get_file_content(self, drive_id: str, file_id: str) -> bytes:
         """Download file content"""
@@ -156,6 +279,30 @@ class GraphClient:
             response.raise_for_status()
             return response.content
     
+    async def get_file_range(self, drive_id: str, file_id: str, start: int, end: int) -> bytes:
+        """Download bytes start..end (inclusive) of a file with an HTTP Range request"""
+        url = f"{self.BASE_URL}/drives/{drive_id}/items/{file_id}/content"
+        headers = {**self.headers, "Range": f"bytes={start}-{end}"}
+        
+        # /content redirects to a pre-authenticated download URL that honours Range
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            response = await client.get(url, headers=headers)
+            response.raise_for_status()
+            if response.status_code == 200:
+                # Server ignored the Range header and sent the whole file
+                return response.content[start:end + 1]
+            return response.content
+    
+    async def stream_file_content(self, drive_id: str, file_id: str, chunk_size: int = 1024 * 1024):
+        """Download file content as an async stream of chunks (never held in memory whole)"""
+        url = f"{self.BASE_URL}/drives/{drive_id}/items/{file_id}/content"
+        
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            async with client.stream("GET", url, headers=self.headers) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    yield chunk
+    
     async def get_file_metadata(self, drive_id: str, file_id: str) -> Dict:
         """Get file metadata"""
         return await self._request(
@@ -167,64 +314,168 @@ class GraphClient:
         """Delete a file"""
         await self._request("DELETE", f"/drives/{drive_id}/items/{file_id}")
     
-    async def list_all_files(self, site_id: Optional[str] = None) -> List[Dict]:
-        """List all files from user's OneDrive and accessible SharePoint sites"""
-        all_files = []
+    async def batch_delete_files(
+        self,
+        items: List[Tuple[str, str]],
+        max_retries: int = 3
+    ) -> Dict[Tuple[str, str], Optional[str]]:
+        """
+        Delete many files (moved to the site/OneDrive recycle bin) through JSON $batch
         
-        # Start with user's OneDrive (most common case)
-        try:
-            print("Getting user's OneDrive...")
-            drive = await self.get_user_drive()
-            drive_id = drive["id"]
-            drive_name = drive.get("name", "OneDrive")
-            
-            print(f"Listing files from {drive_name}...")
-            files = await self.list_files(drive_id)
-            
-            # Add drive info to each file
-            for file in files:
-                file["drive_id"] = drive_id
-                file["drive_name"] = drive_name
-                file["source"] = "OneDrive"
-            
-            all_files.extend(files)
-            print(f"Found {len(files)} files in OneDrive")
-        except Exception as e:
-            print(f"Error accessing OneDrive: {e}")
+        Sends up to BATCH_LIMIT requests per call; throttled (429, honouring Retry-After)
+        and transiently failing items are retried individually in later batches.
         
-        # Try to get SharePoint sites (optional, might not have permissions)
-        try:
-            if site_id:
-                sites = [{"id": site_id}]
-            else:
-                sites = await self.get_sites()
-            
-            if sites:
-                print(f"Found {len(sites)} SharePoint sites")
-                
-                # Get files from each site
+        Args:
+            items: (drive_id, file_id) pairs
+            max_retries: Extra attempts for throttled / transiently failing items
+        
+        Returns:
+            {(drive_id, file_id): None if deleted, else the error message}
+        """
+        return await execute_batched(
+            items,
+            self._send_delete_batch,
+            batch_size=self.BATCH_LIMIT,
+            max_retries=max_retries
+        )
+    
+    async def _send_delete_batch(self, items: List[Tuple[str, str]]) -> Dict[Tuple[str, str], ItemResult]:
+        """Send one $batch request; returns {(drive_id, file_id): (status, error, retry_after)}"""
+        result = await self._request("POST", "/$batch", json={
+            "requests": [
+                {"id": str(i), "method": "DELETE", "url": f"/drives/{drive_id}/items/{file_id}"}
+                for i, (drive_id, file_id) in enumerate(items)
+            ]
+        })
+        
+        results = {}
+        for response in result.get("responses", []):
+            try:
+                item = items[int(response["id"])]
+            except (KeyError, ValueError, IndexError):
+                continue
+            status = int(response.get("status", 500))
+            error = None
+            if status >= 400:
+                body = response.get("body") or {}
+                message = body.get("error", {}).get("message") if isinstance(body, dict) else None
+                error = f"Graph API error: {status} - {message or 'Request failed'}"
+            headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+            retry_after = headers.get("retry-after")
+            results[item] = (status, error, float(retry_after) if retry_after else None)
+        return results
+    
+    async def iter_all_files(self, site_id: Optional[str] = None, concurrency: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Yield files from the user's OneDrive and accessible SharePoint sites as they are found
+        
+        The OneDrive, the site list, each site's drive list and each drive's folders are
+        fetched as separate tasks, with at most `concurrency` Graph calls in flight. Files
+        are yielded page by page as they are listed, so the caller can start working
+        before the slowest site has been enumerated.
+        
+        Args:
+            site_id: Only this SharePoint site (plus the OneDrive) instead of all sites
+            concurrency: Concurrent listing calls (default settings.graph_list_concurrency)
+        """
+        from app.config import settings
+        
+        concurrency = max(concurrency or settings.graph_list_concurrency, 1)
+        semaphore = asyncio.Semaphore(concurrency)
+        client = self._listing_client(concurrency)  # One connection pool for every drive and site
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.LISTING_QUEUE_SIZE)  # Backpressure if the caller is slower
+        tasks = set()
+        running = [0]
+        done = object()
+        
+        def spawn(coro) -> None:
+            running[0] += 1
+            tasks.add(asyncio.create_task(run(coro)))
+        
+        async def run(coro) -> None:
+            try:
+                await coro
+            except Exception as e:
+                print(f"Error listing files: {e}")
+            finally:
+                running[0] -= 1
+            # Not reached when cancelled: the reader is gone and the queue may be full
+            if running[0] == 0:
+                await queue.put(done)
+        
+        async def list_drive(drive: Dict, extra: Dict) -> None:
+            # Folder pages of all drives share the semaphore, so files stream per page
+            count = 0
+            files = self.iter_files(drive["id"], semaphore=semaphore, client=client)
+            try:
+                async for file in files:
+                    file.update(extra)
+                    await queue.put(file)
+                    count += 1
+            finally:
+                await files.aclose()  # Stops the drive's crawl if this task is cancelled
+            print(f"Found {count} files in {drive.get('name', 'Unknown')}")
+        
+        async def list_onedrive() -> None:
+            try:
+                print("Getting user's OneDrive...")
+                async with semaphore:
+                    drive = await self.get_user_drive(client)
+                drive_name = drive.get("name", "OneDrive")
+                print(f"Listing files from {drive_name}...")
+                await list_drive(drive, {"drive_id": drive["id"], "drive_name": drive_name, "source": "OneDrive"})
+            except Exception as e:
+                print(f"Error accessing OneDrive: {e}")
+        
+        async def list_site(site: Dict) -> None:
+            try:
+                async with semaphore:
+                    drives = await self.get_drives(site["id"], client)
+                for drive in drives:
+                    spawn(list_drive(drive, {
+                        "site_id": site["id"],
+                        "site_name": site.get("name", ""),
+                        "drive_name": drive.get("name", ""),
+                        "source": "SharePoint"
+                    }))
+            except Exception as e:
+                print(f"Error accessing site {site.get('name', site['id'])}: {e}")
+        
+        async def list_sites() -> None:
+            # Optional - the user might not have Sites.Read.All permission
+            try:
+                if site_id:
+                    sites = [{"id": site_id}]
+                else:
+                    async with semaphore:
+                        sites = await self.get_sites(client)
+                if sites:
+                    print(f"Found {len(sites)} SharePoint sites")
                 for site in sites:
-                    try:
-                        drives = await self.get_drives(site["id"])
-                        
-                        for drive in drives:
-                            files = await self.list_files(drive["id"])
-                            # Add site/drive info to each file
-                            for file in files:
-                                file["site_id"] = site["id"]
-                                file["site_name"] = site.get("name", "")
-                                file["drive_name"] = drive.get("name", "")
-                                file["source"] = "SharePoint"
-                            
-                            all_files.extend(files)
-                            print(f"Found {len(files)} files in {drive.get('name', 'Unknown')}")
-                    except Exception as e:
-                        print(f"Error accessing site {site.get('name', site['id'])}: {e}")
-                        continue
-        except Exception as e:
-            print(f"Error accessing SharePoint sites: {e}")
-            # That's okay, user might not have Sites.Read.All permission
-        
-        print(f"Total files found: {len(all_files)}")
-        return all_files
+                    spawn(list_site(site))
+            except Exception as e:
+                print(f"Error accessing SharePoint sites: {e}")
+        
+        spawn(list_onedrive())
+        spawn(list_sites())
+        
+        total = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                total += 1
+                yield item
+            print(f"Total files found: {total}")
+        finally:
+            # Caller stopped early (or failed): don't leave listings running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*list(tasks), return_exceptions=True)
+            await client.aclose()
+    
+    async def list_all_files(self, site_id: Optional[str] = None) -> List[Dict]:
+        """List all files from user's OneDrive and accessible SharePoint sites"""
+        return [file async for file in self.iter_all_files(site_id)]
 
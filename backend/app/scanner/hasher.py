@@ -1,6 +1,49 @@
 """Content hashing - optimized for large files"""
+import asyncio
 import hashlib
-from typing import Optional
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# xxHash is optional: a fast non-cryptographic hash for bucketing, confirmed with SHA-256
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+
+HASH_ALGORITHMS = {
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),  # Faster than SHA-256 on 64-bit CPUs
+}
+if XXHASH_AVAILABLE:
+    HASH_ALGORITHMS["xxhash"] = xxhash.xxh3_128
+
+# Algorithms whose digests may collide and must be confirmed with SHA-256 before deleting
+NON_CRYPTOGRAPHIC = {"xxhash"}
+
+STREAM_BUFFER_SIZE = 1024 * 1024  # 1MB reads
+
+# Thread pool for hashing off the event loop (hashlib releases the GIL on large buffers)
+_hash_executor = None
+
+
+def new_hasher(algorithm: str = "sha256"):
+    """Create a hashlib-style object (update/hexdigest) for the given algorithm"""
+    if algorithm not in HASH_ALGORITHMS:
+        if algorithm == "xxhash":
+            raise ValueError("xxhash algorithm requested but the xxhash package is not installed")
+        raise ValueError(f"Unknown hash algorithm: {algorithm} (expected one of {', '.join(HASH_ALGORITHMS)})")
+    return HASH_ALGORITHMS[algorithm]()
+
+
+def compute_hash(content: bytes, algorithm: str = "sha256") -> str:
+    """Hash all of content with the given algorithm"""
+    hasher = new_hasher(algorithm)
+    hasher.update(content)
+    return hasher.hexdigest()
 
 
 def compute_sha256(content: bytes) -> str:
@@ -8,59 +51,268 @@ def compute_sha256(content: bytes) -> str:
     return hashlib.sha256(content).hexdigest()
 
 
-def compute_sha256_optimized(content: bytes, max_size: int = 10 * 1024 * 1024) -> str:
+def compute_hash_optimized(content: bytes, algorithm: str = "sha256", max_size: int = 10 * 1024 * 1024) -> str:
     """
-    Compute SHA-256 hash, optimized for large files
+    Compute content hash, optimized for large files
     
     For files larger than max_size, hash first chunk + last chunk + size
-    This is faster but less accurate (may miss some duplicates)
+    This is faster but less accurate (may miss some duplicates). The digests of large
+    files differ from full hashes, so scans do not use it (see hash_file_content).
     
     Args:
         content: File content as bytes
+        algorithm: Hash algorithm name (see HASH_ALGORITHMS)
         max_size: Maximum size to hash fully (default 10MB)
     
     Returns:
-        SHA-256 hash
+        Hex digest
     """
     size = len(content)
     
     # For small files, hash everything
     if size <= max_size:
-        return compute_sha256(content)
+        return compute_hash(content, algorithm)
     
     # For large files, hash first chunk + last chunk + size
     # This catches most duplicates while being much faster
     chunk_size = 1024 * 1024  # 1MB chunks
-    sha256 = hashlib.sha256()
+    hasher = new_hasher(algorithm)
+    view = memoryview(content)
     
     # Hash first chunk
-    sha256.update(content[:chunk_size])
+    hasher.update(view[:chunk_size])
     
     # Hash last chunk
     if size > chunk_size:
-        sha256.update(content[-chunk_size:])
+        hasher.update(view[-chunk_size:])
     
     # Include file size in hash to differentiate files with same start/end
-    sha256.update(str(size).encode())
+    hasher.update(str(size).encode())
+    
+    return hasher.hexdigest()
+
+
+def compute_sha256_optimized(content: bytes, max_size: int = 10 * 1024 * 1024) -> str:
+    """Compute SHA-256 hash, optimized for large files (see compute_hash_optimized)"""
+    return compute_hash_optimized(content, "sha256", max_size)
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for hashing (hash_workers threads, default one per core)"""
+    global _hash_executor
+    if _hash_executor is None:
+        from app.config import settings
+        workers = settings.hash_workers or os.cpu_count() or 4
+        _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+    return _hash_executor
+
+
+async def hash_file_content(content: bytes, algorithm: str = "sha256") -> str:
+    """
+    Full hash of file content on the hashing thread pool (async wrapper)
     
-    return sha256.hexdigest()
+    Scans always hash whole files - downloaded, streamed (tiered hashing) or local -
+    so hashes of the same content match whichever way the file was read.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), compute_hash, content, algorithm)
 
 
-async def hash_file_content(content: bytes) -> str:
-    """Hash file content (async wrapper)"""
-    return compute_sha256_optimized(content)
+async def hash_many(contents: List[bytes], algorithm: str = "sha256") -> List[str]:
+    """Hash several contents in parallel; throughput scales with the thread pool size"""
+    return await asyncio.gather(*(hash_file_content(c, algorithm) for c in contents))
 
 
-def hash_file_stream(stream) -> str:
+def hash_file_stream(stream, algorithm: str = "sha256", buffer_size: int = STREAM_BUFFER_SIZE) -> str:
     """Hash file content from stream (for large files)"""
-    sha256 = hashlib.sha256()
+    hasher = new_hasher(algorithm)
+    
+    # Reuse one large buffer via readinto instead of allocating a bytes object per read
+    if hasattr(stream, "readinto"):
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            n = stream.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+        return hasher.hexdigest()
     
     # Read in chunks
     while True:
-        chunk = stream.read(8192)  # 8KB chunks
+        chunk = stream.read(buffer_size)
         if not chunk:
             break
-        sha256.update(chunk)
+        hasher.update(chunk)
     
-    return sha256.hexdigest()
+    return hasher.hexdigest()
+
 
+async def confirm_hash_buckets(
+    files: List[Dict],
+    rehash: Callable[[Dict], Awaitable[str]],
+    algorithm: str
+) -> None:
+    """
+    Replace non-cryptographic bucket hashes with SHA-256 where buckets collide
+    
+    Files alone in their bucket cannot be exact duplicates and keep the bucket hash.
+    No-op for cryptographic algorithms.
+    
+    Args:
+        files: File dicts with 'content_hash' computed with `algorithm`
+        rehash: async (file) -> SHA-256 hex digest of the full content
+        algorithm: Algorithm used for the bucket hashes
+    """
+    if algorithm not in NON_CRYPTOGRAPHIC:
+        return
+    
+    buckets = defaultdict(list)
+    for file in files:
+        if file.get("content_hash"):
+            buckets[file["content_hash"]].append(file)
+    
+    to_confirm = [f for group in buckets.values() if len(group) > 1 for f in group]
+    confirmed = await asyncio.gather(*(rehash(f) for f in to_confirm), return_exceptions=True)
+    for file, digest in zip(to_confirm, confirmed):
+        if isinstance(digest, Exception):
+            print(f"Error confirming hash of {file.get('name', file['id'])}: {digest}")
+            file["content_hash"] = None  # Unconfirmed: never treat as an exact duplicate
+        else:
+            file["content_hash"] = digest
+
+
+def sample_ranges(size: int, sample_size: int = 4096) -> List[Tuple[int, int]]:
+    """
+    Head, middle and tail byte ranges (inclusive) used for tier-2 partial hashing
+    
+    Small files get a single range covering the whole file.
+    """
+    if size <= 3 * sample_size:
+        return [(0, max(size - 1, 0))]
+    middle = size // 2 - sample_size // 2
+    return [
+        (0, sample_size - 1),
+        (middle, middle + sample_size - 1),
+        (size - sample_size, size - 1),
+    ]
+
+
+def _update_all(hasher, chunks: List[bytes]) -> None:
+    for chunk in chunks:
+        hasher.update(chunk)
+
+
+async def hash_async_stream(chunks, algorithm: str = "sha256", batch_size: int = 4 * STREAM_BUFFER_SIZE) -> str:
+    """
+    Full hash of an async iterator of byte chunks
+    
+    Chunks are hashed on the hashing thread pool in batches of about batch_size bytes,
+    so the event loop only collects them.
+    """
+    loop = asyncio.get_running_loop()
+    hasher = new_hasher(algorithm)
+    batch, batch_bytes = [], 0
+    async for chunk in chunks:
+        batch.append(chunk)
+        batch_bytes += len(chunk)
+        if batch_bytes >= batch_size:
+            await loop.run_in_executor(get_hash_executor(), _update_all, hasher, batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        await loop.run_in_executor(get_hash_executor(), _update_all, hasher, batch)
+    return hasher.hexdigest()
+
+
+async def tiered_content_hashes(
+    files: List[Dict],
+    fetch_range: Callable[[Dict, int, int], Awaitable[bytes]],
+    stream_content: Callable[[Dict], AsyncIterator[bytes]],
+    sample_size: int = 4096,
+    concurrency: int = 8,
+    algorithm: str = "sha256",
+    known_sizes: Optional[Set[int]] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Exact-match hashing that avoids downloading files that cannot have a duplicate
+    
+    Tier 1: files with a unique size cannot be exact duplicates - nothing is fetched.
+    Tier 2: same-size files are compared on a hash of small head/middle/tail ranges
+            fetched with HTTP Range requests.
+    Tier 3: files still colliding get a full streamed hash.
+    
+    Files whose size matches one in known_sizes (files hashed earlier, e.g. reused from
+    the scan index) may duplicate a file outside this batch, so they always get a full hash.
+    
+    Args:
+        files: File dicts with 'id' and 'size'
+        fetch_range: async (file, start, end) -> bytes for an inclusive byte range
+        stream_content: (file) -> async iterator over the full content
+        sample_size: Bytes per sampled range
+        concurrency: Maximum simultaneous requests
+        algorithm: Hash algorithm for the full hashes
+        known_sizes: Sizes of already hashed files these files must also be compared with
+    
+    Returns:
+        {file_id: full content hash, or None if the file provably has no exact duplicate}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    hashes = {f["id"]: None for f in files}
+    known_sizes = known_sizes or set()
+    
+    # Tier 1: size
+    by_size = defaultdict(list)
+    for file in files:
+        by_size[file.get("size", 0)].append(file)
+    colliding = [group for size, group in by_size.items() if len(group) > 1 or size in known_sizes]
+    
+    # Tier 2: partial hash of sampled ranges
+    async def partial_hash(file: Dict) -> str:
+        async with semaphore:
+            ranges = sample_ranges(file.get("size", 0), sample_size)
+            hasher = new_hasher(algorithm)
+            for start, end in ranges:
+                hasher.update(await fetch_range(file, start, end))
+            # A single range is the whole file, so this is already its full hash
+            return hasher.hexdigest()
+    
+    tier2_groups = defaultdict(list)
+    to_stream = []
+    for group in colliding:
+        size = group[0].get("size", 0)
+        if size in known_sizes and size > 3 * sample_size:
+            # Partial hashes of the known files are not available to compare with
+            to_stream.extend(group)
+            continue
+        partials = await asyncio.gather(*(partial_hash(f) for f in group), return_exceptions=True)
+        for file, partial in zip(group, partials):
+            if isinstance(partial, Exception):
+                print(f"Error range-hashing {file.get('name', file['id'])}: {partial}")
+                continue
+            tier2_groups[(file.get("size", 0), partial)].append(file)
+    
+    # Tier 3: full streamed hash (small files were fully covered by tier 2 already)
+    async def full_hash(file: Dict) -> str:
+        async with semaphore:
+            return await hash_async_stream(stream_content(file), algorithm)
+    
+    for (size, partial), group in tier2_groups.items():
+        if len(group) < 2 and size not in known_sizes:
+            continue
+        if size <= 3 * sample_size:
+            for file in group:
+                hashes[file["id"]] = partial
+        else:
+            to_stream.extend(group)
+    
+    full_hashes = await asyncio.gather(*(full_hash(f) for f in to_stream), return_exceptions=True)
+    for file, full in zip(to_stream, full_hashes):
+        if isinstance(full, Exception):
+            print(f"Error hashing {file.get('name', file['id'])}: {full}")
+            continue
+        hashes[file["id"]] = full
+    
+    fetched = sum(len(g) for g in colliding)
+    print(f"Tiered hashing: {len(files)} files, {len(files) - fetched} eliminated by size, "
+          f"{len(to_stream)} fully downloaded")
+    return hashes
@@ -0,0 +1,176 @@
+"""
+Shared local inference process - one model copy serving every API worker over a Unix socket
+
+Multi-worker deployment:
+
+    python -m app.scanner.inference_server &
+    uvicorn app.main:app --workers 4
+
+with INFERENCE_SOCKET set to the same path for both. Each API worker then talks to
+this process through RemoteEncoder instead of loading its own model, and requests
+from all workers are coalesced by the server's MicroBatcher. Connections are
+authenticated with INFERENCE_AUTHKEY, or else with a key the server generates into
+<socket>.key (mode 0600), so both must run as the same user.
+"""
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+import numpy as np
+
+from app.scanner.inference_service import MicroBatcher
+from app.scanner.scheduler import current_tenant
+
+
+def authkey_path(socket_path: str) -> str:
+    """File holding the generated authkey when INFERENCE_AUTHKEY is not set"""
+    return socket_path + ".key"
+
+
+def _authkey(socket_path: str, create: bool = False) -> bytes:
+    """
+    Shared secret for the socket handshake (requests are pickled, so it is always required)
+    
+    INFERENCE_AUTHKEY if set. Otherwise the server generates a random key into a file
+    next to the socket, readable by its own user only, and workers read it from there.
+    """
+    from app.config import settings
+    if settings.inference_authkey:
+        return settings.inference_authkey.encode("utf-8")
+    
+    path = authkey_path(socket_path)
+    if create:
+        key = os.urandom(32).hex().encode("ascii")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        os.replace(tmp_path, path)
+        return key
+    with open(path, "rb") as f:  # Missing until the server is up: callers retry
+        return f.read().strip()
+
+
+class RemoteEncoder:
+    """
+    Client for the inference server with the same encode() interface as a backend
+
+    Each calling thread keeps its own connection, so concurrent scans in one worker
+    send requests in parallel and the server can batch them together.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 120.0):
+        self.socket_path = socket_path
+        self._local = threading.local()
+        self.info = self._call_with_retry(("info",), connect_timeout)
+
+    @property
+    def backend_name(self) -> str:
+        return self.info["backend"]
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        return self.info.get("max_seq_length")
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: Optional[int] = None) -> np.ndarray:
+        # The tenant lets the server's batcher share batches fairly across all workers' scans
+        return self._call(("encode", list(texts), current_tenant.get()))
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.socket_path, family="AF_UNIX", authkey=_authkey(self.socket_path))
+            self._local.conn = conn
+        return conn
+
+    def _call(self, message):
+        # One reconnect: the server may have restarted since this thread last used it
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError, AuthenticationError):
+                # AuthenticationError: the server restarted with a new generated key
+                self._local.conn = None
+                if attempt:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"Inference server error: {payload}")
+        return payload
+
+    def _call_with_retry(self, message, timeout: float):
+        """Wait for the server to come up (it may still be loading the model)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._call(message)
+            except (EOFError, OSError, AuthenticationError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+
+def _serve_connection(conn, model, info: Dict) -> None:
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if message[0] == "encode":
+                    texts, tenant = message[1], message[2] if len(message) > 2 else None
+                    if isinstance(model, MicroBatcher):
+                        embeddings = model.encode(texts, tenant=tenant)
+                    else:
+                        embeddings = model.encode(texts, show_progress_bar=False)
+                    conn.send(("ok", np.asarray(embeddings, dtype=np.float32)))
+                elif message[0] == "info":
+                    conn.send(("ok", info))
+                else:
+                    conn.send(("error", f"Unknown request: {message[0]}"))
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+
+def serve(socket_path: str) -> None:
+    """Load the model once, then answer encode requests until the process is stopped"""
+    from app.scanner.content_similarity import ContentSimilarity
+
+    similarity = ContentSimilarity(use_remote=False)
+    if similarity.model is None:
+        raise RuntimeError("No embedding model could be loaded; nothing to serve")
+    info = {"backend": similarity.backend_name, "max_seq_length": similarity._token_budget()}
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Stale socket from a previous run
+    old_umask = os.umask(0o177)  # Socket file readable/writable by this user only
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", authkey=_authkey(socket_path, create=True))
+    finally:
+        os.umask(old_umask)
+
+    print(f"✅ Inference server ({info['backend']}) listening on {socket_path}")
+    with listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Failed handshake (wrong authkey) or interrupted accept: keep serving
+                print(f"Warning: Rejected inference client: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, similarity.model, info), daemon=True).start()
+
+
+if __name__ == "__main__":
+    from app.config import settings
+
+    if not settings.inference_socket:
+        raise SystemExit("Set INFERENCE_SOCKET to the Unix socket path the API workers will use")
+    serve(settings.inference_socket)
@@ -0,0 +1,195 @@
+"""Shared micro-batching inference queue for embedding requests from concurrent scans"""
+from typing import Callable, Dict, List, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import threading
+import time
+import numpy as np
+
+from app.scanner.scheduler import current_tenant, tenant_weight
+
+
+_CLOSED = object()
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "future", "tenant")
+
+    def __init__(self, texts: List[str], tenant: Optional[str] = None):
+        self.texts = texts
+        self.future = Future()
+        self.tenant = tenant
+
+
+class MicroBatcher:
+    """
+    Coalesces encode requests from all callers into dynamically sized batches
+
+    Requests are queued; a batcher thread waits for a free worker, then drains the
+    queue until it has max_batch_size texts or max_wait_ms has passed since the
+    batch was started. While all workers are busy, requests keep accumulating, so
+    batches grow with load. Wraps any backend with an encode() method and exposes
+    the same interface, so it can replace ContentSimilarity.model transparently.
+
+    Requests are queued per tenant and batches are filled in weighted fair order
+    (start-time fair queuing on text counts), so one tenant's huge scan cannot starve
+    the others' requests.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        workers: int = 2,
+        weight_for: Callable[[Optional[str]], float] = tenant_weight
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.weight_for = weight_for
+        self._stats = {"requests": 0, "texts": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+
+        self._pending: Dict[Optional[str], deque] = {}
+        self._finish: Dict[Optional[str], float] = {}
+        self._vclock = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Requests, texts and batches encoded so far (a consistent snapshot)"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        return getattr(self.backend, "max_seq_length", None)
+
+    def submit(self, texts: List[str], tenant: Optional[str] = None) -> Future:
+        """
+        Queue texts for encoding; the future resolves to a len(texts) x dim array
+        
+        Args:
+            tenant: Tenant the work is charged to; defaults to the current scan's tenant
+        
+        Raises:
+            RuntimeError: if the batcher was closed (nothing would process the request)
+        """
+        request = _EncodeRequest(list(texts), tenant if tenant is not None else current_tenant.get())
+        if not request.texts:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.setdefault(request.tenant, deque()).append(request)
+            self._cond.notify()
+        return request.future
+
+    def encode(
+        self,
+        texts: List[str],
+        show_progress_bar: bool = False,
+        batch_size: Optional[int] = None,
+        tenant: Optional[str] = None
+    ) -> np.ndarray:
+        """Blocking encode for synchronous callers (scan worker threads)"""
+        return self.submit(texts, tenant).result()
+
+    async def encode_async(self, texts: List[str]) -> np.ndarray:
+        """Encode without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def close(self) -> None:
+        """Stop the batcher thread after the queued requests are processed"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _take(self, deadline: Optional[float] = None):
+        """
+        Next request in weighted fair order
+        
+        Returns:
+            A request, None if the deadline passed first, or _CLOSED once closed and drained
+        """
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return _CLOSED
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return None
+                self._cond.wait(timeout)
+
+            # Start tag of each tenant's head request: max(virtual clock, its last finish)
+            tenant = min(self._pending, key=lambda t: max(self._vclock, self._finish.get(t, 0.0)))
+            queue = self._pending[tenant]
+            request = queue.popleft()
+            if not queue:
+                del self._pending[tenant]
+
+            start = max(self._vclock, self._finish.get(tenant, 0.0))
+            self._vclock = start
+            self._finish[tenant] = start + len(request.texts) / self.weight_for(tenant)
+            if len(self._finish) > 1000:
+                self._finish = {t: f for t, f in self._finish.items() if f > self._vclock}
+            return request
+
+    def _run(self) -> None:
+        while True:
+            first = self._take()
+            if first is _CLOSED:
+                return
+
+            # Wait for a free worker; requests queue up meanwhile and join this batch
+            self._slots.acquire()
+            batch = [first]
+            count = len(first.texts)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+
+            while count < self.max_batch_size:
+                request = self._take(deadline)
+                if request is None:
+                    break
+                if request is _CLOSED:
+                    stop = True
+                    break
+                batch.append(request)
+                count += len(request.texts)
+
+            self._executor.submit(self._process, batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[_EncodeRequest]) -> None:
+        try:
+            texts = [text for request in batch for text in request.texts]
+            embeddings = np.asarray(self.backend.encode(
+                texts, show_progress_bar=False, batch_size=self.max_batch_size
+            ))
+            with self._stats_lock:
+                self._stats["requests"] += len(batch)
+                self._stats["texts"] += len(texts)
+                self._stats["batches"] += 1
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._slots.release()
@@ -0,0 +1,166 @@
+"""Scan job state shared by all API workers on a host (SQLite)"""
+from typing import Dict, Optional
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress TEXT,
+    error TEXT,
+    result BLOB,
+    pid INTEGER,
+    cancel_requested INTEGER DEFAULT 0,
+    created_at REAL,
+    updated_at REAL
+)
+"""
+
+FINISHED = ("completed", "cancelled", "failed")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Status, progress and (gzip-compressed JSON) results of background scans
+
+    A job runs in the worker that accepted it, but any worker can report on it: the
+    table lives in one SQLite file in WAL mode, which several processes can read while
+    one writes. Jobs whose worker process has died are reported as failed.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def create(self, status: str = "queued") -> str:
+        """
+        Register a new job owned by this process
+        
+        IDs are random and only ever generated here: the job endpoints take no other
+        credentials, so knowing the ID is what lets a client read or cancel a scan.
+        
+        Returns:
+            The new job ID
+        """
+        now = time.time()
+        self._execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl_seconds,))
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (job_id, status, progress, pid, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, status, json.dumps({}), os.getpid(), now, now)
+        )
+        return job_id
+
+    def update(self, job_id: str, status: Optional[str] = None, progress: Optional[Dict] = None) -> None:
+        """Record a status change and/or the latest progress event"""
+        self._execute(
+            "UPDATE jobs SET status = COALESCE(?, status), progress = COALESCE(?, progress), updated_at = ? "
+            "WHERE job_id = ?",
+            (status, json.dumps(progress) if progress is not None else None, time.time(), job_id)
+        )
+
+    def finish(self, job_id: str, result: Optional[bytes], status: str = "completed") -> None:
+        """Store the gzip-compressed JSON result (None for synchronous scans) and mark the job finished"""
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE job_id = ?",
+            (status, result, time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+            (error, time.time(), job_id)
+        )
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Flag a running job for cancellation; False if it is unknown or already finished"""
+        cursor = self._execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status NOT IN (?, ?, ?)",
+            (time.time(), job_id, *FINISHED)
+        )
+        return cursor.rowcount > 0
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status without the result, or None if unknown / expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, progress, error, pid, cancel_requested, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        status, progress, error, pid, cancel_requested, created_at, updated_at = row
+        if status not in FINISHED and pid and not _pid_alive(pid):
+            error = "Worker process exited before the scan finished"
+            self.fail(job_id, error)
+            status = "failed"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "progress": json.loads(progress) if progress else {},
+            "error": error,
+            "cancel_requested": bool(cancel_requested),
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def get_result(self, job_id: str) -> Optional[bytes]:
+        """Gzip-compressed JSON result of a completed job"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Shared JobStore at settings.job_store_path (a temp-directory file by default)"""
+    global _job_store
+    from app.config import settings
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                path = settings.job_store_path or os.path.join(tempfile.gettempdir(), "redundancy_scanner_jobs.sqlite3")
+                _job_store = JobStore(path, ttl_seconds=settings.job_ttl_seconds)
+    return _job_store
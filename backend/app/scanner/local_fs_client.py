@@ -0,0 +1,213 @@
+"""Local / NAS filesystem source - same file dicts as the cloud clients, no network"""
+import asyncio
+import mimetypes
+import mmap
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.scanner.hasher import new_hasher, confirm_hash_buckets, get_hash_executor
+from app.scanner.scan_budget import ScanBudget, ScanStopped
+from app.scanner.text_extractor import extract_text_from_file, is_text_extractable
+
+
+def hash_path_mmap(path: str, algorithm: str = "sha256") -> str:
+    """Hash a file through a read-only memory map (zero-copy, GIL released by hashlib)"""
+    hasher = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hasher.hexdigest()  # Empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            hasher.update(mapped)
+    return hasher.hexdigest()
+
+
+class LocalFileSystemClient:
+    """Client for a mounted directory tree (local disk, SMB/NFS share, synced folder)"""
+
+    def __init__(self, root_paths: List[str]):
+        """
+        Args:
+            root_paths: Directories that may be scanned; requested folders must lie inside one
+        """
+        self.root_paths = [os.path.realpath(p) for p in root_paths]
+
+    def _resolve(self, path: str) -> str:
+        """Absolute real path, rejecting anything outside the allowed roots"""
+        real = os.path.realpath(path)
+        for root in self.root_paths:
+            if real == root or real.startswith(root + os.sep):
+                return real
+        raise PermissionError(f"Path is outside the allowed scan roots: {path}")
+
+    async def list_all_files(self, folder_ids: Optional[List[str]] = None, include_subfolders: bool = True) -> List[Dict]:
+        """
+        List all files under the given directories
+
+        Args:
+            folder_ids: Directory paths to scan. If None, scans all roots
+            include_subfolders: If True, recursively scans all subfolders
+        """
+        folders = [self._resolve(p) for p in (folder_ids or self.root_paths)]
+        return await asyncio.to_thread(self._walk, folders, include_subfolders)
+
+    def _walk(self, folders: List[str], include_subfolders: bool) -> List[Dict]:
+        files = []
+        seen_inodes = set()  # (device, inode): hard links and overlapping folders count once
+        seen_dirs = set()
+        stack = list(folders)
+
+        print("Listing files from local filesystem...")
+        while stack:
+            directory = stack.pop()
+            try:
+                dir_stat = os.stat(directory)
+            except OSError as e:
+                print(f"Error accessing folder {directory}: {e}")
+                continue
+            if (dir_stat.st_dev, dir_stat.st_ino) in seen_dirs:
+                continue
+            seen_dirs.add((dir_stat.st_dev, dir_stat.st_ino))
+
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if include_subfolders:
+                                    stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue  # Symlinks, sockets, devices
+
+                            stat = entry.stat(follow_symlinks=False)
+                            if stat.st_size == 0:
+                                continue  # Empty files all "match" each other; nothing to reclaim
+                            key = (stat.st_dev, stat.st_ino)
+                            if key in seen_inodes:
+                                continue
+                            seen_inodes.add(key)
+
+                            files.append({
+                                "id": entry.path,
+                                "name": entry.name,
+                                "size": stat.st_size,
+                                "mime_type": mimetypes.guess_type(entry.name)[0] or "",
+                                "last_modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+                                .isoformat().replace("+00:00", "Z"),
+                                "web_url": Path(entry.path).as_uri(),
+                                "path": directory,
+                                "source": "Local"
+                            })
+                        except OSError as e:
+                            print(f"    ⏭️  Skipping {entry.path}: {e}")
+            except OSError as e:
+                print(f"Error listing folder {directory}: {e}")
+
+        print(f"Total files found: {len(files)}")
+        return files
+
+    async def get_file_content(self, file_id: str) -> bytes:
+        """Read file content"""
+        path = self._resolve(file_id)
+        return await asyncio.to_thread(Path(path).read_bytes)
+
+    def process_file(self, file: Dict, algorithm: str = "sha256") -> Dict:
+        """Hash (via mmap) and extract text for one file, in place; run on a worker thread"""
+        path = self._resolve(file["id"])
+        file["content_hash"] = hash_path_mmap(path, algorithm)
+        file["extracted_text"] = None
+
+        if file["size"] and is_text_extractable(file.get("mime_type", ""), file.get("name", "")):
+            with open(path, "rb") as f:
+                file["extracted_text"] = extract_text_from_file(f.read(), file.get("mime_type", ""), file["name"]) or None
+        return file
+
+
+async def scan_local_files(
+    client: LocalFileSystemClient,
+    folder_ids: Optional[List[str]] = None,
+    include_subfolders: bool = True,
+    algorithm: str = "sha256",
+    processed_files: Optional[List[Dict]] = None,
+    budget: Optional[ScanBudget] = None
+) -> Dict:
+    """
+    List, hash and extract local files, then run the regular duplicate detection
+
+    Args:
+        processed_files: Optional list that receives the processed file dicts
+        budget: Optional per-scan limits and cancellation, checked before each file;
+            bytes read count as downloaded bytes
+    
+    Returns:
+        find_all_duplicates result plus files_processed / files_failed / errors
+        (and partial / stopped_reason / usage with a budget)
+    """
+    from app.scanner.duplicate_finder import find_all_duplicates
+
+    files = await client.list_all_files(folder_ids, include_subfolders)
+    if budget:
+        files = budget.limit_files(files)
+    loop = asyncio.get_running_loop()
+    executor = get_hash_executor()
+
+    def process(file: Dict) -> Dict:
+        if budget:
+            # Charged up front so files processed concurrently see each other's bytes
+            budget.reserve_download(file["size"])
+            budget.charge_download(file["size"])
+        client.process_file(file, algorithm)
+        if budget and file["extracted_text"]:
+            budget.reserve_text(len(file["extracted_text"]))
+        return file
+
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, process, f) for f in files),
+        return_exceptions=True
+    )
+    if processed_files is None:
+        processed_files = []
+    errors = []
+    for file, result in zip(files, results):
+        if isinstance(result, ScanStopped):
+            continue  # Over budget or cancelled: not part of the results
+        if isinstance(result, Exception):
+            print(f"Error processing {file.get('name', 'Unknown')}: {result}")
+            errors.append({"file_name": file.get("name", "Unknown"), "error": str(result)})
+        else:
+            processed_files.append(result)
+
+    # Rehashing is cheap locally, so xxhash buckets are confirmed straight from disk
+    await confirm_hash_buckets(
+        processed_files,
+        rehash=lambda f: loop.run_in_executor(executor, hash_path_mmap, f["id"], "sha256"),
+        algorithm=algorithm
+    )
+
+    results = await asyncio.to_thread(
+        find_all_duplicates, processed_files, budget.should_stop if budget else None
+    )
+    results.update({
+        "files_processed": len(processed_files),
+        "files_failed": len(errors),
+        "errors": errors[:10]
+    })
+    if budget:
+        results["partial"] = budget.partial or results.get("partial", False)
+        results["stopped_reason"] = budget.reason
+        results["usage"] = budget.usage()
+    return results
+
+
+if __name__ == "__main__":
+    # Network-free scan / benchmarking target: python -m app.scanner.local_fs_client <dir> [<dir> ...]
+    import sys
+    import time
+
+    start = time.perf_counter()
+    summary = asyncio.run(scan_local_files(LocalFileSystemClient(sys.argv[1:]), sys.argv[1:]))
+    elapsed = time.perf_counter() - start
+    print(f"{summary['total_files']} files, {summary['total_duplicate_groups']} groups, "
+          f"{summary['total_storage_savings_bytes']} bytes reclaimable in {elapsed:.2f}s")
@@ -0,0 +1,170 @@
+"""Per-scan resource budgets (files, bytes, resident text, wall time) and cancellation"""
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+import threading
+import time
+
+
+class ScanStopped(Exception):
+    """Raised inside the pipeline once a budget is exhausted or the scan was cancelled"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Scan stopped: {reason}")
+        self.reason = reason
+
+
+def effective_limit(server_limit: int, requested: Optional[int]) -> int:
+    """Tightest of the server-wide and requested limits (0 / None = unlimited)"""
+    limits = [limit for limit in (server_limit, requested) if limit]
+    return min(limits) if limits else 0
+
+
+class ScanBudget:
+    """
+    Limits for one scan, checked at every download, extraction and detection stage
+
+    Once a download or memory limit is hit the budget latches: every later check()
+    raises ScanStopped, so downloads stop and detection runs only on what was already
+    processed. Cancellation and the wall-time limit additionally halt computation:
+    should_stop() turns True and the remaining detection stages are skipped.
+    Safe to share with worker threads.
+    """
+
+    def __init__(
+        self,
+        max_files: int = 0,
+        max_bytes: int = 0,
+        max_text_bytes: int = 0,
+        max_seconds: float = 0,
+        cancel_check: Optional[Callable[[], bool]] = None,
+        cancel_poll_interval: float = 1.0
+    ):
+        """
+        Args:
+            max_files: Files taken into the scan (0 = unlimited)
+            max_bytes: Bytes downloaded, including range samples (0 = unlimited)
+            max_text_bytes: Extracted text held in memory, in characters (0 = unlimited)
+            max_seconds: Wall time from creation (0 = unlimited)
+            cancel_check: Returns True once the scan should be cancelled (polled)
+            cancel_poll_interval: Minimum seconds between cancel_check calls
+        """
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_text_bytes = max_text_bytes
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.cancel_check = cancel_check
+        self.cancel_poll_interval = cancel_poll_interval
+
+        self.started = time.monotonic()
+        self.bytes_downloaded = 0
+        self.text_bytes = 0
+        self.stopped_reason = None
+        self.halted = False
+        self.files_truncated = False
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Restart the wall-time clock, e.g. once a queued scan is admitted"""
+        now = time.monotonic()
+        if self.deadline is not None:
+            self.deadline = now + (self.deadline - self.started)
+        self.started = now
+
+    @property
+    def stopped(self) -> bool:
+        return self.stopped_reason is not None
+
+    @property
+    def partial(self) -> bool:
+        """True if the results will not cover every listed file"""
+        return self.stopped or self.files_truncated
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self.stopped_reason or ("max_files" if self.files_truncated else None)
+
+    def stop(self, reason: str, halt: bool = False) -> None:
+        """Stop downloads; with halt=True (cancel / timeout) stop computation as well"""
+        with self._lock:
+            if self.stopped_reason is None or (halt and not self.halted):
+                self.stopped_reason = reason
+                print(f"⏹️  Scan stopped: {reason}")
+            self.halted = self.halted or halt
+
+    def _poll(self) -> None:
+        if self.halted:
+            return
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self.stop("max_seconds", halt=True)
+        elif self.cancel_check and now - self._last_poll >= self.cancel_poll_interval:
+            self._last_poll = now
+            if self.cancel_check():
+                self.stop("cancelled", halt=True)
+
+    def check(self) -> None:
+        """Raise ScanStopped if downloads must stop (over budget, out of time or cancelled)"""
+        self._poll()
+        if self.stopped_reason is not None:
+            raise ScanStopped(self.stopped_reason)
+
+    def should_stop(self) -> bool:
+        """True once computation should stop too (cancelled or out of time)"""
+        self._poll()
+        return self.halted
+
+    def limit_files(self, files: list) -> list:
+        """First max_files files (all of them if unlimited); the rest of the scan goes on"""
+        if self.max_files and len(files) > self.max_files:
+            self.files_truncated = True
+            print(f"⏹️  Scan limited to {self.max_files} of {len(files)} files")
+            return files[:self.max_files]
+        return files
+
+    def reserve_download(self, size: int) -> None:
+        """Check before downloading a file of the given size"""
+        self.check()
+        if self.max_bytes and self.bytes_downloaded + size > self.max_bytes:
+            self.stop("max_bytes")
+            self.check()
+
+    def charge_download(self, size: int) -> None:
+        with self._lock:
+            self.bytes_downloaded += size
+        if self.max_bytes and self.bytes_downloaded > self.max_bytes:
+            self.stop("max_bytes")
+
+    def reserve_text(self, length: int) -> None:
+        """Account for extracted text about to be kept; raises if it would exceed the budget"""
+        if self.max_text_bytes and self.text_bytes + length > self.max_text_bytes:
+            self.stop("max_text_bytes")
+            self.check()
+        with self._lock:
+            self.text_bytes += length
+
+    async def fetch(self, download: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Run a download (started only if within budget), counting its bytes"""
+        self.check()
+        data = await download()
+        self.charge_download(len(data))
+        return data
+
+    async def stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Relay a download stream, stopping it as soon as the budget runs out"""
+        async for chunk in chunks:
+            self.check()
+            self.charge_download(len(chunk))
+            yield chunk
+
+    def usage(self) -> Dict:
+        return {
+            "bytes_downloaded": self.bytes_downloaded,
+            "text_bytes": self.text_bytes,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "limits": {
+                "max_files": self.max_files or None,
+                "max_bytes": self.max_bytes or None,
+                "max_text_bytes": self.max_text_bytes or None,
+                "max_seconds": round(self.deadline - self.started, 3) if self.deadline else None
+            }
+        }
@@ -0,0 +1,152 @@
+"""Persistent scan index - skip downloading files unchanged since the last scan"""
+from array import array
+from typing import Dict, Iterable, List, Optional
+import sqlite3
+import threading
+import time
+import zlib
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    provider TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    modified TEXT,
+    size INTEGER,
+    etag TEXT,
+    content_hash TEXT,
+    extraction_status TEXT,
+    extracted_text BLOB,
+    fingerprints BLOB,
+    updated_at REAL,
+    PRIMARY KEY (provider, file_id)
+)
+"""
+
+
+def _pack_fingerprints(fingerprints: Optional[Iterable[int]]) -> Optional[bytes]:
+    if fingerprints is None:
+        return None
+    return array("I", sorted(fingerprints)).tobytes()
+
+
+def _unpack_fingerprints(blob: Optional[bytes]) -> Optional[set]:
+    if blob is None:
+        return None
+    values = array("I")
+    values.frombytes(blob)
+    return set(values)
+
+
+class ScanIndex:
+    """
+    SQLite table of per-file scan results keyed by provider + file ID
+
+    A record is only reused when the file's modified time, size and ETag (when the
+    provider supplies one) all still match, so any edit forces a fresh download.
+    """
+
+    def __init__(self, path: str, store_text: bool = True):
+        self.path = path
+        self.store_text = store_text
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def lookup_many(self, provider: str, files: List[Dict]) -> Dict[str, Dict]:
+        """
+        Cached results for files that are unchanged since they were indexed
+
+        Returns:
+            {file_id: {"content_hash", "extracted_text", "extraction_status", "fingerprints"}}
+        """
+        if not files:
+            return {}
+
+        by_id = {f["id"]: f for f in files}
+        rows = []
+        ids = list(by_id)
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(self._conn.execute(
+                    f"SELECT file_id, modified, size, etag, content_hash, extraction_status, "
+                    f"extracted_text, fingerprints FROM files WHERE provider = ? AND file_id IN ({placeholders})",
+                    [provider, *batch]
+                ).fetchall())
+
+        hits = {}
+        for file_id, modified, size, etag, content_hash, status, text_blob, fp_blob in rows:
+            file = by_id[file_id]
+            if modified != file.get("last_modified") or size != file.get("size"):
+                continue
+            if file.get("etag") and etag != file.get("etag"):
+                continue
+            if not content_hash or (status == "ok" and text_blob is None):
+                continue  # Incomplete record (hash skipped or text not stored)
+
+            hits[file_id] = {
+                "content_hash": content_hash,
+                "extraction_status": status,
+                "extracted_text": zlib.decompress(text_blob).decode("utf-8") if text_blob else None,
+                "fingerprints": _unpack_fingerprints(fp_blob),
+            }
+        return hits
+
+    def store_many(self, provider: str, files: List[Dict]) -> None:
+        """Record scan results (content_hash, extracted_text, fingerprints) of processed files"""
+        rows = []
+        now = time.time()
+        for file in files:
+            if not file.get("content_hash"):
+                continue
+            text = file.get("extracted_text")
+            status = "ok" if text else "none"
+            text_blob = zlib.compress(text.encode("utf-8"), 6) if text and self.store_text else None
+            rows.append((
+                provider,
+                file["id"],
+                file.get("last_modified"),
+                file.get("size"),
+                file.get("etag"),
+                file["content_hash"],
+                status,
+                text_blob,
+                _pack_fingerprints(file.get("fingerprints")),
+                now,
+            ))
+
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (provider, file_id, modified, size, etag, content_hash, "
+                "extraction_status, extracted_text, fingerprints, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_scan_index = None
+_scan_index_lock = threading.Lock()
+
+
+def get_scan_index() -> Optional[ScanIndex]:
+    """Shared ScanIndex from settings.scan_index_path, or None if the index is disabled"""
+    global _scan_index
+    from app.config import settings
+    if not settings.scan_index_path:
+        return None
+    if _scan_index is None:
+        with _scan_index_lock:
+            if _scan_index is None:
+                _scan_index = ScanIndex(settings.scan_index_path, store_text=settings.scan_index_store_text)
+    return _scan_index
@@ -0,0 +1,178 @@
+"""Admission control and weighted fair sharing of scan slots, downloads and inference"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+import asyncio
+import hashlib
+import heapq
+import itertools
+
+
+# Tenant of the scan running in the current task / worker thread (asyncio.to_thread
+# copies context variables, so detection threads inherit it)
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+
+def tenant_key(google_token: str, tenant_id: Optional[str] = None) -> str:
+    """Explicit tenant ID, or a stable non-reversible key derived from the access token"""
+    if tenant_id:
+        return tenant_id
+    return "token:" + hashlib.sha256(google_token.encode("utf-8")).hexdigest()[:16]
+
+
+def tenant_weight(tenant: Optional[str]) -> float:
+    """Share of a tenant relative to others (settings.tenant_weights, default 1)"""
+    from app.config import settings
+    return max(float(settings.tenant_weights.get(tenant or "", 1.0)), 0.01)
+
+
+class FairSemaphore:
+    """
+    Semaphore whose waiters are served in weighted fair order across tenants
+
+    Start-time fair queuing: each acquire gets a start tag of
+    max(virtual clock, tenant's previous finish tag), and the tenant's finish tag
+    advances by cost / weight. Free slots go to the waiter with the smallest tag, so
+    a tenant with weight 2 gets twice the slots of a weight-1 tenant under contention,
+    and a tenant flooding the queue only delays itself.
+    """
+
+    def __init__(self, slots: int, weight_for: Callable[[Optional[str]], float] = tenant_weight):
+        self.slots = slots
+        self.weight_for = weight_for
+        self._available = slots
+        self._waiters = []  # heap of [tag, seq, future]
+        self._finish = {}
+        self._vclock = 0.0
+        self._seq = itertools.count()
+
+    def _tag(self, tenant: Optional[str], cost: float) -> float:
+        start = max(self._vclock, self._finish.get(tenant, 0.0))
+        self._finish[tenant] = start + cost / self.weight_for(tenant)
+        return start
+
+    @property
+    def in_use(self) -> int:
+        return self.slots - self._available
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def position(self, future: asyncio.Future) -> int:
+        """1-based place of a waiter in service order"""
+        mine = next((entry for entry in self._waiters if entry[2] is future), None)
+        if mine is None:
+            return 0
+        return 1 + sum(1 for entry in self._waiters if entry[:2] < mine[:2] and not entry[2].done())
+
+    async def acquire(
+        self,
+        tenant: Optional[str] = None,
+        cost: float = 1.0,
+        on_wait: Optional[Callable[[int], None]] = None,
+        poll_interval: float = 1.0
+    ) -> None:
+        """
+        Take a slot, waiting in fair order if none is free
+
+        Args:
+            tenant: Tenant key the slot is charged to
+            cost: Relative size of the work (1 = one unit)
+            on_wait: Called with the queue position on every poll while waiting; an
+                exception raised from it (e.g. cancellation) abandons the wait
+        """
+        tag = self._tag(tenant, cost)
+        if self._available > 0 and not self.waiting:
+            self._available -= 1
+            self._vclock = max(self._vclock, tag)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [tag, next(self._seq), future])
+        try:
+            while True:
+                if on_wait:
+                    on_wait(self.position(future))
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=poll_interval if on_wait else None)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()  # Slot was handed over just as we were cancelled
+            else:
+                future.cancel()
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the next waiter in fair order, or return it to the pool"""
+        while self._waiters:
+            tag, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # Cancelled waiter
+            self._vclock = max(self._vclock, tag)
+            future.set_result(True)
+            return
+        self._available += 1
+        if len(self._finish) > 1000:
+            # Tags at or below the virtual clock are reset to it anyway
+            self._finish = {t: f for t, f in self._finish.items() if f > self._vclock}
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None, cost: float = 1.0, on_wait=None):
+        await self.acquire(tenant, cost, on_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ScanScheduler:
+    """
+    Limits concurrent scans per API worker and shares download slots fairly
+
+    Scans beyond max_scans wait in a weighted fair queue (with position reporting)
+    instead of all starting at once and slowing each other down. Running scans draw
+    downloads from one shared pool of download_slots, also in weighted fair order.
+    """
+
+    def __init__(self, max_scans: int, download_slots: int):
+        self.scans = FairSemaphore(max_scans)
+        self.downloads = FairSemaphore(download_slots)
+
+    @asynccontextmanager
+    async def admitted(self, tenant: str, on_queued: Optional[Callable[[int], None]] = None):
+        """Run a scan once admitted; sets current_tenant for inference fairness"""
+        async with self.scans.slot(tenant, on_wait=on_queued):
+            token = current_tenant.set(tenant)
+            try:
+                yield
+            finally:
+                current_tenant.reset(token)
+
+    def download_slot(self, tenant: Optional[str]):
+        return self.downloads.slot(tenant)
+
+    def stats(self) -> Dict:
+        return {
+            "scans_running": self.scans.in_use,
+            "scans_queued": self.scans.waiting,
+            "max_scans": self.scans.slots,
+            "downloads_active": self.downloads.in_use,
+            "downloads_waiting": self.downloads.waiting,
+            "download_slots": self.downloads.slots,
+        }
+
+
+_scheduler = None
+
+
+def get_scheduler() -> ScanScheduler:
+    """Process-wide scheduler (all scans of one API worker share it)"""
+    global _scheduler
+    if _scheduler is None:
+        from app.config import settings
+        _scheduler = ScanScheduler(settings.scan_max_concurrent, settings.download_slots)
+    return _scheduler
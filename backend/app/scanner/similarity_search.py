@@ -0,0 +1,167 @@
+"""Tiled nearest-neighbour search over embedding matrices without dense NxN results"""
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+import numpy as np
+
+
+_worker_matrix = None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def _top_neighbors_block(
+    matrix: np.ndarray,
+    start: int,
+    end: int,
+    top_k: Optional[int],
+    threshold: Optional[float]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Neighbours of rows start..end as (rows, cols, scores), self-matches excluded"""
+    from scipy import sparse
+    scores = matrix[start:end] @ matrix.T
+    if sparse.issparse(scores):
+        scores = scores.toarray()
+    scores = np.asarray(scores, dtype=np.float32)
+    block_rows = np.arange(end - start)
+    scores[block_rows, block_rows + start] = -np.inf
+
+    if top_k is not None and top_k < scores.shape[1]:
+        cols = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        cols = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    values = np.take_along_axis(scores, cols, axis=1)
+    rows = np.broadcast_to(block_rows[:, None] + start, cols.shape)
+
+    keep = np.isfinite(values)
+    if threshold is not None:
+        keep &= values >= threshold
+    return rows[keep], cols[keep], values[keep]
+
+
+def _rows_above_threshold(
+    matrix: np.ndarray,
+    rows: np.ndarray,
+    threshold: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Every neighbour at or above threshold of the given rows, self-matches excluded"""
+    from scipy import sparse
+    scores = matrix[rows] @ matrix.T
+    if sparse.issparse(scores):
+        scores = scores.toarray()
+    scores = np.asarray(scores, dtype=np.float32)
+    scores[np.arange(len(rows)), rows] = -np.inf
+    block_rows, cols = np.nonzero(scores >= threshold)
+    return rows[block_rows], cols, scores[block_rows, cols]
+
+
+def _init_worker(path: str) -> None:
+    global _worker_matrix
+    _worker_matrix = np.load(path, mmap_mode="r")
+
+
+def _worker_block(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    start, end, top_k, threshold = args
+    return _top_neighbors_block(_worker_matrix, start, end, top_k, threshold)
+
+
+def tiled_similarity(
+    embeddings: np.ndarray,
+    top_k: Optional[int] = 10,
+    threshold: Optional[float] = None,
+    block_size: int = 1024,
+    workers: int = 1
+):
+    """
+    Sparse cosine-similarity graph computed one row block at a time
+
+    Only a block_size x N tile is ever materialized, and each row keeps at most
+    top_k neighbours (and/or only those at or above threshold), so memory stays
+    O(N * k) instead of O(N^2).
+
+    Args:
+        embeddings: N x d embedding matrix (any float dtype, memmaps welcome), or a
+            row-normalized scipy sparse matrix such as TF-IDF output
+        top_k: Maximum neighbours kept per row (None = no limit, requires threshold)
+        threshold: Minimum cosine similarity kept (None = no limit)
+        block_size: Rows per tile
+        workers: Worker processes; tiles share the normalized matrix via a memory-mapped
+            temp file. With 1, tiles run in-process (BLAS still uses all cores).
+
+    Returns:
+        N x N scipy CSR matrix of similarities (not necessarily symmetric with top_k)
+    """
+    if top_k is None and threshold is None:
+        raise ValueError("tiled_similarity needs top_k and/or threshold to stay sparse")
+    return _tiled_graph(_prepare(embeddings), top_k, threshold, block_size, workers)
+
+
+def _prepare(embeddings):
+    """Row-normalized float32 matrix, or CSR for sparse input (already normalized)"""
+    # scipy comes with scikit-learn; imported here so importing this module stays cheap
+    from scipy import sparse
+    return embeddings.tocsr() if sparse.issparse(embeddings) else _normalize(embeddings)
+
+
+def _tiled_graph(matrix, top_k: Optional[int], threshold: Optional[float], block_size: int, workers: int):
+    from scipy import sparse
+    n = matrix.shape[0]
+    if n == 0:
+        return sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    tiles = [(start, min(start + block_size, n), top_k, threshold) for start in range(0, n, block_size)]
+
+    if workers > 1 and len(tiles) > 1 and not sparse.issparse(matrix):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.npy")
+            np.save(path, matrix)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+                results = list(pool.map(_worker_block, tiles))
+    else:
+        results = [_top_neighbors_block(matrix, *tile) for tile in tiles]
+
+    rows = np.concatenate([r for r, _, _ in results])
+    cols = np.concatenate([c for _, c, _ in results])
+    values = np.concatenate([v for _, _, v in results]).astype(np.float32)
+    return sparse.csr_matrix((values, (rows, cols)), shape=(n, n))
+
+
+def similar_pairs(
+    embeddings: np.ndarray,
+    threshold: float,
+    top_k: Optional[int] = 50,
+    block_size: int = 1024,
+    workers: int = 1
+) -> dict:
+    """
+    Unordered pairs (i, j), i < j, whose cosine similarity is at least threshold
+
+    top_k only bounds the first pass: rows that kept top_k neighbours may have more
+    above the threshold, so they are searched again without the cap. The result is
+    therefore exact; top_k trades first-pass memory against rescans of dense rows.
+
+    Returns:
+        {(i, j): similarity}
+    """
+    matrix = _prepare(embeddings)
+    graph = _tiled_graph(matrix, top_k, threshold, block_size, workers)
+    coo = graph.tocoo()
+    results = [(coo.row, coo.col, coo.data)]
+
+    if top_k is not None:
+        capped = np.flatnonzero(np.diff(graph.indptr) >= top_k)
+        if len(capped):
+            print(f"Similarity search: {len(capped)} rows reached {top_k} neighbours, searching them in full")
+        for start in range(0, len(capped), block_size):
+            results.append(_rows_above_threshold(matrix, capped[start:start + block_size], threshold))
+
+    pairs = {}
+    for rows, cols, values in results:
+        for i, j, value in zip(rows.tolist(), cols.tolist(), np.asarray(values, dtype=np.float32).tolist()):
+            key = (i, j) if i < j else (j, i)
+            pairs[key] = max(pairs.get(key, value), value)
+    return pairs
@@ -1,8 +1,10 @@
 """Superset/Subset detection for documents where smaller file content is contained in larger file"""
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+from collections import defaultdict
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from app.scanner.content_similarity import ContentSimilarity
+from app.scanner.fingerprint import FingerprintIndex, shingle_set, winnow_fingerprints
+from app.scanner.text_extractor import normalize_text
 
 
 def chunk_text(text: str, chunk_size: int = 5) -> List[str]:
@@ -42,11 +44,87 @@ def chunk_text(text: str, chunk_size: int = 5) -> List[str]:
     return chunks if chunks else [text]  # Fallback to original text if no chunks
 
 
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a plain dot product equals cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _allowed_misses(num_chunks: int, min_containment: Optional[float]) -> int:
+    """Number of uncontained chunks tolerated before min_containment becomes unreachable"""
+    if min_containment is None:
+        return num_chunks
+    return int(np.floor(num_chunks * (1.0 - min_containment) + 1e-9))
+
+
+def containment_scores_batch(
+    smaller_embeddings: np.ndarray,
+    larger_embeddings_list: List[np.ndarray],
+    threshold: float = 0.98,
+    min_containment: Optional[float] = None,
+    block_size: int = 256
+) -> List[float]:
+    """
+    Containment of one smaller file in several candidate larger files at once
+    
+    The candidate chunk matrices are block-stacked column-wise so every row block of
+    the smaller file needs a single matrix product; per-candidate row maxima come from
+    a segmented max over the stacked columns. Embeddings must already be row-normalized.
+    
+    Args:
+        smaller_embeddings: Normalized chunk embeddings of the smaller file (n x d)
+        larger_embeddings_list: Normalized chunk embeddings of each candidate larger file
+        threshold: Minimum cosine similarity for a chunk to count as contained
+        min_containment: If set, stop scoring a candidate as soon as this containment
+            can no longer be reached (its returned score is then an upper bound below it)
+        block_size: Number of smaller-file rows multiplied per step
+    
+    Returns:
+        Containment score between 0 and 1 for each candidate, in input order
+    """
+    num_chunks = len(smaller_embeddings)
+    num_candidates = len(larger_embeddings_list)
+    if num_chunks == 0 or num_candidates == 0:
+        return [0.0] * num_candidates
+    
+    allowed = _allowed_misses(num_chunks, min_containment)
+    if min_containment is None:
+        block_size = num_chunks  # Nothing to stop early for, do one product
+    
+    misses = np.zeros(num_candidates, dtype=np.int64)
+    active = np.arange(num_candidates)
+    stacked = None
+    
+    for start in range(0, num_chunks, block_size):
+        if stacked is None:
+            # (Re)build the stacked matrix for the candidates still in the running
+            blocks = [larger_embeddings_list[k] for k in active]
+            offsets = np.cumsum([0] + [len(b) for b in blocks[:-1]])
+            stacked = np.vstack(blocks)
+        
+        block = smaller_embeddings[start:start + block_size]
+        similarities = block @ stacked.T
+        row_max = np.maximum.reduceat(similarities, offsets, axis=1)
+        misses[active] += np.count_nonzero(row_max < threshold, axis=0)
+        
+        still_active = active[misses[active] <= allowed]
+        if len(still_active) == 0:
+            break
+        if len(still_active) != len(active):
+            active = still_active
+            stacked = None
+    
+    return [float(num_chunks - m) / num_chunks for m in np.minimum(misses, num_chunks)]
+
+
 def calculate_containment_score(
     smaller_file_chunks: List[str],
     larger_file_chunks: List[str],
     similarity_model: ContentSimilarity,
-    threshold: float = 0.98
+    threshold: float = 0.98,
+    min_containment: Optional[float] = None
 ) -> float:
     """
     Calculate asymmetric containment score: what % of smaller file is in larger file
@@ -56,6 +134,7 @@ def calculate_containment_score(
         larger_file_chunks: Chunks from larger file
         similarity_model: ContentSimilarity instance for embeddings
         threshold: Minimum similarity to consider chunk "contained" (default: 0.98)
+        min_containment: Optional early-exit target, see containment_scores_batch
     
     Returns:
         Containment score between 0 and 1
@@ -72,23 +151,18 @@ def calculate_containment_score(
         return _simple_containment_score(smaller_file_chunks, larger_file_chunks, threshold)
     
     # Split embeddings
+    embeddings = _normalize_rows(embeddings)
     num_smaller = len(smaller_file_chunks)
     smaller_embeddings = embeddings[:num_smaller]
     larger_embeddings = embeddings[num_smaller:]
     
-    # For each chunk in smaller file, find best match in larger file
-    contained_count = 0
-    
-    for small_chunk_emb in smaller_embeddings:
-        # Calculate similarity with all chunks in larger file
-        similarities = cosine_similarity([small_chunk_emb], larger_embeddings)[0]
-        max_similarity = float(np.max(similarities))
-        
-        if max_similarity >= threshold:
-            contained_count += 1
-    
-    containment_score = contained_count / len(smaller_file_chunks) if smaller_file_chunks else 0.0
-    return containment_score
+    # One normalized matmul + row-wise max instead of a cosine_similarity call per chunk
+    return containment_scores_batch(
+        smaller_embeddings,
+        [larger_embeddings],
+        threshold=threshold,
+        min_containment=min_containment
+    )[0]
 
 
 def _simple_containment_score(
@@ -96,28 +170,42 @@ def _simple_containment_score(
     larger_chunks: List[str],
     threshold: float = 0.98
 ) -> float:
-    """Fallback containment score using simple text similarity"""
-    from difflib import SequenceMatcher
+    """
+    Fallback containment score using hashed chunks and shingle sets
+    
+    A chunk counts as contained if its normalized text appears verbatim as a chunk of
+    the larger file, or if at least `threshold` of its word shingles occur anywhere in
+    the larger file. Linear in the total text length, unlike pairwise SequenceMatcher.
+    """
+    if not smaller_chunks:
+        return 0.0
+    
+    larger_chunk_hashes = {hash(normalize_text(chunk)) for chunk in larger_chunks}
+    larger_shingles = set()
+    for chunk in larger_chunks:
+        larger_shingles |= shingle_set(chunk)
     
     contained_count = 0
     
     for small_chunk in smaller_chunks:
-        best_similarity = 0.0
-        for large_chunk in larger_chunks:
-            similarity = SequenceMatcher(None, small_chunk.lower(), large_chunk.lower()).ratio()
-            best_similarity = max(best_similarity, similarity)
+        if hash(normalize_text(small_chunk)) in larger_chunk_hashes:
+            contained_count += 1
+            continue
         
-        if best_similarity >= threshold:
+        shingles = shingle_set(small_chunk)
+        if shingles and len(shingles & larger_shingles) / len(shingles) >= threshold:
             contained_count += 1
     
-    return contained_count / len(smaller_chunks) if smaller_chunks else 0.0
+    return contained_count / len(smaller_chunks)
 
 
 def find_superset_subset_duplicates(
     files: List[Dict],
     similarity_model: ContentSimilarity,
     containment_threshold: float = 0.95,
-    size_ratio_threshold: float = 1.10
+    size_ratio_threshold: float = 1.10,
+    use_fingerprints: bool = True,
+    fingerprint_threshold: float = 0.6
 ) -> List[Dict]:
     """
     Find superset/subset relationships where smaller file content is contained in larger file
@@ -127,6 +215,8 @@ def find_superset_subset_duplicates(
         similarity_model: ContentSimilarity instance
         containment_threshold: Minimum containment score (default: 0.95 = 95%)
         size_ratio_threshold: Minimum size ratio for larger file (default: 1.10 = 10% larger)
+        use_fingerprints: Only consider pairs whose winnowed fingerprints overlap (default: True)
+        fingerprint_threshold: Minimum share of the smaller file's fingerprints found in the larger
     
     Returns:
         List of duplicate groups with superset/subset relationship
@@ -137,74 +227,159 @@ def find_superset_subset_duplicates(
     if len(text_files) < 2:
         return []
     
+    # Step 1: collect candidate (smaller, larger) pairs, pruned by fingerprints and metadata
+    if use_fingerprints:
+        raw_pairs = _fingerprint_candidate_pairs(text_files, fingerprint_threshold)
+    else:
+        raw_pairs = [
+            (text_files[i], text_files[j])
+            for i in range(len(text_files))
+            for j in range(i + 1, len(text_files))
+        ]
+    
+    candidate_pairs = []
+    for file1, file2 in raw_pairs:
+        pair = _order_superset_pair(file1, file2, size_ratio_threshold)
+        if pair:
+            candidate_pairs.append(pair)
+    
+    if not candidate_pairs:
+        return []
+    
+    # Step 2: chunk every involved file once (not once per pair)
+    chunks_by_id = {}
+    for smaller_file, larger_file in candidate_pairs:
+        for file in (smaller_file, larger_file):
+            if file["id"] not in chunks_by_id:
+                chunks_by_id[file["id"]] = chunk_text(file.get("extracted_text", ""))
+    
+    # Step 3: score containment, batched per smaller file
+    scores = _score_candidate_pairs(candidate_pairs, chunks_by_id, similarity_model, containment_threshold)
+    
     duplicate_groups = []
-    processed_pairs = set()
-    
-    # Compare all pairs
-    for i in range(len(text_files)):
-        for j in range(i + 1, len(text_files)):
-            file1 = text_files[i]
-            file2 = text_files[j]
-            
-            # Skip if already processed
-            pair_key = tuple(sorted([file1["id"], file2["id"]]))
-            if pair_key in processed_pairs:
-                continue
-            
-            # Determine smaller and larger file
-            size1 = file1.get("size", 0)
-            size2 = file2.get("size", 0)
-            date1 = file1.get("last_modified", "")
-            date2 = file2.get("last_modified", "")
-            
-            if size1 < size2:
-                smaller_file = file1
-                larger_file = file2
-            elif size2 < size1:
-                smaller_file = file2
-                larger_file = file1
-            else:
-                # Same size, skip (not superset/subset)
-                continue
-            
-            # Check size difference (larger must be at least 10% bigger)
-            size_ratio = larger_file.get("size", 0) / smaller_file.get("size", 1)
-            if size_ratio < size_ratio_threshold:
-                continue
-            
-            # Check date (larger file should be newer)
-            if larger_file.get("last_modified", "") < smaller_file.get("last_modified", ""):
-                continue  # Larger file is older, skip
-            
-            # Chunk the texts
-            smaller_chunks = chunk_text(smaller_file.get("extracted_text", ""))
-            larger_chunks = chunk_text(larger_file.get("extracted_text", ""))
-            
-            if not smaller_chunks or not larger_chunks:
-                continue
-            
-            # Calculate containment score
-            containment = calculate_containment_score(
-                smaller_chunks,
-                larger_chunks,
-                similarity_model,
-                threshold=0.98
-            )
-            
-            # Check if superset/subset relationship
-            if containment >= containment_threshold:
-                # Group found: larger file is primary (superset), smaller is duplicate (subset)
-                duplicate_groups.append({
-                    "group_type": "superset_subset",
-                    "primary_file": larger_file,  # Newer, larger file (superset)
-                    "duplicate_files": [smaller_file],  # Older, smaller file (subset)
-                    "similarity_score": float(containment),
-                    "containment_score": float(containment),
-                    "storage_savings_bytes": smaller_file.get("size", 0),
-                    "relationship": "superset_subset"
-                })
-                
-                processed_pairs.add(pair_key)
+    
+    for (smaller_file, larger_file), containment in zip(candidate_pairs, scores):
+        # Check if superset/subset relationship
+        if containment >= containment_threshold:
+            # Group found: larger file is primary (superset), smaller is duplicate (subset)
+            duplicate_groups.append({
+                "group_type": "superset_subset",
+                "primary_file": larger_file,  # Newer, larger file (superset)
+                "duplicate_files": [smaller_file],  # Older, smaller file (subset)
+                "similarity_score": float(containment),
+                "containment_score": float(containment),
+                "storage_savings_bytes": smaller_file.get("size", 0),
+                "relationship": "superset_subset"
+            })
     
     return duplicate_groups
 
+
+def _order_superset_pair(file1: Dict, file2: Dict, size_ratio_threshold: float) -> Optional[Tuple[Dict, Dict]]:
+    """Return (smaller, larger) if the pair passes the size and date checks, else None"""
+    # Determine smaller and larger file
+    size1 = file1.get("size", 0)
+    size2 = file2.get("size", 0)
+    
+    if size1 < size2:
+        smaller_file = file1
+        larger_file = file2
+    elif size2 < size1:
+        smaller_file = file2
+        larger_file = file1
+    else:
+        # Same size, skip (not superset/subset)
+        return None
+    
+    # Check size difference (larger must be at least 10% bigger)
+    size_ratio = larger_file.get("size", 0) / smaller_file.get("size", 1)
+    if size_ratio < size_ratio_threshold:
+        return None
+    
+    # Check date (larger file should be newer)
+    if larger_file.get("last_modified", "") < smaller_file.get("last_modified", ""):
+        return None  # Larger file is older, skip
+    
+    return smaller_file, larger_file
+
+
+def _fingerprint_candidate_pairs(text_files: List[Dict], min_containment: float) -> List[Tuple[Dict, Dict]]:
+    """
+    Candidate pairs from a winnowing fingerprint index instead of all N^2 pairs
+    
+    A pair is kept when either file has at least min_containment of its fingerprints
+    present in the other. Files may carry precomputed fingerprints in 'fingerprints'.
+    """
+    index = FingerprintIndex()
+    position = {}
+    for i, file in enumerate(text_files):
+        fingerprints = file.get("fingerprints")
+        if fingerprints is None:
+            fingerprints = winnow_fingerprints(file.get("extracted_text", ""))
+        index.add(file["id"], fingerprints)
+        position[file["id"]] = i
+    
+    pair_indices = set()
+    for file in text_files:
+        for other_id in index.containment_candidates(file["id"], min_containment):
+            i, j = position[file["id"]], position[other_id]
+            pair_indices.add((min(i, j), max(i, j)))
+    
+    return [(text_files[i], text_files[j]) for i, j in sorted(pair_indices)]
+
+
+def _score_candidate_pairs(
+    candidate_pairs: List[Tuple[Dict, Dict]],
+    chunks_by_id: Dict[str, List[str]],
+    similarity_model: ContentSimilarity,
+    containment_threshold: float,
+    chunk_threshold: float = 0.98
+) -> List[float]:
+    """
+    Containment score for each (smaller, larger) pair
+    
+    All chunks are embedded in a single model call, then each smaller file is scored
+    against all of its candidate supersets with one block-stacked matrix product.
+    """
+    file_ids = [file_id for file_id, chunks in chunks_by_id.items() if chunks]
+    all_chunks = []
+    offsets = {}
+    for file_id in file_ids:
+        chunks = chunks_by_id[file_id]
+        offsets[file_id] = (len(all_chunks), len(all_chunks) + len(chunks))
+        all_chunks.extend(chunks)
+    
+    embeddings = similarity_model.compute_embeddings(all_chunks) if all_chunks else None
+    if embeddings is None or len(embeddings) != len(all_chunks):
+        # Fallback: use simple text similarity pair by pair
+        return [
+            _simple_containment_score(
+                chunks_by_id[smaller["id"]], chunks_by_id[larger["id"]], chunk_threshold
+            ) if chunks_by_id[smaller["id"]] and chunks_by_id[larger["id"]] else 0.0
+            for smaller, larger in candidate_pairs
+        ]
+    
+    embeddings = _normalize_rows(embeddings)
+    
+    def file_embeddings(file_id: str) -> np.ndarray:
+        start, end = offsets[file_id]
+        return embeddings[start:end]
+    
+    # Group pair indices by smaller file so each gets one batched computation
+    pairs_by_smaller = defaultdict(list)
+    for index, (smaller, larger) in enumerate(candidate_pairs):
+        if smaller["id"] in offsets and larger["id"] in offsets:
+            pairs_by_smaller[smaller["id"]].append(index)
+    
+    scores = [0.0] * len(candidate_pairs)
+    for smaller_id, indices in pairs_by_smaller.items():
+        batch_scores = containment_scores_batch(
+            file_embeddings(smaller_id),
+            [file_embeddings(candidate_pairs[k][1]["id"]) for k in indices],
+            threshold=chunk_threshold,
+            min_containment=containment_threshold
+        )
+        for k, score in zip(indices, batch_scores):
+            scores[k] = score
+    
+    return scores
@@ -1,10 +1,8 @@
 """Extract text from various file types for content-based duplicate detection"""
 import io
 from typing import Optional
-import PyPDF2
-from docx import Document
-from openpyxl import load_workbook
-from pptx import Presentation
+
+# Parser libraries are imported inside each extractor so importing this module stays cheap
 
 
 def extract_text_from_file(content: bytes, mime_type: str, filename: str) -> Optional[str]:
@@ -67,9 +65,32 @@ def extract_text_from_file(content: bytes, mime_type: str, filename: str) -> Opt
         return None
 
 
+def is_text_extractable(mime_type: str, filename: str) -> bool:
+    """True if extract_text_from_file handles this type (so the full content is needed anyway)"""
+    name = filename.lower()
+    return (
+        mime_type in TEXT_MIME_TYPES
+        or name.endswith(('.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.txt', '.html', '.htm'))
+    )
+
+
+TEXT_MIME_TYPES = {
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.ms-powerpoint',
+    'text/plain',
+    'text/html',
+}
+
+
 def extract_text_from_pdf(content: bytes) -> Optional[str]:
     """Extract text from PDF"""
     try:
+        import PyPDF2
         pdf_file = io.BytesIO(content)
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         text_parts = []
@@ -88,6 +109,7 @@ def extract_text_from_pdf(content: bytes) -> Optional[str]:
 def extract_text_from_docx(content: bytes) -> Optional[str]:
     """Extract text from DOCX"""
     try:
+        from docx import Document
         doc_file = io.BytesIO(content)
         doc = Document(doc_file)
         text_parts = []
@@ -112,6 +134,7 @@ def extract_text_from_docx(content: bytes) -> Optional[str]:
 def extract_text_from_xlsx(content: bytes) -> Optional[str]:
     """Extract text from XLSX"""
     try:
+        from openpyxl import load_workbook
         xlsx_file = io.BytesIO(content)
         workbook = load_workbook(xlsx_file, data_only=True)
         text_parts = []
@@ -137,6 +160,7 @@ def extract_text_from_xlsx(content: bytes) -> Optional[str]:
 def extract_text_from_pptx(content: bytes) -> Optional[str]:
     """Extract text from PPTX"""
     try:
+        from pptx import Presentation
         pptx_file = io.BytesIO(content)
         presentation = Presentation(pptx_file)
         text_parts = []
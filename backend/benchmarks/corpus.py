@@ -0,0 +1,259 @@
+"""Reproducible synthetic document corpus with known duplicate structure"""
+from typing import Dict, List
+import hashlib
+import io
+import random
+import re
+import zipfile
+
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+ROOT_ID = "bench-root"  # Folder holding the whole corpus (the one to select for a scan)
+
+MIME_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "bin": "application/octet-stream",
+}
+
+
+def _vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def _paragraphs(rng: random.Random, vocabulary: List[str], count: int) -> List[str]:
+    paragraphs = []
+    for _ in range(count):
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = rng.choices(vocabulary, k=rng.randint(8, 18))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def _edit(rng: random.Random, vocabulary: List[str], paragraphs: List[str], rate: float) -> List[str]:
+    """Replace a fraction of the words (a revised version of the same document)"""
+    edited = []
+    for paragraph in paragraphs:
+        words = paragraph.split(" ")
+        for i in range(len(words)):
+            if rng.random() < rate:
+                words[i] = rng.choice(vocabulary)
+        edited.append(" ".join(words))
+    return edited
+
+
+def _fixed_zip(content: bytes) -> bytes:
+    """Rewrite an Office zip with fixed entry timestamps so renders are byte-for-byte reproducible"""
+    source = zipfile.ZipFile(io.BytesIO(content))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            if info.filename == "docProps/core.xml":
+                data = re.sub(rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ", b"2024-01-01T00:00:00Z", data)
+            target.writestr(zipfile.ZipInfo(info.filename, date_time=(2024, 1, 1, 0, 0, 0)), data, zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+def render_docx(paragraphs: List[str]) -> bytes:
+    import docx
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return _fixed_zip(buffer.getvalue())
+
+
+def render_xlsx(paragraphs: List[str]) -> bytes:
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row, paragraph in enumerate(paragraphs, start=1):
+        for column, sentence in enumerate(paragraph.split(". "), start=1):
+            sheet.cell(row=row, column=column, value=sentence)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return _fixed_zip(buffer.getvalue())
+
+
+def render_pptx(paragraphs: List[str]) -> bytes:
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]  # Blank
+    for paragraph in paragraphs:
+        slide = presentation.slides.add_slide(layout)
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6))
+        box.text_frame.word_wrap = True
+        box.text_frame.text = paragraph
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return _fixed_zip(buffer.getvalue())
+
+
+def render_pdf(paragraphs: List[str], line_length: int = 90, lines_per_page: int = 50) -> bytes:
+    """Minimal PDF with one Helvetica text stream per page (no PDF writer dependency)"""
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split(" "):
+            if line and len(line) + len(word) + 1 > line_length:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_lines in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for line in page_lines
+        )
+        stream = f"BT /F1 10 Tf 12 TL 50 800 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return output.getvalue()
+
+
+RENDERERS = {"docx": render_docx, "pdf": render_pdf, "xlsx": render_xlsx, "pptx": render_pptx}
+
+
+def generate_corpus(
+    documents: int = 200,
+    seed: int = 42,
+    copy_rate: float = 0.2,
+    edit_rate: float = 0.2,
+    superset_rate: float = 0.1,
+    binary_files: int = 10,
+    binary_size: int = 2 * 1024 * 1024,
+    folder_fanout: int = 4,
+    folder_depth: int = 2,
+    drives: int = 1,
+    paragraphs: int = 12
+) -> Dict:
+    """
+    Build a corpus of office documents whose duplicates are known in advance
+
+    Every original document is a DOCX, PDF, XLSX or PPTX of random prose. A share of
+    them also get an exact copy (same bytes), an edited version (a few percent of the
+    words changed) and a superset (the whole text plus extra paragraphs). Large binary
+    files (with one exact copy each) exercise tiered hashing. Files are spread over a
+    folder tree below ROOT_ID, on `drives` drives. The same arguments always produce
+    the same bytes.
+
+    Args:
+        documents: Original documents
+        seed: Random seed
+        copy_rate / edit_rate / superset_rate: Share of originals with each variant
+        binary_files: Large non-text files (plus an exact copy of each)
+        binary_size: Size of each binary file
+        folder_fanout / folder_depth: Shape of the folder tree
+        drives: Drives the files are spread over (OneDrive plus SharePoint sites for Graph)
+        paragraphs: Paragraphs per original document
+
+    Returns:
+        {"folders": [...], "files": [...], "expected": {...}} - folders and files have
+        id, name, parent and drive; files also content, mime_type, md5, modified and kind
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+
+    folders = [{"id": ROOT_ID, "name": "Benchmark corpus", "parent": "root", "drive": 0}]
+    level = [ROOT_ID]
+    for depth in range(folder_depth):
+        next_level = []
+        for parent in level:
+            for i in range(folder_fanout):
+                folder_id = f"{parent}-{i}"
+                folders.append({"id": folder_id, "name": f"Folder {depth}.{i}", "parent": parent, "drive": 0})
+                next_level.append(folder_id)
+        level = next_level
+    folder_ids = [f["id"] for f in folders]
+
+    files = []
+    expected = {"originals": documents, "exact_copies": 0, "edited": 0, "supersets": 0, "binary_copies": 0}
+
+    def add(name: str, extension: str, content: bytes, kind: str) -> None:
+        number = len(files)
+        files.append({
+            "id": f"file-{number:06d}",
+            "name": f"{name}.{extension}",
+            "mime_type": MIME_TYPES[extension],
+            "content": content,
+            "md5": hashlib.md5(content).hexdigest(),
+            "parent": rng.choice(folder_ids),
+            "drive": number % drives,
+            "modified": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+            "kind": kind
+        })
+
+    for n in range(documents):
+        extension = ("docx", "pdf", "xlsx", "pptx")[n % 4]
+        render = RENDERERS[extension]
+        text = _paragraphs(rng, vocabulary, paragraphs)
+        content = render(text)
+        add(f"Document {n}", extension, content, "original")
+
+        if rng.random() < copy_rate:
+            add(f"Document {n} (copy)", extension, content, "exact_copy")
+            expected["exact_copies"] += 1
+        if rng.random() < edit_rate:
+            add(f"Document {n} v2", extension, render(_edit(rng, vocabulary, text, 0.03)), "edited")
+            expected["edited"] += 1
+        if rng.random() < superset_rate:
+            extra = _paragraphs(rng, vocabulary, max(2, paragraphs // 3))
+            add(f"Document {n} combined", extension, render(text + extra), "superset")
+            expected["supersets"] += 1
+
+    for n in range(binary_files):
+        content = rng.randbytes(binary_size)
+        add(f"Archive {n}", "bin", content, "binary")
+        add(f"Archive {n} backup", "bin", content, "binary_copy")
+        expected["binary_copies"] += 1
+
+    # Every drive gets the same folder tree (Graph exposes one tree per drive)
+    folders = [dict(folder, drive=drive) for drive in range(drives) for folder in folders]
+
+    total_bytes = sum(len(f["content"]) for f in files)
+    print(f"📦 Corpus: {len(files)} files ({total_bytes / 1e6:.1f} MB) in {len(folder_ids)} folders x {drives} drive(s)")
+    return {"folders": folders, "files": files, "expected": expected, "total_bytes": total_bytes}
+
+
+def corpus_summary(corpus: Dict) -> Dict:
+    """Counts without file contents (for reports)"""
+    kinds = {}
+    for file in corpus["files"]:
+        kinds[file["kind"]] = kinds.get(file["kind"], 0) + 1
+    return {
+        "files": len(corpus["files"]),
+        "folders": len({f["id"] for f in corpus["folders"]}),
+        "bytes": corpus["total_bytes"],
+        "kinds": kinds,
+        "expected": corpus["expected"]
+    }
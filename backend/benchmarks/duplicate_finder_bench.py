@@ -0,0 +1,410 @@
+"""
+Scaling micro-benchmarks for the duplicate_finder stages, checked against a stored baseline
+
+    cd backend
+    python -m benchmarks.duplicate_finder_bench                    # compare with the baseline
+    python -m benchmarks.duplicate_finder_bench --sizes 1000,10000 --update-baseline
+
+Each stage (exact, superset/subset, near) runs on synthetic file dicts at every size,
+with a deterministic stub in place of the embedding model. Time, model calls and the
+Python allocation peak are recorded per stage and size; the run exits with status 1 if
+any of them regresses past the baseline (times and memory with a tolerance, model
+calls exactly, since they are deterministic). Each measurement runs in a forked child
+with a timeout, so a stage that falls over at some N is recorded as timed out there.
+A baseline with a timed-out entry is refused, so the stored baseline only holds
+completed measurements.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+
+
+DEFAULT_SIZES = [1000, 10000, 30000, 100000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "duplicate_finder.json")
+
+
+class StubEmbeddingModel:
+    """
+    Deterministic stand-in for a sentence-transformers model
+
+    Embeds a text as a signed hashed bag of its first max_seq_length words, so texts
+    sharing most words get high cosine similarity, exactly as near duplicates would
+    with a real model. Counts calls and texts, and the time spent inside encode() so
+    it can be left out of the stage timings.
+    """
+
+    max_seq_length = 256
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.calls = 0
+        self.texts = 0
+        self.seconds = 0.0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, word: str):
+        slot = self._slots.get(word)
+        if slot is None:
+            digest = zlib.crc32(word.encode("utf-8"))
+            slot = self._slots[word] = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+        return slot
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: Optional[int] = None) -> np.ndarray:
+        started = time.perf_counter()
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split()[:self.max_seq_length]:
+                index, sign = self._slot(word)
+                embeddings[row, index] += sign
+        embeddings[:, 0] += 1e-3  # No all-zero rows
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            self.seconds += time.perf_counter() - started
+        return embeddings
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.texts = 0
+            self.seconds = 0.0
+
+
+def stub_similarity(model: StubEmbeddingModel):
+    """ContentSimilarity that uses the stub model (without loading or wrapping any real model)"""
+    from app.scanner.content_similarity import ContentSimilarity
+
+    similarity = ContentSimilarity.__new__(ContentSimilarity)
+    similarity.model = model
+    similarity.backend_name = "stub"
+    similarity._stores = {}
+    return similarity
+
+
+def synthetic_files(n: int, seed: int = 7, words: int = 80) -> List[Dict]:
+    """
+    n file dicts as process_drive_files produces them, with known duplicate structure
+
+    About 60% unique documents, 10% exact copies, 15% edited versions, 10% supersets
+    and 5% files without text. Fingerprints are precomputed, as the scan pipeline does.
+    """
+    from app.scanner.fingerprint import winnow_fingerprints
+
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(5000)]
+
+    files = []
+    originals = []
+
+    def prose(count: int) -> str:
+        # Sentences of 8 words, so superset detection can chunk the text by sentence
+        sentences = [" ".join(rng.choices(vocabulary, k=8)) for _ in range(max(count // 8, 1))]
+        return ". ".join(sentences) + "."
+
+    def add(name: str, text: Optional[str], modified: str, size: Optional[int] = None) -> None:
+        number = len(files)
+        content_hash = hashlib.sha256((text or name).encode("utf-8")).hexdigest()
+        files.append({
+            "id": f"f{number}",
+            "name": name,
+            "size": size or (len(text) * 10 if text else 50000 + rng.randint(0, 1000)),
+            "mime_type": "application/pdf" if text else "application/octet-stream",
+            "last_modified": modified,
+            "content_hash": content_hash,
+            "extracted_text": text,
+            "fingerprints": winnow_fingerprints(text) if text else None,
+        })
+
+    while len(files) < n:
+        roll = rng.random()
+        modified = f"2024-{rng.randint(1, 6):02d}-{rng.randint(1, 28):02d}T12:00:00Z"
+        if roll < 0.60 or not originals:
+            text = prose(words)
+            originals.append((len(originals), text, modified))
+            add(f"Report {len(originals) - 1}.pdf", text, modified)
+        elif roll < 0.70:
+            k, text, original_modified = rng.choice(originals)
+            add(f"Report {k} (copy).pdf", text, original_modified)
+        elif roll < 0.85:
+            k, text, _ = rng.choice(originals)
+            edited = text.split(" ")
+            for _ in range(3):
+                edited[rng.randrange(len(edited))] = rng.choice(vocabulary)
+            add(f"Report {k} v2.pdf", " ".join(edited), modified)
+        elif roll < 0.95:
+            k, text, _ = rng.choice(originals)
+            extra = prose(words // 2)
+            add(f"Report {k} combined.pdf", f"{text} {extra}", "2024-12-01T12:00:00Z")
+        else:
+            add(f"Scan {len(files)}.bin", None, modified)
+    return files
+
+
+def stage_functions(similarity) -> Dict[str, Callable[[List[Dict]], List[Dict]]]:
+    from app.scanner import duplicate_finder
+
+    return {
+        "find_exact_duplicates": duplicate_finder.find_exact_duplicates,
+        "find_superset_subset_duplicates": lambda files: duplicate_finder.find_superset_subset_duplicates(files, similarity),
+        "find_near_duplicates_improved": duplicate_finder.find_near_duplicates_improved,
+    }
+
+
+def measure(function: Callable, files: List[Dict], model: StubEmbeddingModel, quiet, repeat: int = 3) -> Dict:
+    """
+    Best time of up to `repeat` calls (short stages only, to damp noise), then one more
+    call under tracemalloc for the allocation peak
+    """
+    from contextlib import redirect_stdout
+
+    best = None
+    for attempt in range(repeat):
+        gc.collect()
+        model.reset()
+        with redirect_stdout(quiet):
+            started = time.perf_counter()
+            groups = function(files)
+            elapsed = time.perf_counter() - started - model.seconds
+        if best is None or elapsed < best[0]:
+            best = (elapsed, model.calls, model.texts, model.seconds)
+        if elapsed > 1.0:
+            break
+    elapsed, calls, texts, model_seconds = best
+
+    gc.collect()
+    tracemalloc.start()
+    with redirect_stdout(quiet):
+        function(files)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "seconds": round(elapsed, 4),
+        "model_seconds": round(model_seconds, 4),
+        "model_calls": calls,
+        "model_texts": texts,
+        "peak_alloc_mb": round(peak / 1e6, 2),
+        "groups": len(groups),
+    }
+
+
+def environment() -> Dict:
+    """Machine and library details the timings depend on (stored with the baseline)"""
+    import scipy
+
+    cpu_model = platform.processor() or None
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu_model = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu_model)
+    except OSError:
+        pass
+
+    memory_gb = None
+    try:
+        memory_gb = round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9, 1)
+    except (AttributeError, ValueError, OSError):
+        pass  # Not available on Windows
+
+    blas = None
+    try:
+        from threadpoolctl import threadpool_info
+        blas = [
+            {"library": pool.get("internal_api"), "threads": pool.get("num_threads")}
+            for pool in threadpool_info() if pool.get("user_api") == "blas"
+        ]
+    except ImportError:
+        pass  # Optional: only the thread environment variables are recorded
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_model": cpu_model,
+        "cpus": os.cpu_count(),
+        "memory_gb": memory_gb,
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "blas": blas,
+        "thread_env": {
+            name: os.environ[name]
+            for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+            if name in os.environ
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, time_tolerance: float, memory_tolerance: float, time_slack: float) -> List[str]:
+    """Regressions of results against baseline, as messages (empty if none)"""
+    regressions = []
+    for function, sizes in results.items():
+        for size, current in sizes.items():
+            reference = baseline.get(function, {}).get(size)
+            label = f"{function} N={size}"
+            if current.get("error"):
+                regressions.append(f"{label}: failed with {current['error']}")
+                continue
+            if not reference or "seconds" not in reference:
+                continue  # Not measured (or timed out) in the baseline
+            if "seconds" not in current:
+                # Finished within the timeout in the baseline, but not any more
+                regressions.append(f"{label}: {'timed out' if current.get('timed_out') else 'skipped'}, "
+                                   f"baseline {reference['seconds']}s")
+                continue
+            # Absolute slack on top of the relative tolerance: short stages are mostly noise
+            allowed = reference["seconds"] * (1 + time_tolerance) + time_slack
+            if current["seconds"] > allowed:
+                regressions.append(f"{label}: {current['seconds']}s > {reference['seconds']}s (+{time_tolerance:.0%} allowed)")
+            if current["peak_alloc_mb"] > reference["peak_alloc_mb"] * (1 + memory_tolerance) + 1.0:
+                regressions.append(
+                    f"{label}: peak {current['peak_alloc_mb']} MB > {reference['peak_alloc_mb']} MB "
+                    f"(+{memory_tolerance:.0%} allowed)"
+                )
+            for counter in ("model_calls", "model_texts"):
+                if current[counter] > reference[counter]:
+                    regressions.append(f"{label}: {counter} {current[counter]} > {reference[counter]}")
+            if current["groups"] != reference["groups"]:
+                print(f"⚠️  {label}: {current['groups']} groups (baseline {reference['groups']}) - results changed")
+    return regressions
+
+
+def _measure_in_child(function: Callable, files: List[Dict], model: StubEmbeddingModel, verbose: bool, conn) -> None:
+    quiet = sys.stdout if verbose else open(os.devnull, "w")
+    try:
+        conn.send(measure(function, files, model, quiet))
+    except Exception as e:
+        conn.send({"error": repr(e)})
+    finally:
+        conn.close()
+
+
+def measure_with_timeout(function: Callable, files: List[Dict], model: StubEmbeddingModel, timeout: float, verbose: bool) -> Dict:
+    """
+    measure() in a forked child so a stage that takes too long can be abandoned
+
+    The child inherits the files and stub model without copying. Without fork
+    (e.g. on Windows) the measurement runs in-process and cannot time out.
+    """
+    import multiprocessing
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        quiet = sys.stdout if verbose else open(os.devnull, "w")
+        return measure(function, files, model, quiet)
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_measure_in_child, args=(function, files, model, verbose, sender))
+    child.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+        return {"timed_out": True, "timeout": timeout}
+    finally:
+        child.terminate()
+        child.join()
+
+
+def run(sizes: List[int], timeout: float, verbose: bool = False) -> Dict:
+    from app.scanner import duplicate_finder
+
+    model = StubEmbeddingModel()
+    similarity = stub_similarity(model)
+    duplicate_finder._content_similarity = similarity  # Singleton used by the near-duplicate stage
+    functions = stage_functions(similarity)
+
+    results = {name: {} for name in functions}
+    too_slow = set()
+    for size in sizes:
+        print(f"Generating {size} files...")
+        files = synthetic_files(size)
+        for name, function in functions.items():
+            label = f"  {name:<34} N={size:<7}"
+            if name in too_slow:
+                results[name][str(size)] = {"skipped": True}
+                print(f"{label} skipped (timed out at a smaller N)")
+                continue
+            result = measure_with_timeout(function, files, model, timeout, verbose)
+            results[name][str(size)] = result
+            if result.get("timed_out"):
+                too_slow.add(name)
+                print(f"{label} timed out after {timeout:.0f}s")
+            elif result.get("error"):
+                print(f"{label} failed: {result['error']}")
+            else:
+                print(
+                    f"{label} {result['seconds']:>9.3f}s  "
+                    f"model {result['model_calls']} calls / {result['model_texts']} texts  "
+                    f"peak {result['peak_alloc_mb']} MB  {result['groups']} groups"
+                )
+        del files
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="duplicate_finder scaling benchmarks with regression check")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="Comma-separated N values")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="Allowed slowdown (0.5 = +50%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed growth of the allocation peak")
+    parser.add_argument("--time-slack", type=float, default=0.1, help="Seconds allowed on top of --time-tolerance")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="Seconds per stage and N (timing and memory runs together); larger N are then skipped")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the detection stages' log output")
+    args = parser.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(",") if n]
+    results = run(sizes, args.timeout, args.verbose)
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        unfinished = [
+            f"{name} N={size}" for name, sizes in results.items()
+            for size, result in sizes.items() if "seconds" not in result
+        ]
+        if unfinished:
+            print(f"❌ Not writing a baseline with unfinished measurements: {', '.join(unfinished)}")
+            print("   Raise --timeout, or lower --sizes")
+            return 1
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"✅ Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline["results"], args.time_tolerance, args.memory_tolerance, args.time_slack)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Local stand-in for the Google Drive v3 and Microsoft Graph endpoints the scanner calls
+
+Serves a synthetic corpus (see corpus.py) with configurable per-request latency and
+throttling, so scans can be benchmarked offline:
+
+    python -m benchmarks.fake_server --port 8765 --documents 500 --latency-ms 20
+
+Drive v3 lives under /drive/v3 and Graph under /v1.0; point GoogleDriveClient.BASE_URL
+and GraphClient.BASE_URL there. Any bearer token is accepted. /_bench/stats reports
+request, throttle and byte counters.
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks.corpus import FOLDER_MIME, ROOT_ID, corpus_summary, generate_corpus
+
+
+DRIVE_PAGE_LIMIT = 1000
+GRAPH_PAGE_LIMIT = 999
+GRAPH_DEFAULT_PAGE = 200
+DRIVE_ROOT_ID = "root-folder"  # What the "root" alias resolves to
+
+
+def _drive_file(file: Dict) -> Dict:
+    return {
+        "id": file["id"],
+        "name": file["name"],
+        "mimeType": file["mime_type"],
+        "size": str(len(file["content"])),
+        "modifiedTime": file["modified"],
+        "webViewLink": f"https://drive.example/{file['id']}",
+        "md5Checksum": file["md5"],
+        "parents": [file["parent"]],
+    }
+
+
+def _drive_folder(folder: Dict) -> Dict:
+    parent = DRIVE_ROOT_ID if folder["parent"] == "root" else folder["parent"]
+    return {"id": folder["id"], "name": folder["name"], "mimeType": FOLDER_MIME, "parents": [parent]}
+
+
+def _graph_item(entry: Dict, drive_id: str, is_folder: bool, child_count: int = 0) -> Dict:
+    item = {
+        "id": entry["id"],
+        "name": entry["name"],
+        "webUrl": f"https://graph.example/{drive_id}/{entry['id']}",
+        "parentReference": {"driveId": drive_id, "path": f"/drives/{drive_id}/root:"},
+    }
+    if is_folder:
+        item["folder"] = {"childCount": child_count}
+    else:
+        item.update({
+            "size": len(entry["content"]),
+            "file": {"mimeType": entry["mime_type"]},
+            "lastModifiedDateTime": entry["modified"],
+            "eTag": f"\"{entry['md5']}\"",
+        })
+    return item
+
+
+def _range(header: Optional[str], size: int):
+    """(start, end) inclusive from a `bytes=a-b` Range header, or None"""
+    match = re.match(r"bytes=(\d*)-(\d*)", header or "")
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start:
+        return max(size - int(end), 0), size - 1
+    return int(start), min(int(end) if end else size - 1, size - 1)
+
+
+def create_app(
+    corpus: Dict,
+    latency_ms: float = 0.0,
+    download_latency_ms: Optional[float] = None,
+    bandwidth_mbps: float = 0.0,
+    throttle_rate: float = 0.0,
+    retry_after: int = 1,
+    seed: int = 0
+) -> FastAPI:
+    """
+    FastAPI app serving the corpus through Drive and Graph shaped endpoints
+
+    Args:
+        corpus: Output of generate_corpus
+        latency_ms: Delay added to every metadata/listing request
+        download_latency_ms: Delay added to content downloads (default latency_ms)
+        bandwidth_mbps: Simulated download bandwidth per request in MB/s (0 = unlimited)
+        throttle_rate: Share of requests answered 429 with Retry-After
+        retry_after: Retry-After seconds sent with throttled responses
+        seed: Seed for the throttling decisions
+    """
+    app = FastAPI(title="Fake Drive/Graph")
+    rng = random.Random(seed)
+    files = {f["id"]: f for f in corpus["files"]}
+    drives = sorted({f["drive"] for f in corpus["folders"]})
+    stats = {"requests": 0, "throttled": 0, "bytes_served": 0, "by_endpoint": {}}
+
+    # Children per (drive, parent): folders first, then files, as listings return them
+    children: Dict[tuple, List[tuple]] = {}
+    for folder in corpus["folders"]:
+        children.setdefault((folder["drive"], folder["parent"]), []).append(("folder", folder))
+    for file in corpus["files"]:
+        children.setdefault((file["drive"], file["parent"]), []).append(("file", file))
+    folder_names = {f["id"]: f for f in corpus["folders"] if f["drive"] == 0}
+    # Drive has a single tree: the folders once, with the files of every drive in them
+    drive_children: Dict[str, List[tuple]] = {}
+    for folder in folder_names.values():
+        drive_children.setdefault(folder["parent"], []).append(("folder", folder))
+    for file in corpus["files"]:
+        drive_children.setdefault(file["parent"], []).append(("file", file))
+
+    def graph_drive_id(index: int) -> str:
+        return "onedrive" if index == 0 else f"site-{index}-drive"
+
+    graph_drives = {graph_drive_id(i): i for i in drives}
+
+    @app.middleware("http")
+    async def latency_and_throttling(request: Request, call_next):
+        if request.url.path.startswith("/_bench"):
+            return await call_next(request)
+        stats["requests"] += 1
+        endpoint = re.sub(r"file-\d+|site-\d+(-drive)?|onedrive|bench-root[-\d]*", "{id}", request.url.path)
+        stats["by_endpoint"][endpoint] = stats["by_endpoint"].get(endpoint, 0) + 1
+        if throttle_rate and rng.random() < throttle_rate:
+            stats["throttled"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+                content={"error": {"code": 429, "message": "Rate limit exceeded (simulated)"}}
+            )
+        is_download = request.query_params.get("alt") == "media" or request.url.path.endswith("/content")
+        delay = download_latency_ms if is_download and download_latency_ms is not None else latency_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        return await call_next(request)
+
+    async def content_response(file: Dict, request: Request) -> Response:
+        content = file["content"]
+        status = 200
+        byte_range = _range(request.headers.get("range"), len(content))
+        if byte_range:
+            content = content[byte_range[0]:byte_range[1] + 1]
+            status = 206
+        if bandwidth_mbps:
+            await asyncio.sleep(len(content) / (bandwidth_mbps * 1e6))
+        stats["bytes_served"] += len(content)
+        return Response(content=content, status_code=status, media_type=file["mime_type"])
+
+    def not_found(kind: str = "File") -> JSONResponse:
+        return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"{kind} not found"}})
+
+    # --- Google Drive v3 ---
+
+    @app.get("/drive/v3/files")
+    async def drive_list(request: Request):
+        params = request.query_params
+        query = params.get("q", "")
+        page_size = min(int(params.get("pageSize", 100)), DRIVE_PAGE_LIMIT)
+        offset = int(params.get("pageToken", 0) or 0)
+
+        parent = re.search(r"'([^']+)' in parents", query)
+        if parent:
+            parent_id = "root" if parent.group(1) in ("root", DRIVE_ROOT_ID) else parent.group(1)
+            entries = [_drive_folder(e) if kind == "folder" else _drive_file(e)
+                       for kind, e in drive_children.get(parent_id, [])]
+        else:
+            # Flat listing of the whole corpus (corpora=user / drive)
+            entries = [_drive_folder(f) for f in folder_names.values()]
+            entries += [_drive_file(f) for f in corpus["files"]]
+        if f"mimeType!='{FOLDER_MIME}'" in query:
+            entries = [e for e in entries if e["mimeType"] != FOLDER_MIME]
+        elif f"mimeType='{FOLDER_MIME}'" in query:
+            entries = [e for e in entries if e["mimeType"] == FOLDER_MIME]
+
+        page = entries[offset:offset + page_size]
+        result = {"files": page}
+        if offset + page_size < len(entries):
+            result["nextPageToken"] = str(offset + page_size)
+        return result
+
+    @app.get("/drive/v3/files/{file_id}")
+    async def drive_file(file_id: str, request: Request):
+        if file_id in files:
+            if request.query_params.get("alt") == "media":
+                return await content_response(files[file_id], request)
+            return _drive_file(files[file_id])
+        if file_id == "root":
+            return {"id": DRIVE_ROOT_ID, "name": "My Drive", "mimeType": FOLDER_MIME}
+        if file_id in folder_names:
+            return _drive_folder(folder_names[file_id])
+        return not_found()
+
+    # --- Microsoft Graph ---
+
+    @app.get("/v1.0/me/drive")
+    async def graph_me_drive():
+        return {"id": graph_drive_id(0), "name": "OneDrive", "driveType": "business"}
+
+    @app.get("/v1.0/me/sites")
+    async def graph_sites():
+        return {"value": [{"id": f"site-{i}", "name": f"Site {i}", "webUrl": f"https://sites.example/{i}"}
+                          for i in drives if i]}
+
+    @app.get("/v1.0/sites/{site_id}/drives")
+    async def graph_site_drives(site_id: str):
+        index = int(site_id.split("-")[1])
+        return {"value": [{"id": graph_drive_id(index), "name": f"Documents {index}"}]}
+
+    async def graph_children(drive_id: str, parent_id: str, request: Request):
+        if drive_id not in graph_drives:
+            return not_found("Drive")
+        params = request.query_params
+        top = min(int(params.get("$top", GRAPH_DEFAULT_PAGE)), GRAPH_PAGE_LIMIT)
+        offset = int(params.get("$skiptoken", 0) or 0)
+        index = graph_drives[drive_id]
+        entries = children.get((index, parent_id), [])
+
+        page = []
+        for kind, entry in entries[offset:offset + top]:
+            count = len(children.get((index, entry["id"]), [])) if kind == "folder" else 0
+            page.append(_graph_item(entry, drive_id, kind == "folder", count))
+        result = {"value": page}
+        if offset + top < len(entries):
+            next_params = dict(params)
+            next_params["$skiptoken"] = str(offset + top)
+            query = "&".join(f"{key}={value}" for key, value in next_params.items())
+            result["@odata.nextLink"] = f"{str(request.base_url).rstrip('/')}{request.url.path}?{query}"
+        return result
+
+    @app.get("/v1.0/drives/{drive_id}/root/children")
+    async def graph_root_children(drive_id: str, request: Request):
+        # The corpus root folder sits directly in each drive's root
+        return await graph_children(drive_id, "root", request)
+
+    @app.get("/v1.0/drives/{drive_id}/items/{item_id}/children")
+    async def graph_item_children(drive_id: str, item_id: str, request: Request):
+        return await graph_children(drive_id, item_id, request)
+
+    @app.get("/v1.0/drives/{drive_id}/items/{item_id}/content")
+    async def graph_content(drive_id: str, item_id: str, request: Request):
+        if item_id not in files:
+            return not_found()
+        return await content_response(files[item_id], request)
+
+    # --- Benchmark control ---
+
+    @app.get("/_bench/stats")
+    async def bench_stats():
+        return {**stats, "corpus": corpus_summary(corpus)}
+
+    @app.post("/_bench/reset")
+    async def bench_reset():
+        stats.update({"requests": 0, "throttled": 0, "bytes_served": 0, "by_endpoint": {}})
+        return {"status": "reset"}
+
+    return app
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    """Corpus and server options shared by this module and the benchmark runner"""
+    parser.add_argument("--documents", type=int, default=200, help="Original documents in the corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--binary-files", type=int, default=10, help="Large non-text files (each with a copy)")
+    parser.add_argument("--binary-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--drives", type=int, default=1, help="Drives (OneDrive plus SharePoint sites for Graph)")
+    parser.add_argument("--folder-fanout", type=int, default=4)
+    parser.add_argument("--folder-depth", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Added to every listing/metadata call")
+    parser.add_argument("--download-latency-ms", type=float, default=None, help="Added to downloads (default --latency-ms)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Per-download MB/s (0 = unlimited)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+
+
+def corpus_from_arguments(args: argparse.Namespace) -> Dict:
+    return generate_corpus(
+        documents=args.documents,
+        seed=args.seed,
+        binary_files=args.binary_files,
+        binary_size=args.binary_size,
+        folder_fanout=args.folder_fanout,
+        folder_depth=args.folder_depth,
+        drives=args.drives
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Google Drive / Microsoft Graph server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app(
+        corpus_from_arguments(args),
+        latency_ms=args.latency_ms,
+        download_latency_ms=args.download_latency_ms,
+        bandwidth_mbps=args.bandwidth_mbps,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    print(f"✅ Fake Drive/Graph server on http://{args.host}:{args.port} (folder to scan: {ROOT_ID})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+End-to-end scan benchmark against the local fake Drive/Graph server
+
+    cd backend
+    python -m benchmarks.run --documents 500 --latency-ms 20 --throttle-rate 0.01 --graph
+
+Generates the synthetic corpus, serves it from a fake_server subprocess (so the
+corpus does not count towards the scanner's memory), points the Drive and Graph
+clients at it and runs POST /api/scan in-process. Reports files/sec, bytes/sec,
+per-stage time and peak memory; --output writes the full report as JSON.
+"""
+from collections import defaultdict
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import httpx
+
+from benchmarks.corpus import ROOT_ID
+from benchmarks.fake_server import add_corpus_arguments
+
+
+# Stages that run once per scan: wall time
+WALL_STAGES = ["listing", "processing", "detection", "response"]
+# Stages that run per file or per batch, often concurrently: summed time across calls
+CUMULATIVE_STAGES = ["download", "tiered_hashing", "hash", "extract_text", "fingerprint",
+                     "exact", "superset_subset", "near"]
+
+
+class StageTimer:
+    """Wraps pipeline functions in place and accumulates their run time per stage"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def _record(self, stage: str, started: float) -> None:
+        self._add(stage, time.perf_counter() - started)
+
+    def _add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += 1
+
+    def wrap(self, owner, name: str, stage: str) -> None:
+        original = getattr(owner, name)
+        if inspect.isgeneratorfunction(original):
+            # Time spent producing items, not the consumer's time between them
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                elapsed = 0.0
+                iterator = original(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            elapsed += time.perf_counter() - started
+                        yield item
+                finally:
+                    iterator.close()
+                    self._add(stage, elapsed)
+        elif asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self._record(stage, started)
+        else:
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self._record(stage, started)
+        setattr(owner, name, wrapper)
+        self._patches.append((owner, name, original))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.seconds.clear()
+            self.calls.clear()
+
+    def restore(self) -> None:
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+
+    def report(self) -> Dict:
+        return {
+            stage: {"seconds": round(self.seconds[stage], 3), "calls": self.calls[stage]}
+            for stage in WALL_STAGES + CUMULATIVE_STAGES if self.calls[stage]
+        }
+
+
+def instrument_pipeline() -> StageTimer:
+    """Time the scan pipeline's stages by wrapping the functions it looks up at call time"""
+    from app.api.routes import scan
+    from app.scanner import duplicate_finder
+    from app.scanner.google_drive_client import GoogleDriveClient
+
+    timer = StageTimer()
+    timer.wrap(GoogleDriveClient, "list_all_files", "listing")
+    timer.wrap(scan, "process_drive_files", "processing")
+    timer.wrap(scan, "iter_duplicate_stages", "detection")
+    timer.wrap(scan, "scan_response", "response")
+    timer.wrap(GoogleDriveClient, "get_file_content", "download")
+    timer.wrap(scan, "tiered_content_hashes", "tiered_hashing")
+    timer.wrap(scan, "hash_file_content", "hash")
+    timer.wrap(scan, "extract_text_from_file", "extract_text")
+    timer.wrap(scan, "winnow_fingerprints", "fingerprint")
+    timer.wrap(duplicate_finder, "find_exact_duplicates", "exact")
+    timer.wrap(duplicate_finder, "find_superset_subset_duplicates", "superset_subset")
+    timer.wrap(duplicate_finder, "find_near_duplicates_improved", "near")
+    return timer
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def start_fake_server(args: argparse.Namespace, port: int, timeout: float = 300.0) -> subprocess.Popen:
+    """Run fake_server in a subprocess and wait until it answers (corpus generation takes a while)"""
+    command = [sys.executable, "-m", "benchmarks.fake_server", "--port", str(port)]
+    for option in ("documents", "seed", "binary_files", "binary_size", "drives", "folder_fanout",
+                   "folder_depth", "latency_ms", "download_latency_ms", "bandwidth_mbps",
+                   "throttle_rate", "retry_after"):
+        value = getattr(args, option)
+        if value is not None:
+            command += [f"--{option.replace('_', '-')}", str(value)]
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=backend_dir)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Fake server exited with code {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/_bench/stats", timeout=1.0).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Fake server did not start in time")
+
+
+def apply_settings(overrides: List[str]) -> Dict:
+    """Apply KEY=VALUE overrides to app settings (values parsed as JSON where possible)"""
+    from app.config import settings
+
+    applied = {}
+    for override in overrides:
+        key, _, raw = override.partition("=")
+        if not hasattr(settings, key):
+            raise SystemExit(f"Unknown setting: {key}")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        setattr(settings, key, value)
+        applied[key] = value
+    return applied
+
+
+async def run_scan(app, server: str, args: argparse.Namespace, timer: StageTimer) -> Dict:
+    """One POST /api/scan against the fake server, with throughput, stages and memory"""
+    await asyncio.to_thread(httpx.post, f"{server}/_bench/reset")
+    timer.reset()
+    if args.trace_memory:
+        tracemalloc.start()
+
+    body = {
+        "google_token": "benchmark-token",
+        "folder_ids": [ROOT_ID],
+        "include_subfolders": True,
+        "listing_mode": args.listing_mode,
+        "response_format": args.response_format,
+    }
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://scanner", timeout=None) as client:
+        response = await client.post("/api/scan", json=body)
+    elapsed = time.perf_counter() - started
+
+    python_peak = None
+    if args.trace_memory:
+        python_peak = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+        tracemalloc.stop()
+
+    response.raise_for_status()
+    results = response.json()
+    server_stats = (await asyncio.to_thread(httpx.get, f"{server}/_bench/stats")).json()
+    files_processed = results.get("files_processed", 0)
+
+    return {
+        "seconds": round(elapsed, 3),
+        "files_processed": files_processed,
+        "files_failed": results.get("files_failed", 0),
+        "files_per_second": round(files_processed / elapsed, 1),
+        "bytes_downloaded": server_stats["bytes_served"],
+        "megabytes_per_second": round(server_stats["bytes_served"] / elapsed / 1e6, 2),
+        "requests": server_stats["requests"],
+        "throttled": server_stats["throttled"],
+        "requests_by_endpoint": server_stats["by_endpoint"],
+        "response_bytes": len(response.content),
+        "stages": timer.report(),
+        "peak_rss_mb": _peak_rss_mb(),
+        "python_peak_mb": python_peak,
+        "groups": {
+            "exact": len(results.get("exact_duplicates", [])),
+            "superset_subset": len(results.get("superset_subset_duplicates", [])),
+            "near": len(results.get("near_duplicates", [])),
+        },
+        "expected": server_stats["corpus"]["expected"],
+    }
+
+
+async def run_graph_listing(server: str) -> Dict:
+    """Enumerate every fake OneDrive / SharePoint drive through GraphClient"""
+    from app.scanner.graph_client import GraphClient
+
+    await asyncio.to_thread(httpx.post, f"{server}/_bench/reset")
+    client = GraphClient("benchmark-token")
+    started = time.perf_counter()
+    count = 0
+    async for _ in client.iter_all_files():
+        count += 1
+    elapsed = time.perf_counter() - started
+    server_stats = (await asyncio.to_thread(httpx.get, f"{server}/_bench/stats")).json()
+    return {
+        "seconds": round(elapsed, 3),
+        "files_listed": count,
+        "files_per_second": round(count / elapsed, 1),
+        "requests": server_stats["requests"],
+        "throttled": server_stats["throttled"],
+    }
+
+
+def print_report(report: Dict) -> None:
+    corpus = report["corpus"]
+    print("\n" + "=" * 60)
+    print(f"Corpus: {corpus['files']} files, {corpus['bytes'] / 1e6:.1f} MB, {corpus['folders']} folders")
+    print(f"Model load: {report['model_load_seconds']}s")
+    for number, run in enumerate(report["runs"], start=1):
+        print(f"\nRun {number}: {run['seconds']}s")
+        print(f"  {run['files_processed']} files ({run['files_failed']} failed) - {run['files_per_second']} files/s")
+        print(f"  {run['bytes_downloaded'] / 1e6:.1f} MB downloaded - {run['megabytes_per_second']} MB/s")
+        print(f"  {run['requests']} API requests ({run['throttled']} throttled)")
+        memory = f"  Peak RSS {run['peak_rss_mb']} MB"
+        if run["python_peak_mb"] is not None:
+            memory += f", Python allocations peak {run['python_peak_mb']} MB"
+        print(memory)
+        print(f"  Groups: {run['groups']} (expected copies: {run['expected']})")
+        print("  Stage                 seconds   calls")
+        for stage, timing in run["stages"].items():
+            kind = "" if stage in WALL_STAGES else " (sum)"
+            print(f"  {stage + kind:<20} {timing['seconds']:>9.3f} {timing['calls']:>7}")
+    if report.get("graph_listing"):
+        graph = report["graph_listing"]
+        print(f"\nGraph listing: {graph['files_listed']} files in {graph['seconds']}s "
+              f"({graph['files_per_second']} files/s, {graph['requests']} requests, {graph['throttled']} throttled)")
+    print("=" * 60)
+
+
+async def main_async(args: argparse.Namespace) -> Dict:
+    port = args.port or _free_port()
+    server = f"http://127.0.0.1:{port}"
+    process = start_fake_server(args, port)
+    try:
+        from app.scanner.google_drive_client import GoogleDriveClient
+        from app.scanner.graph_client import GraphClient
+
+        GoogleDriveClient.BASE_URL = f"{server}/drive/v3"
+        GraphClient.BASE_URL = f"{server}/v1.0"
+        applied = apply_settings(args.set)
+
+        from app.main import app
+        from app.scanner.duplicate_finder import warm_up_content_similarity
+
+        quiet = None if args.verbose else open(os.devnull, "w")
+        try:
+            # The model is loaded once per process; keep it out of the scan timings
+            started = time.perf_counter()
+            with redirect_stdout(quiet or sys.stdout):
+                await asyncio.to_thread(warm_up_content_similarity)
+            model_load = round(time.perf_counter() - started, 3)
+
+            timer = instrument_pipeline()
+            runs = []
+            try:
+                for _ in range(args.runs):
+                    with redirect_stdout(quiet or sys.stdout):
+                        runs.append(await run_scan(app, server, args, timer))
+            finally:
+                timer.restore()
+
+            graph_listing = None
+            if args.graph:
+                with redirect_stdout(quiet or sys.stdout):
+                    graph_listing = await run_graph_listing(server)
+        finally:
+            if quiet:
+                quiet.close()
+
+        corpus = httpx.get(f"{server}/_bench/stats").json()["corpus"]
+        return {
+            "config": {**{k: v for k, v in vars(args).items() if k not in ("set", "output")}, "settings": applied},
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "corpus": corpus,
+            "model_load_seconds": model_load,
+            "runs": runs,
+            "graph_listing": graph_listing,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Benchmark /api/scan against a local fake Drive/Graph server")
+    add_corpus_arguments(parser)
+    parser.add_argument("--port", type=int, default=0, help="Fake server port (0 = any free port)")
+    parser.add_argument("--runs", type=int, default=1, help="Scans to run (later runs reuse warm caches)")
+    parser.add_argument("--listing-mode", choices=["folders", "flat"], default=None)
+    parser.add_argument("--response-format", choices=["full", "compact"], default="full")
+    parser.add_argument("--graph", action="store_true", help="Also benchmark Graph enumeration")
+    parser.add_argument("--trace-memory", action="store_true", help="Track Python allocation peak (slower)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Override an app setting")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the scanner's log output")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
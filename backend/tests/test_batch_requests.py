@@ -0,0 +1,106 @@
+"""Batch endpoint retry loop and Drive batch response parsing"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.scanner import batch_requests
+from app.scanner.batch_requests import execute_batched, is_retryable
+from app.scanner.google_drive_client import _parse_batch_response
+
+
+def _run(keys, send_batch, **kwargs):
+    return asyncio.run(execute_batched(keys, send_batch, base_delay=0.0, **kwargs))
+
+
+def test_retryable_items_are_resent_in_new_batches(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(batch_requests.asyncio, "sleep", fake_sleep)
+    sent = []
+    throttled_once = {"b", "d"}
+
+    async def send_batch(batch):
+        sent.append(list(batch))
+        results = {}
+        for key in batch:
+            if key in throttled_once:
+                throttled_once.discard(key)
+                results[key] = (429, "Too many requests", 7.0)
+            elif key == "c":
+                results[key] = (404, "Not found", None)
+            elif key != "e":  # e is missing from every response
+                results[key] = (204, None, None)
+        return results
+
+    results = _run(["a", "b", "c", "d", "e", "a"], send_batch, batch_size=2, max_retries=2)
+
+    assert results == {"a": None, "b": None, "c": "Not found", "d": None, "e": "Missing from batch response"}
+    assert sent[:3] == [["a", "b"], ["c", "d"], ["e"]]
+    assert sent[3:] == [["b", "d"], ["e"], ["e"]]
+    assert sleeps[0] >= 7.0  # Retry-After is honoured
+
+
+def test_failed_batch_request_is_retried_unless_final():
+    calls = []
+
+    async def send_batch(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection reset")
+        return {key: (200, None, None) for key in batch}
+
+    assert _run(["a", "b"], send_batch, batch_size=10) == {"a": None, "b": None}
+
+    async def unauthorized(batch):
+        request = httpx.Request("POST", "https://example.com/batch")
+        raise httpx.HTTPStatusError("401", request=request, response=httpx.Response(401, request=request))
+
+    results = _run(["a"], unauthorized, batch_size=10)
+    assert results["a"].startswith("401")
+
+
+def test_is_retryable():
+    assert is_retryable(503, None)
+    assert is_retryable(403, "User Rate Limit Exceeded")
+    assert not is_retryable(403, "The user does not have sufficient permissions")
+    assert not is_retryable(404, None)
+
+
+def test_parse_drive_batch_response():
+    body = (
+        "--batch_xyz\r\n"
+        "Content-Type: application/http\r\n"
+        "Content-ID: <response-item-1>\r\n\r\n"
+        "HTTP/1.1 204 No Content\r\n\r\n\r\n"
+        "--batch_xyz\r\n"
+        "Content-Type: application/http\r\n"
+        "Content-ID: <response-item-0>\r\n\r\n"
+        "HTTP/1.1 429 Too Many Requests\r\n"
+        "Retry-After: 12\r\n"
+        "Content-Type: application/json\r\n\r\n"
+        '{"error": {"code": 429, "message": "Rate Limit Exceeded"}}\r\n'
+        "--batch_xyz\r\n"
+        "Content-Type: application/http\r\n"
+        "Content-ID: <response-item-2>\r\n\r\n"
+        "HTTP/1.1 404 Not Found\r\n"
+        "Content-Type: text/plain\r\n\r\n"
+        "not json\r\n"
+        "--batch_xyz--\r\n"
+    )
+    response = httpx.Response(200, headers={"content-type": "multipart/mixed; boundary=batch_xyz"}, text=body)
+
+    assert list(_parse_batch_response(response)) == [
+        (1, 204, None, None),
+        (0, 429, "Google Drive API error: 429 - Rate Limit Exceeded", 12.0),
+        (2, 404, "Google Drive API error: 404 - not json", None),
+    ]
+
+
+def test_parse_rejects_non_multipart_response():
+    response = httpx.Response(200, headers={"content-type": "application/json"}, text="{}")
+    with pytest.raises(ValueError):
+        list(_parse_batch_response(response))
@@ -0,0 +1,33 @@
+"""Benchmark harness smoke tests (the harness patches pipeline functions by name)"""
+from app.api.routes import scan
+from benchmarks.run import StageTimer, instrument_pipeline
+
+
+def test_instrument_pipeline_wraps_and_restores():
+    original = scan.iter_duplicate_stages
+    timer = instrument_pipeline()
+    try:
+        assert scan.iter_duplicate_stages is not original
+    finally:
+        timer.restore()
+    assert scan.iter_duplicate_stages is original
+
+
+def test_generator_stages_time_each_item():
+    class Owner:
+        @staticmethod
+        def stages(count):
+            for n in range(count):
+                yield n
+
+    timer = StageTimer()
+    timer.wrap(Owner, "stages", "detection")
+    assert list(Owner.stages(3)) == [0, 1, 2]
+
+    # Stopping early still records the call
+    iterator = Owner.stages(5)
+    next(iterator)
+    iterator.close()
+    timer.restore()
+
+    assert timer.report()["detection"]["calls"] == 2
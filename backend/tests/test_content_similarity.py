@@ -0,0 +1,83 @@
+"""Document windows and embeddings"""
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.scanner.content_similarity import ContentSimilarity
+
+
+class WindowModel:
+    """Embeds a window "wi ... wj" as [1, i, words]; records what it was asked to encode"""
+
+    def __init__(self, max_seq_length):
+        self.max_seq_length = max_seq_length
+        self.encoded = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.encoded.append(list(texts))
+        return np.array([[1.0, self._first_index(text), len(text.split())] for text in texts], dtype=np.float32)
+
+    @staticmethod
+    def _first_index(text):
+        digits = text.split()[0][1:]
+        return float(digits) if digits.isdigit() else -1.0
+
+
+@pytest.fixture
+def content_sim(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_store_dir", "")
+    content_sim = ContentSimilarity(backend="torch", use_remote=False)
+    content_sim.model = WindowModel(max_seq_length=4)
+    return content_sim
+
+
+def _words(count):
+    return " ".join(f"w{n}" for n in range(count))
+
+
+def test_truncate_to_budget(content_sim):
+    text = "  w0 w1\n\nw2   w3 w4 w5"
+    assert content_sim._truncate_to_budget(text) == "  w0 w1\n\nw2   w3"
+    assert content_sim._truncate_to_budget(text, budget=2) == "  w0 w1"
+    assert content_sim._truncate_to_budget(text, start=text.index("w3")) == "w3 w4 w5"
+    assert content_sim._truncate_to_budget("w0 w1") == "w0 w1"
+
+
+def test_representative_windows_spread_over_the_document(content_sim):
+    text = _words(40)
+    windows = content_sim._representative_windows(text, max_chunks=3)
+    assert windows == ["w0 w1 w2 w3", "w15 w16 w17 w18", "w28 w29 w30 w31"]
+
+    assert content_sim._representative_windows(text, max_chunks=1) == ["w0 w1 w2 w3"]
+    assert content_sim._representative_windows("w0 w1", max_chunks=3) == ["w0 w1"]
+    # Windows never overlap, even when there is less text than max_chunks windows
+    assert content_sim._representative_windows(_words(6), max_chunks=3) == ["w0 w1 w2 w3", "w4 w5"]
+
+
+def test_chunks_mode_mean_pools_the_windows(content_sim, monkeypatch):
+    monkeypatch.setattr(settings, "document_max_chunks", 3)
+    embeddings = content_sim.embed_documents([_words(40), _words(2)], mode="chunks")
+
+    assert content_sim.model.encoded == [["w0 w1 w2 w3", "w15 w16 w17 w18", "w28 w29 w30 w31", "w0 w1"]]
+    expected = np.array([[1.0, 43 / 3, 4.0], [1.0, 0.0, 2.0]])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert embeddings == pytest.approx(expected)
+
+
+def test_store_namespace_tracks_what_shapes_the_vectors(content_sim, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "embedding_store_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "document_max_chunks", 3)
+    texts, keys = [_words(40)], ["hash"]
+
+    first = content_sim.embed_documents(texts, mode="chunks", keys=keys)
+    monkeypatch.setattr(settings, "document_max_chunks", 1)
+    fewer_windows = content_sim.embed_documents(texts, mode="chunks", keys=keys)
+    content_sim.model.max_seq_length = 8
+    longer_windows = content_sim.embed_documents(texts, mode="chunks", keys=keys)
+
+    assert not np.allclose(first, fewer_windows) and not np.allclose(fewer_windows, longer_windows)
+    assert len(list(tmp_path.iterdir())) == 3
+    # Same settings again: served from the store
+    encoded = len(content_sim.model.encoded)
+    assert content_sim.embed_documents(texts, mode="chunks", keys=keys) == pytest.approx(longer_windows, abs=1e-3)
+    assert len(content_sim.model.encoded) == encoded
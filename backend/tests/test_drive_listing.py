@@ -0,0 +1,76 @@
+"""Google Drive listing: folder by folder vs one flat listing"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.scanner import google_drive_client
+from app.scanner.google_drive_client import FOLDER_MIME, GoogleDriveClient, _select_subtrees
+from benchmarks.corpus import ROOT_ID, generate_corpus
+from benchmarks.fake_server import create_app
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return generate_corpus(documents=6, binary_files=1, binary_size=1000, folder_fanout=2, folder_depth=2)
+
+
+@pytest.fixture
+def drive(corpus, monkeypatch):
+    """GoogleDriveClient talking to the benchmark fake server in-process"""
+    app = create_app(corpus)
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(GoogleDriveClient, "BASE_URL", "http://fake/drive/v3")
+    monkeypatch.setattr(
+        google_drive_client.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.ASGITransport(app=app), **kwargs)
+    )
+    return GoogleDriveClient("token")
+
+
+def _listing(drive, folder_ids, include_subfolders, mode):
+    files = asyncio.run(drive.list_all_files(folder_ids, include_subfolders, mode=mode))
+    return sorted(f["id"] for f in files)
+
+
+@pytest.mark.parametrize("folder_ids, include_subfolders", [
+    ([ROOT_ID], True),
+    ([ROOT_ID], False),
+    (["bench-root-0"], True),
+    (["root"], True),
+    (["bench-root-0", "bench-root-0-1"], True),
+])
+def test_flat_listing_matches_folder_by_folder(drive, folder_ids, include_subfolders):
+    recursive = _listing(drive, folder_ids, include_subfolders, "folders")
+    flat = _listing(drive, folder_ids, include_subfolders, "flat")
+    assert flat == recursive and flat
+
+
+def test_flat_listing_without_folders_only_lists_owned_files(drive, corpus, monkeypatch):
+    queries = []
+    request = GoogleDriveClient._request
+
+    async def recording(self, method, endpoint, **kwargs):
+        queries.append(kwargs.get("params", {}).get("q"))
+        return await request(self, method, endpoint, **kwargs)
+
+    monkeypatch.setattr(GoogleDriveClient, "_request", recording)
+    assert len(_listing(drive, None, True, "flat")) == len(corpus["files"])
+    assert queries == ["trashed=false and 'me' in owners"]
+
+    queries.clear()
+    _listing(drive, [ROOT_ID], True, "flat")
+    assert queries[-1] == "trashed=false"  # The subtree filter decides
+
+
+def test_select_subtrees():
+    items = [
+        {"id": "a", "mimeType": FOLDER_MIME, "parents": ["root"]},
+        {"id": "b", "mimeType": FOLDER_MIME, "parents": ["a"]},
+        {"id": "c", "mimeType": FOLDER_MIME, "parents": ["b", "x"]},
+        {"id": "x", "mimeType": FOLDER_MIME, "parents": ["c"]},  # Cycle through a second parent
+        {"id": "f", "mimeType": "text/plain", "parents": ["a"]},
+    ]
+    assert _select_subtrees(items, {"a"}) == {"a", "b", "c", "x"}
+    assert _select_subtrees(items, {"a"}, include_subfolders=False) == {"a"}
+    assert _select_subtrees(items, {"x"}) == {"x", "c"}
@@ -0,0 +1,180 @@
+"""Near-duplicate detection and similarity-graph clustering"""
+import random
+from itertools import combinations
+
+import pytest
+
+from app.scanner import content_similarity, duplicate_finder
+from app.scanner.content_similarity import ContentSimilarity, tfidf_similarity_matrix, tfidf_vectors
+from app.scanner.duplicate_finder import (
+    calculate_filename_similarity,
+    calculate_metadata_similarity,
+    cluster_similarity_graph,
+    combined_similarity,
+    filename_candidate_pairs,
+    find_near_duplicates_improved,
+    min_content_score,
+)
+
+
+@pytest.fixture
+def no_model(monkeypatch):
+    """Force the model-free (TF-IDF) path"""
+    monkeypatch.setattr(content_similarity, "EMBEDDINGS_AVAILABLE", False)
+    content_sim = ContentSimilarity(backend="torch", use_remote=False)
+    assert content_sim.model is None
+    monkeypatch.setattr(duplicate_finder, "_content_similarity", content_sim)
+    return content_sim
+
+
+def _documents(count=40, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [f"word{n}" for n in range(400)]
+    files = []
+    for n in range(count):
+        words = rng.choices(vocabulary, k=120)
+        if n % 4 == 1:
+            # Revised version of the previous document
+            words = files[-1]["extracted_text"].split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        files.append({
+            "id": f"f{n}",
+            "name": f"report {n // 4} draft.docx",
+            "size": 10_000 + rng.randint(0, 400),
+            "mime_type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "last_modified": "2024-03-01T10:00:00Z",
+            "extracted_text": " ".join(words),
+        })
+    return files
+
+
+def _group_ids(groups):
+    return sorted(sorted([g["primary_file"]["id"]] + [f["id"] for f in g["duplicate_files"]]) for g in groups)
+
+
+def test_no_model_near_duplicates_match_pairwise(no_model):
+    files = _documents()
+    groups = find_near_duplicates_improved(files, threshold=0.75, max_neighbors=len(files))
+
+    # Naive reference: score every pair from a dense TF-IDF cosine matrix
+    texts = [duplicate_finder.normalize_text(f["extracted_text"]) for f in files]
+    cosine = (tfidf_vectors(texts) @ tfidf_vectors(texts).T).toarray()
+    edges = {}
+    for i, j in combinations(range(len(files)), 2):
+        metadata = calculate_metadata_similarity(files[i], files[j])
+        if metadata < 0.3:
+            continue
+        filename = no_model.calculate_filename_similarity_embedding(files[i]["name"], files[j]["name"])
+        edges[(i, j)] = combined_similarity(float(cosine[i, j]), filename, metadata)
+    expected = [[files[k]["id"] for k in cluster] for cluster in cluster_similarity_graph(len(files), edges, 0.75)]
+
+    assert _group_ids(groups) == sorted(sorted(ids) for ids in expected)
+    assert len(groups) == 10
+
+
+def test_no_model_path_never_scores_pairs_individually(no_model, monkeypatch):
+    def fail(*args):
+        raise AssertionError("pairwise scoring called")
+    monkeypatch.setattr(no_model, "calculate_similarity", fail)
+    monkeypatch.setattr(content_similarity, "tfidf_similarity_matrix", fail)
+    assert find_near_duplicates_improved(_documents(8))
+
+
+def test_neighbor_cap_does_not_change_groups(no_model):
+    files = _documents()
+    uncapped = find_near_duplicates_improved(files, max_neighbors=len(files))
+    assert _group_ids(find_near_duplicates_improved(files, max_neighbors=1)) == _group_ids(uncapped)
+
+
+def test_files_without_text_match_all_pairs_scoring(no_model):
+    rng = random.Random(5)
+    words = ["holiday", "photo", "img", "2023", "beach", "copy", "final", "scan"]
+    files = []
+    for n in range(120):
+        files.append({
+            "id": f"b{n}",
+            "name": " ".join(rng.sample(words, rng.randint(1, 3))) + rng.choice([".jpg", ".png", " (1).jpg"]),
+            "size": rng.choice([50_000, 51_000, 80_000]),
+            "mime_type": rng.choice(["image/jpeg", "image/png"]),
+            "last_modified": f"2024-03-{rng.randint(1, 3):02d}T10:00:00Z",
+        })
+
+    edges = {}
+    for i, j in combinations(range(len(files)), 2):
+        metadata = calculate_metadata_similarity(files[i], files[j])
+        if metadata >= 0.3:
+            filename = calculate_filename_similarity(files[i]["name"], files[j]["name"])
+            edges[(i, j)] = combined_similarity(None, filename, metadata)
+    expected = sorted(
+        sorted(files[k]["id"] for k in cluster) for cluster in cluster_similarity_graph(len(files), edges, 0.85)
+    )
+
+    groups = find_near_duplicates_improved(files, non_text_threshold=0.85, max_neighbors=3)
+    assert _group_ids(groups) == expected and len(expected) > 3
+
+
+def test_filename_candidates_cover_every_pair_that_can_reach_the_score():
+    rng = random.Random(3)
+    words = ["q3", "report", "final", "draft", "budget", "v2", "copy", "notes"]
+    names = [" ".join(rng.sample(words, rng.randint(1, 4))) + ".docx" for _ in range(60)]
+    for min_score in (0.5, 0.6, 0.75, 0.9):
+        candidates = filename_candidate_pairs(names, min_score, max_neighbors=2)
+        reaching = {
+            (i, j) for i, j in combinations(range(len(names)), 2)
+            if calculate_filename_similarity(names[i], names[j]) >= min_score
+        }
+        assert reaching and reaching <= candidates
+    assert filename_candidate_pairs(["", " "], 0.9) == set()
+
+
+def test_min_content_score_bounds_combined_score():
+    floor = min_content_score(0.75)
+    assert combined_similarity(floor, 1.0, 1.0) == pytest.approx(0.75)
+    assert combined_similarity(floor - 0.01, 1.0, 1.0) < 0.75
+    assert min_content_score(0.3) == 0.0
+
+
+def test_text_pairs_without_shared_content_are_not_near_duplicates(no_model):
+    assert combined_similarity(0.0, 1.0, 1.0) == pytest.approx(0.5)
+    assert combined_similarity(None, 1.0, 1.0) == pytest.approx(1.0)
+
+    files = _documents(8)
+    # Same name, size, date and type as f0 but no word in common
+    files.append(dict(files[0], id="rewrite", extracted_text="entirely different prose here"))
+    groups = _group_ids(find_near_duplicates_improved(files, threshold=0.75))
+    assert ["f0", "f1"] in groups
+    assert not any("rewrite" in ids for ids in groups)
+
+
+def test_cluster_single_linkage_is_connected_components():
+    edges = {(0, 1): 0.9, (1, 2): 0.8, (3, 4): 0.95, (2, 3): 0.1}
+    assert cluster_similarity_graph(6, edges, 0.75, linkage="single") == [[0, 1, 2], [3, 4]]
+
+
+def test_cluster_average_linkage_rejects_weak_chains():
+    # 0-1 and 1-2 are strong but 0-2 is missing (counts as 0): average 0.45 < 0.75
+    edges = {(0, 1): 0.9, (1, 2): 0.8}
+    assert cluster_similarity_graph(3, edges, 0.75, linkage="average") == [[0, 1]]
+    edges[(0, 2)] = 0.7
+    assert cluster_similarity_graph(3, edges, 0.75, linkage="average") == [[0, 1, 2]]
+    assert cluster_similarity_graph(3, edges, 0.75, linkage="complete") == [[0, 1]]
+
+
+def test_cluster_ignores_edge_order():
+    rng = random.Random(3)
+    edges = {(i, j): rng.random() for i, j in combinations(range(12), 2)}
+    shuffled = dict(rng.sample(list(edges.items()), len(edges)))
+    assert cluster_similarity_graph(12, edges, 0.6) == cluster_similarity_graph(12, shuffled, 0.6)
+
+
+def test_cluster_rejects_unknown_linkage():
+    with pytest.raises(ValueError):
+        cluster_similarity_graph(2, {}, 0.5, linkage="ward")
+
+
+def test_pairwise_and_batch_scores_use_the_search_scorer(no_model):
+    texts = [f["extracted_text"] for f in _documents(6)]
+    matrix = no_model.batch_similarity_matrix(texts)
+    assert abs(matrix - tfidf_similarity_matrix(texts)).max() < 1e-9
+    assert no_model.calculate_similarity(texts[0], texts[1]) == pytest.approx(tfidf_similarity_matrix(texts[:2])[0, 1])
+    assert no_model.calculate_similarity(texts[0], "") == 0.0
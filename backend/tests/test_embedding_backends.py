@@ -0,0 +1,69 @@
+"""Embedding backend selection and parity checks"""
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.scanner import content_similarity, embedding_backends
+from app.scanner.embedding_backends import PARITY_SAMPLE_TEXTS, check_parity
+
+
+class FakeBackend:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def encode(self, texts, show_progress_bar=False, batch_size=32):
+        return self.embeddings[:len(texts)].copy()
+
+
+def _embeddings(noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.random.default_rng(1).normal(size=(len(PARITY_SAMPLE_TEXTS), 16))
+    return (base + noise * rng.normal(size=base.shape)).astype(np.float32)
+
+
+def test_parity_against_backend_or_array():
+    reference = _embeddings()
+    candidate = FakeBackend(_embeddings(noise=0.01))
+    from_backend = check_parity(candidate, FakeBackend(reference))
+    from_array = check_parity(candidate, reference)
+    assert from_backend == pytest.approx(from_array)
+    assert 0.99 < from_array["min_cosine"] <= from_array["mean_cosine"] <= 1.0
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Record load_backend calls; the "quantized" fake carries its own reference embeddings"""
+    calls = []
+
+    def load_backend(name, model_name, onnx_path=None):
+        calls.append(name)
+        backend = FakeBackend(_embeddings(noise=0.5 if name == "onnx" else 0.01))
+        if name == "quantized":
+            backend.reference_embeddings = _embeddings()
+        return backend
+
+    monkeypatch.setattr(embedding_backends, "load_backend", load_backend)
+    monkeypatch.setattr(content_similarity, "EMBEDDINGS_AVAILABLE", True)
+    return calls
+
+
+def _load(name):
+    content_sim = content_similarity.ContentSimilarity.__new__(content_similarity.ContentSimilarity)
+    content_sim.load_error = None
+    return content_sim._load_fast_backend(name)
+
+
+def test_quantized_parity_needs_no_second_model(loads):
+    assert _load("quantized") is not None
+    assert loads == ["quantized"]
+
+
+def test_onnx_parity_check_is_opt_in(loads, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_parity_check", False)
+    assert _load("onnx") is not None
+    assert loads == ["onnx"]
+
+    # With the check, the (deliberately poor) fake onnx backend is rejected
+    monkeypatch.setattr(settings, "embedding_parity_check", True)
+    assert _load("onnx") is None
+    assert loads == ["onnx", "onnx", "torch"]
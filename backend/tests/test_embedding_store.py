@@ -0,0 +1,67 @@
+"""Memory-mapped embedding store"""
+import os
+
+import numpy as np
+import pytest
+
+from app.scanner.embedding_store import KEY_BYTES, EmbeddingStore
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_round_trip(tmp_path, dtype, tolerance):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(5, 8)).astype(np.float32)
+    store = EmbeddingStore(str(tmp_path), dim=8, dtype=dtype)
+    store.put_many([f"k{n}" for n in range(5)], vectors)
+
+    matrix, found = store.get_many(["k3", "missing", "k0"])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_allclose(matrix[[0, 2]], vectors[[3, 0]], atol=tolerance * np.abs(vectors).max())
+    assert not matrix[1].any()
+    assert store.get("missing") is None
+    assert len(store) == 5 and "k4" in store
+
+
+def test_existing_keys_are_not_appended_again(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=4)
+    store.put_many(["a", "b"], np.ones((2, 4)))
+    store.put_many(["b", "c", "c"], np.full((3, 4), 2.0))
+
+    assert len(store) == 3
+    assert os.path.getsize(tmp_path / "keys.bin") == 3 * KEY_BYTES
+    assert store.get("b").tolist() == [1.0] * 4
+    assert store.get("c").tolist() == [2.0] * 4
+
+
+def test_second_store_sees_rows_written_by_another(tmp_path):
+    writer = EmbeddingStore(str(tmp_path), dim=4)
+    reader = EmbeddingStore(str(tmp_path), dim=4)
+    writer.put_many(["a"], np.ones((1, 4)))
+
+    # rows_for refreshes on a miss
+    assert reader.rows_for(["a"]).tolist() == [0]
+    assert EmbeddingStore(str(tmp_path), dim=4).get("a") is not None
+
+
+def test_torn_write_is_ignored_and_overwritten(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=4)
+    store.put_many(["a"], np.ones((1, 4)))
+    # A writer crashed after writing vector data but before its key
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(np.full(4, 9, dtype=np.float16).tobytes())
+
+    reopened = EmbeddingStore(str(tmp_path), dim=4)
+    assert len(reopened) == 1
+    reopened.put_many(["b"], np.full((1, 4), 3.0))
+    assert reopened.get("b").tolist() == [3.0] * 4
+    assert os.path.getsize(tmp_path / "vectors.bin") == 2 * 4 * 2
+
+
+def test_mismatched_layout_is_rejected(tmp_path):
+    EmbeddingStore(str(tmp_path), dim=4)
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path), dim=8)
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path), dim=4, dtype="int8")
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path / "other"), dim=4, dtype="float64")
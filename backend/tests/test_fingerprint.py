@@ -0,0 +1,59 @@
+"""Winnowing fingerprints and the containment candidate index"""
+import random
+
+from app.scanner.fingerprint import FingerprintIndex, shingle_set, winnow_fingerprints
+
+
+def _words(count, seed):
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(10000)}" for _ in range(count)]
+
+
+def test_shared_passage_always_shares_a_fingerprint():
+    # Any passage of window + k - 1 words must produce a common fingerprint
+    k, window = 5, 4
+    for seed in range(50):
+        passage = _words(window + k - 1, seed)
+        first = _words(30, seed + 1000) + passage + _words(30, seed + 2000)
+        second = _words(17, seed + 3000) + passage + _words(9, seed + 4000)
+        assert winnow_fingerprints(" ".join(first), k, window) & winnow_fingerprints(" ".join(second), k, window)
+
+
+def test_winnowing_is_normalized_and_stable():
+    text = "The Quick brown fox, jumps over the lazy dog again and again today"
+    assert winnow_fingerprints(text) == winnow_fingerprints(text.upper().replace(",", " "))
+    assert winnow_fingerprints("") == set()
+    assert len(winnow_fingerprints("two words")) == 1
+
+
+def test_shingle_set_counts_every_kgram():
+    assert len(shingle_set("a b c d e", size=3)) == 3
+    assert shingle_set("") == set()
+    assert shingle_set("a b c d", size=3) <= shingle_set("x a b c d y", size=3)
+
+
+def test_containment_candidates_are_directional():
+    base = " ".join(_words(200, 1))
+    index = FingerprintIndex()
+    index.add("small", winnow_fingerprints(base))
+    index.add("large", winnow_fingerprints(base + " " + " ".join(_words(400, 2))))
+    index.add("other", winnow_fingerprints(" ".join(_words(200, 3))))
+
+    assert index.containment_candidates("small") == {"large": 1.0}
+    # Only about a third of the larger file is in the smaller one
+    assert index.containment_candidates("large") == {}
+    assert "small" in index.containment_candidates("large", min_containment=0.2)
+    assert index.containment_candidates("missing") == {}
+
+
+def test_boilerplate_fingerprints_are_ignored():
+    boilerplate = winnow_fingerprints(" ".join(_words(100, 5)))
+    index = FingerprintIndex(max_posting_size=3)
+    for n in range(5):
+        index.add(f"f{n}", boilerplate)
+    assert index.containment_candidates("f0") == {}
+
+    unique = winnow_fingerprints(" ".join(_words(100, 6)))
+    index.add("a", boilerplate | unique)
+    index.add("b", unique)
+    assert index.containment_candidates("b") == {"a": 1.0}
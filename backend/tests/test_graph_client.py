@@ -0,0 +1,142 @@
+"""Microsoft Graph listing"""
+import asyncio
+import re
+
+import httpx
+import pytest
+
+from app.scanner import graph_client
+from app.scanner.graph_client import GraphClient
+
+
+TREE = {
+    "od": {"root": ["a.docx", ("sub", ["b.docx", ("deeper", ["c.pdf"])])]},
+    "lib": {"root": ["d.xlsx", "e.pptx"]},
+}
+
+
+def _children(drive_id, folder_id):
+    tree = TREE[drive_id]["root"]
+    if folder_id != "root":
+        def find(items):
+            for item in items:
+                if isinstance(item, tuple):
+                    if item[0] == folder_id:
+                        return item[1]
+                    found = find(item[1])
+                    if found is not None:
+                        return found
+        tree = find(tree)
+    values = []
+    for item in tree:
+        if isinstance(item, tuple):
+            values.append({"id": item[0], "name": item[0], "folder": {}})
+        else:
+            values.append({"id": f"{drive_id}-{item}", "name": item, "file": {}, "size": 1})
+    return {"value": values}
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    path = request.url.path.replace("/v1.0", "")
+    if path == "/me/drive":
+        return httpx.Response(200, json={"id": "od", "name": "OneDrive"})
+    if path == "/me/sites":
+        return httpx.Response(200, json={"value": [{"id": "site", "name": "Team"}]})
+    if path == "/sites/site/drives":
+        return httpx.Response(200, json={"value": [{"id": "lib", "name": "Documents"}]})
+    match = re.match(r"/drives/(\w+)/(?:root|items/(\w+))/children", path)
+    if match:
+        return httpx.Response(200, json=_children(match.group(1), match.group(2) or "root"))
+    return httpx.Response(404, json={"error": {"message": "not found"}})
+
+
+def _route_listings(monkeypatch, handler):
+    """Route listing clients to `handler`; fail if any call opens its own client"""
+    created = []
+    real_client = httpx.AsyncClient
+
+    def listing_client(concurrency):
+        client = real_client(transport=httpx.MockTransport(handler))
+        created.append(client)
+        return client
+
+    def no_client(*args, **kwargs):
+        raise AssertionError("listing call opened its own HTTP client")
+
+    monkeypatch.setattr(GraphClient, "_listing_client", staticmethod(listing_client))
+    monkeypatch.setattr(graph_client.httpx, "AsyncClient", no_client)
+    return created
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    return _route_listings(monkeypatch, handler)
+
+
+def test_iter_all_files_uses_one_client(clients):
+    async def main():
+        return [f async for f in GraphClient("token").iter_all_files(concurrency=3)]
+
+    files = asyncio.run(main())
+    assert sorted(f["name"] for f in files) == ["a.docx", "b.docx", "c.pdf", "d.xlsx", "e.pptx"]
+    assert len(clients) == 1
+    assert clients[0].is_closed
+
+
+def test_iter_files_opens_and_closes_one_client(clients):
+    async def main():
+        return [f async for f in GraphClient("token").iter_files("od", concurrency=2)]
+
+    assert sorted(f["name"] for f in asyncio.run(main())) == ["a.docx", "b.docx", "c.pdf"]
+    assert len(clients) == 1
+    assert clients[0].is_closed
+
+
+@pytest.mark.parametrize("concurrency", [1, 2])
+def test_iter_all_files_limits_calls_in_flight(monkeypatch, concurrency):
+    in_flight, peak = [0], [0]
+
+    async def slow_handler(request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return handler(request)
+
+    _route_listings(monkeypatch, slow_handler)
+
+    async def main():
+        return [f async for f in GraphClient("token").iter_all_files(concurrency=concurrency)]
+
+    assert len(asyncio.run(main())) == 5
+    assert peak[0] == concurrency
+
+
+def test_failing_drive_does_not_stop_the_others(monkeypatch):
+    def failing_handler(request):
+        if request.url.path.startswith("/v1.0/drives/lib/"):
+            return httpx.Response(403, json={"error": {"message": "Access denied"}})
+        return handler(request)
+
+    _route_listings(monkeypatch, failing_handler)
+
+    async def main():
+        return [f async for f in GraphClient("token").iter_all_files(concurrency=2)]
+
+    assert sorted(f["name"] for f in asyncio.run(main())) == ["a.docx", "b.docx", "c.pdf"]
+
+
+def test_stopping_early_cancels_every_listing(clients, monkeypatch):
+    monkeypatch.setattr(GraphClient, "LISTING_QUEUE_SIZE", 1)  # Every crawl is blocked on a full queue
+
+    async def main():
+        files = GraphClient("token").iter_all_files(concurrency=3)
+        first = await files.__anext__()
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(files.aclose(), 5)
+        leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return first, leftover
+
+    first, leftover = asyncio.run(main())
+    assert first["name"] and leftover == []
+    assert clients[0].is_closed
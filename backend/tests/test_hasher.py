@@ -0,0 +1,99 @@
+"""Content hashing"""
+import asyncio
+import os
+
+import pytest
+
+from app.scanner.hasher import (
+    HASH_ALGORITHMS,
+    compute_hash,
+    hash_async_stream,
+    hash_file_content,
+    tiered_content_hashes,
+)
+
+
+async def _chunks(content, size):
+    for start in range(0, len(content), size):
+        yield content[start:start + size]
+
+
+@pytest.mark.parametrize("algorithm", sorted(HASH_ALGORITHMS))
+def test_stream_hash_matches_full_hash(algorithm):
+    content = os.urandom(300_000)
+    digest = asyncio.run(hash_async_stream(_chunks(content, 7_000), algorithm, batch_size=50_000))
+    assert digest == compute_hash(content, algorithm)
+
+
+def test_downloaded_and_streamed_large_files_hash_alike():
+    # Over the 10MB sampling cutoff of compute_hash_optimized
+    content = os.urandom(11 * 1024 * 1024)
+    downloaded = asyncio.run(hash_file_content(content))
+    streamed = asyncio.run(hash_async_stream(_chunks(content, 1024 * 1024)))
+    assert downloaded == streamed == compute_hash(content)
+
+
+class FakeContent:
+    """Serves file bytes and records what the tiers fetched"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.ranges = []
+        self.streamed = []
+
+    def files(self):
+        return [{"id": file_id, "size": len(content)} for file_id, content in self.contents.items()]
+
+    async def fetch_range(self, file, start, end):
+        self.ranges.append(file["id"])
+        return self.contents[file["id"]][start:end + 1]
+
+    def stream_content(self, file):
+        self.streamed.append(file["id"])
+        return _chunks(self.contents[file["id"]], 4096)
+
+    def run(self, **kwargs):
+        return asyncio.run(tiered_content_hashes(
+            self.files(), self.fetch_range, self.stream_content, sample_size=64, **kwargs
+        ))
+
+
+def test_tiers_only_download_what_can_be_a_duplicate():
+    big = os.urandom(1000)
+    same_samples = bytearray(big)
+    same_samples[100] ^= 1  # Outside the head/middle/tail samples
+    content = FakeContent({
+        "unique": os.urandom(999),
+        "a": big,
+        "a-copy": big,
+        "a-variant": bytes(same_samples),
+        "b": os.urandom(1000),
+    })
+    hashes = content.run()
+
+    assert hashes["unique"] is None and "unique" not in content.ranges
+    # b has the same size but different samples: eliminated in tier 2
+    assert hashes["b"] is None and "b" not in content.streamed
+    assert sorted(content.streamed) == ["a", "a-copy", "a-variant"]
+    assert hashes["a"] == hashes["a-copy"] == compute_hash(big)
+    assert hashes["a-variant"] == compute_hash(bytes(same_samples)) != hashes["a"]
+
+
+def test_small_files_are_hashed_by_their_single_range():
+    small = os.urandom(150)
+    content = FakeContent({"x": small, "y": small, "z": os.urandom(150)})
+    hashes = content.run()
+
+    assert content.streamed == []
+    assert hashes["x"] == hashes["y"] == compute_hash(small)
+    assert hashes["z"] is None
+
+
+def test_known_sizes_force_a_full_hash():
+    big, small = os.urandom(1000), os.urandom(100)
+    content = FakeContent({"big": big, "small": small})
+
+    assert content.run() == {"big": None, "small": None}
+    hashes = content.run(known_sizes={1000, 100})
+    assert hashes == {"big": compute_hash(big), "small": compute_hash(small)}
+    assert content.streamed == ["big"]  # Small files need no more than their range
@@ -0,0 +1,60 @@
+"""Inference server handshake"""
+import os
+import stat
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import pytest
+
+from app.config import settings
+from app.scanner.inference_server import _authkey, authkey_path
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "inference_authkey", "")
+    return str(tmp_path / "inference.sock")
+
+
+def test_generated_key_is_private_and_shared(socket_path):
+    key = _authkey(socket_path, create=True)
+    assert len(key) == 64
+    assert stat.S_IMODE(os.stat(authkey_path(socket_path)).st_mode) == 0o600
+    assert _authkey(socket_path) == key
+    assert _authkey(socket_path, create=True) != key  # New key on every server start
+
+
+def test_configured_key_wins(socket_path, monkeypatch):
+    monkeypatch.setattr(settings, "inference_authkey", "secret")
+    assert _authkey(socket_path, create=True) == b"secret"
+    assert not os.path.exists(authkey_path(socket_path))
+
+
+def test_client_without_the_key_is_rejected(socket_path):
+    listener = Listener(socket_path, family="AF_UNIX", authkey=_authkey(socket_path, create=True))
+    accepted = []
+
+    def accept():
+        for _ in range(2):
+            try:
+                accepted.append(listener.accept())
+            except AuthenticationError:
+                accepted.append(None)
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    with pytest.raises(AuthenticationError):
+        Client(socket_path, family="AF_UNIX", authkey=b"wrong")
+    with Client(socket_path, family="AF_UNIX", authkey=_authkey(socket_path)) as conn:
+        thread.join(5)
+        accepted[1].send("hello")
+        assert conn.recv() == "hello"
+    assert accepted[0] is None
+    accepted[1].close()
+    listener.close()
+
+
+def test_client_needs_the_key_file(socket_path):
+    with pytest.raises(FileNotFoundError):
+        _authkey(socket_path)
@@ -0,0 +1,101 @@
+"""Micro-batching inference queue"""
+import threading
+
+import numpy as np
+import pytest
+
+from app.scanner.inference_service import MicroBatcher
+
+
+class RecordingBackend:
+    """Embeds each text as [len(text)]; can be held to let requests pile up"""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def encode(self, texts, show_progress_bar=False, batch_size=None):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append(list(texts))
+        if self.fail_on in texts:
+            raise ValueError(f"cannot encode {self.fail_on}")
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+def _batcher(backend, **kwargs):
+    kwargs.setdefault("workers", 1)
+    return MicroBatcher(backend, weight_for=lambda tenant: 1.0, **kwargs)
+
+
+def _hold(backend, batcher):
+    """Occupy the only worker until backend.release is set"""
+    backend.release.clear()
+    future = batcher.submit(["blocker"], tenant="other")
+    assert backend.started.wait(5)
+    return future
+
+
+def test_requests_queued_while_busy_share_one_batch():
+    backend = RecordingBackend()
+    batcher = _batcher(backend, max_batch_size=64, max_wait_ms=50)
+    blocker = _hold(backend, batcher)
+    futures = [batcher.submit([f"text{n}", "x" * n]) for n in range(3)]
+    backend.release.set()
+
+    blocker.result(5)
+    results = [future.result(5) for future in futures]
+    batcher.close()
+
+    assert backend.batches[1:] == [["text0", "", "text1", "x", "text2", "xx"]]
+    assert [r[:, 0].tolist() for r in results] == [[5.0, 0.0], [5.0, 1.0], [5.0, 2.0]]
+    assert batcher.stats == {"requests": 4, "texts": 7, "batches": 2}
+
+
+def test_small_tenant_is_not_starved_by_a_large_one():
+    backend = RecordingBackend()
+    batcher = _batcher(backend, max_batch_size=1, max_wait_ms=1)
+    _hold(backend, batcher)
+    futures = [batcher.submit([f"big{n}-{i}" for i in range(10)], tenant="big") for n in range(5)]
+    futures += [batcher.submit([f"small{n}"], tenant="small") for n in range(2)]
+    backend.release.set()
+
+    for future in futures:
+        future.result(5)
+    batcher.close()
+
+    order = [batch[0].split("-")[0] for batch in backend.batches[1:]]
+    assert order[:3] == ["big0", "small0", "small1"]
+
+
+def test_errors_reach_every_request_of_the_batch():
+    backend = RecordingBackend(fail_on="bad")
+    batcher = _batcher(backend, max_wait_ms=50)
+    blocker = _hold(backend, batcher)
+    good, bad = batcher.submit(["good"]), batcher.submit(["bad"])
+    backend.release.set()
+
+    blocker.result(5)
+    for future in (good, bad):
+        with pytest.raises(ValueError):
+            future.result(5)
+    # The worker slot was released: later requests are served
+    assert batcher.encode(["again"]).tolist() == [[5.0]]
+    batcher.close()
+
+
+def test_close_drains_queue_then_rejects_new_requests():
+    backend = RecordingBackend()
+    batcher = _batcher(backend)
+    blocker = _hold(backend, batcher)
+    queued = batcher.submit(["queued"])
+    threading.Timer(0.05, backend.release.set).start()
+    batcher.close()
+
+    assert blocker.done() and queued.result(0).tolist() == [[6.0]]
+    with pytest.raises(RuntimeError):
+        batcher.submit(["late"])
+    assert batcher.submit([]).result(0).shape == (0, 0)
@@ -0,0 +1,33 @@
+"""Shared scan job store"""
+import pytest
+
+from app.scanner.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_job_ids_are_random(store):
+    ids = {store.create() for _ in range(50)}
+    assert len(ids) == 50
+    assert all(len(job_id) == 32 for job_id in ids)
+
+
+def test_job_of_dead_worker_is_reported_failed(store):
+    job_id = store.create(status="running")
+    store._execute("UPDATE jobs SET pid = ? WHERE job_id = ?", (2 ** 22 + 12345, job_id))
+    assert store.get(job_id)["status"] == "failed"
+    assert not store.request_cancel(job_id)
+
+
+def test_cancel_only_running_jobs(store):
+    job_id = store.create()
+    assert store.request_cancel(job_id)
+    assert store.is_cancel_requested(job_id)
+    store.finish(job_id, None, status="cancelled")
+    assert not store.request_cancel(job_id)
+    assert not store.request_cancel("unknown")
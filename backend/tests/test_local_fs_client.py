@@ -0,0 +1,121 @@
+"""Local filesystem scans"""
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import scan as scan_routes
+from app.config import settings
+from app.scanner import job_store, scheduler
+from app.scanner.hasher import compute_hash
+from app.scanner.job_store import JobStore
+from app.scanner.local_fs_client import LocalFileSystemClient, hash_path_mmap, scan_local_files
+from app.scanner.scan_budget import ScanBudget
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for n in range(5):
+        _write(tmp_path / "root" / f"file{n}.bin", os.urandom(100))
+    return tmp_path / "root"
+
+
+def _scan(root, **kwargs):
+    files = []
+    results = asyncio.run(scan_local_files(LocalFileSystemClient([str(root)]), processed_files=files, **kwargs))
+    return results, files
+
+
+def test_budget_limits_files_and_bytes(tree):
+    results, files = _scan(tree, budget=ScanBudget(max_files=2))
+    assert len(files) == 2 and results["files_processed"] == 2
+    assert results["partial"] and results["stopped_reason"] == "max_files"
+
+    budget = ScanBudget(max_bytes=250)
+    results, files = _scan(tree, budget=budget)
+    assert len(files) == 2 and results["files_failed"] == 0
+    assert results["partial"] and results["stopped_reason"] == "max_bytes"
+    assert budget.bytes_downloaded == 200
+
+
+def test_cancelled_scan_reads_nothing_more(tree):
+    budget = ScanBudget()
+    budget.stop("cancelled", halt=True)
+    results, files = _scan(tree, budget=budget)
+    assert files == [] and results["partial"]
+    assert results["stopped_reason"] == "cancelled"
+
+
+def test_scan_local_route_applies_request_budget(tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "local_scan_roots", [str(tree)])
+    monkeypatch.setattr(job_store, "_job_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(scheduler, "_scheduler", None)
+    app = FastAPI()
+    app.include_router(scan_routes.router)
+
+    response = TestClient(app).post("/scan-local", json={"max_files": 3})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["files_processed"] == 3 and body["partial"]
+    assert job_store.get_job_store().get(body["scan_id"])["status"] == "completed"
+
+
+def test_walk_lists_each_file_once(tmp_path):
+    root = tmp_path / "root"
+    _write(root / "a.txt", b"alpha")
+    _write(root / "sub" / "deeper" / "b.txt", b"beta")
+    _write(root / "empty.txt", b"")
+    os.link(root / "a.txt", root / "sub" / "a-hardlink.txt")
+    os.symlink(root / "a.txt", root / "a-symlink.txt")
+    os.symlink(root, root / "sub" / "loop")
+    client = LocalFileSystemClient([str(root)])
+
+    files = asyncio.run(client.list_all_files())
+    assert sorted(f["name"] for f in files) in (["a.txt", "b.txt"], ["a-hardlink.txt", "b.txt"])
+    record = next(f for f in files if f["name"] == "b.txt")
+    assert record["size"] == 4 and record["mime_type"] == "text/plain"
+    assert record["last_modified"].endswith("Z") and record["web_url"].startswith("file://")
+
+    top_level = asyncio.run(client.list_all_files([str(root)], include_subfolders=False))
+    assert [f["name"] for f in top_level] == ["a.txt"]
+
+
+def test_paths_outside_the_roots_are_rejected(tmp_path):
+    client = LocalFileSystemClient([str(tmp_path / "root")])
+    with pytest.raises(PermissionError):
+        asyncio.run(client.list_all_files([str(tmp_path)]))
+    with pytest.raises(PermissionError):
+        asyncio.run(client.list_all_files([str(tmp_path / "root" / ".." / "other")]))
+
+
+@pytest.mark.parametrize("size", [0, 1, 3 * 1024 * 1024 + 7])
+def test_mmap_hash_matches_in_memory_hash(tmp_path, size):
+    content = os.urandom(size)
+    _write(tmp_path / "file", content)
+    for algorithm in ("sha256", "blake2b"):
+        assert hash_path_mmap(str(tmp_path / "file"), algorithm) == compute_hash(content, algorithm)
+
+
+def test_copies_are_grouped_and_empty_files_ignored(tmp_path):
+    root = tmp_path / "root"
+    content = os.urandom(5000)
+    _write(root / "report.bin", content)
+    _write(root / "backup" / "report copy.bin", content)
+    _write(root / "other.bin", os.urandom(5000))
+    for n in range(3):
+        _write(root / f"empty{n}.txt", b"")
+
+    results, files = _scan(root)
+    assert results["files_processed"] == 3
+    assert len(results["exact_duplicates"]) == 1
+    group = results["exact_duplicates"][0]
+    names = {group["primary_file"]["name"]} | {f["name"] for f in group["duplicate_files"]}
+    assert names == {"report.bin", "report copy.bin"}
+    assert group["storage_savings_bytes"] == 5000
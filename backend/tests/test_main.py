@@ -0,0 +1,51 @@
+"""Health and readiness endpoints"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.scanner import content_similarity, duplicate_finder
+
+
+@pytest.fixture
+def client():
+    # Not used as a context manager: the lifespan (model warm-up) does not run
+    return TestClient(main.app)
+
+
+def test_ready_is_503_before_the_model_loads(client, monkeypatch):
+    monkeypatch.setattr(duplicate_finder, "_content_similarity", None)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_loaded"
+
+
+def test_ready_reports_a_failed_model(client, monkeypatch):
+    monkeypatch.setattr(content_similarity, "EMBEDDINGS_AVAILABLE", False)
+    content_sim = content_similarity.ContentSimilarity(backend="onnx", use_remote=False)
+    assert content_sim.model is None
+    monkeypatch.setattr(duplicate_finder, "_content_similarity", content_sim)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "model_failed"
+    assert response.json()["backend"] == "onnx"
+
+
+def test_ready_without_sentence_transformers_uses_tfidf(client, monkeypatch):
+    monkeypatch.setattr(content_similarity, "EMBEDDINGS_AVAILABLE", False)
+    content_sim = content_similarity.ContentSimilarity(backend="torch", use_remote=False)
+    monkeypatch.setattr(duplicate_finder, "_content_similarity", content_sim)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "model_ready": False, "backend": "tfidf"}
+
+
+def test_ready_with_model(client, monkeypatch):
+    content_sim = SimpleNamespace(model=object(), backend_name="torch", load_error=None)
+    monkeypatch.setattr(duplicate_finder, "_content_similarity", content_sim)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["model_ready"] is True
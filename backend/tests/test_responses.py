@@ -0,0 +1,54 @@
+"""Compact scan response format and JSON encoding"""
+import gzip
+import json
+
+from app.api.responses import compact_results, encode_json_gzip, strip_file_fields
+
+
+def _file(file_id):
+    return {"id": file_id, "name": f"{file_id}.pdf", "extracted_text": "text", "fingerprints": {1, 2}}
+
+
+def _results():
+    a, b, c, d = (_file(n) for n in "abcd")
+    return {
+        "total_files": 5,
+        "exact_duplicates": [{"primary_file": a, "duplicate_files": [b], "similarity": 1.0}],
+        "superset_subset_duplicates": [{"primary_file": c, "duplicate_files": [a], "containment": 0.9}],
+        "near_duplicates": [{"primary_file": b, "duplicate_files": [c, d], "similarity": 0.8}],
+    }
+
+
+def test_compact_lists_each_grouped_file_once():
+    results = _results()
+    compact = compact_results(results)
+
+    assert compact["format"] == "compact" and compact["total_files"] == 5
+    assert [f["id"] for f in compact["files"]] == ["a", "b", "c", "d"]
+
+    # Expanding the references gives back the original groups
+    for key in ("exact_duplicates", "superset_subset_duplicates", "near_duplicates"):
+        for original, group in zip(results[key], compact[key]):
+            assert compact["files"][group["primary"]] is original["primary_file"]
+            assert [compact["files"][n] for n in group["duplicates"]] == original["duplicate_files"]
+            assert "primary_file" not in group and "duplicate_files" not in group
+    assert compact["superset_subset_duplicates"][0]["containment"] == 0.9
+
+
+def test_compact_handles_missing_group_lists():
+    compact = compact_results({"total_files": 0})
+    assert compact["files"] == [] and compact["near_duplicates"] == []
+
+
+def test_strip_file_fields():
+    files = [_file("a")]
+    strip_file_fields(files, include_text=True)
+    assert files[0] == {"id": "a", "name": "a.pdf", "extracted_text": "text"}
+    strip_file_fields(files)
+    assert files[0] == {"id": "a", "name": "a.pdf"}
+
+
+def test_gzip_body_decodes_to_the_same_json():
+    compact = compact_results(_results())
+    strip_file_fields(compact["files"])
+    assert json.loads(gzip.decompress(encode_json_gzip(compact))) == json.loads(json.dumps(compact))
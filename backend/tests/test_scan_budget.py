@@ -0,0 +1,91 @@
+"""Per-scan budgets and cancellation"""
+import asyncio
+
+import pytest
+
+from app.scanner import scan_budget
+from app.scanner.scan_budget import ScanBudget, ScanStopped, effective_limit
+
+
+async def _chunks(count, size):
+    for _ in range(count):
+        yield b"x" * size
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_effective_limit():
+    assert effective_limit(0, None) == 0
+    assert effective_limit(100, None) == 100
+    assert effective_limit(0, 50) == 50
+    assert effective_limit(100, 500) == 100
+
+
+def test_byte_limit_latches_without_halting():
+    budget = ScanBudget(max_bytes=1000)
+    budget.reserve_download(600)
+    assert asyncio.run(budget.fetch(lambda: asyncio.sleep(0, b"x" * 600))) == b"x" * 600
+
+    with pytest.raises(ScanStopped) as stopped:
+        budget.reserve_download(600)
+    assert stopped.value.reason == "max_bytes"
+    with pytest.raises(ScanStopped):
+        budget.check()  # Latched for every later download
+    assert budget.partial and not budget.should_stop()  # Detection still runs
+
+
+def test_stream_stops_once_over_budget():
+    budget = ScanBudget(max_bytes=250)
+    with pytest.raises(ScanStopped):
+        asyncio.run(_collect(budget.stream(_chunks(10, 100))))
+    assert budget.bytes_downloaded == 300
+
+
+def test_text_budget():
+    budget = ScanBudget(max_text_bytes=100)
+    budget.reserve_text(60)
+    with pytest.raises(ScanStopped):
+        budget.reserve_text(60)
+    assert budget.text_bytes == 60 and budget.reason == "max_text_bytes"
+
+
+def test_file_limit_truncates_without_stopping():
+    budget = ScanBudget(max_files=2)
+    assert budget.limit_files([1, 2, 3]) == [1, 2]
+    assert budget.partial and budget.reason == "max_files"
+    budget.check()
+    assert ScanBudget().limit_files([1, 2, 3]) == [1, 2, 3]
+
+
+def test_cancellation_is_polled_and_halts():
+    cancelled = []
+    budget = ScanBudget(cancel_check=lambda: bool(cancelled), cancel_poll_interval=0)
+    assert not budget.should_stop()
+    cancelled.append(True)
+    assert budget.should_stop()
+    assert budget.reason == "cancelled"
+    with pytest.raises(ScanStopped):
+        budget.check()
+
+
+def test_halt_overrides_an_earlier_download_stop():
+    budget = ScanBudget()
+    budget.stop("max_bytes")
+    assert not budget.should_stop()
+    budget.stop("cancelled", halt=True)
+    assert budget.should_stop() and budget.reason == "cancelled"
+
+
+def test_deadline_counts_from_start(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scan_budget.time, "monotonic", lambda: now[0])
+    budget = ScanBudget(max_seconds=10)
+    now[0] += 30  # Queued before admission
+    budget.start()
+    now[0] += 5
+    assert not budget.should_stop()
+    now[0] += 6
+    assert budget.should_stop() and budget.reason == "max_seconds"
+    assert budget.usage()["limits"]["max_seconds"] == 10
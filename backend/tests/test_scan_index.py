@@ -0,0 +1,143 @@
+"""Scan index reuse across scans"""
+import asyncio
+import os
+
+import pytest
+
+from app.api.routes import scan as scan_routes
+from app.config import settings
+from app.scanner import scan_index as scan_index_module
+from app.scanner.hasher import compute_hash
+from app.scanner.scan_budget import ScanBudget
+from app.scanner.scan_index import ScanIndex
+
+
+class FakeDrive:
+    """In-memory stand-in for GoogleDriveClient's download methods"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.downloads = []
+
+    async def get_file_content(self, file_id):
+        self.downloads.append(("full", file_id))
+        return self.contents[file_id]
+
+    async def get_file_range(self, file_id, start, end):
+        self.downloads.append(("range", file_id))
+        return self.contents[file_id][start:end + 1]
+
+    async def stream_file_content(self, file_id, chunk_size=4096):
+        self.downloads.append(("stream", file_id))
+        content = self.contents[file_id]
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+
+def _listing(contents):
+    return [
+        {"id": file_id, "name": f"{file_id}.bin", "size": len(content), "mime_type": "application/octet-stream",
+         "last_modified": "2024-01-01T00:00:00Z", "etag": f"etag-{file_id}"}
+        for file_id, content in contents.items()
+    ]
+
+
+@pytest.fixture
+def scan_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "scan_index_path", str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(settings, "tiered_hash_min_size", 1024)
+    monkeypatch.setattr(scan_index_module, "_scan_index", None)
+    yield scan_index_module.get_scan_index()
+    scan_index_module._scan_index.close()
+    scan_index_module._scan_index = None
+
+
+def test_rescan_finds_new_copy_of_reused_file(scan_index):
+    original = os.urandom(50_000)
+    contents = {"a": original, "b": original, "other": os.urandom(60_000)}
+    drive = FakeDrive(contents)
+    first, _ = asyncio.run(scan_routes.process_drive_files(drive, _listing(contents)))
+    assert {f["id"]: f["content_hash"] for f in first}["a"] == compute_hash(original)
+
+    # Second scan: a and b come from the index, c is a new copy of them
+    contents["c"] = original
+    drive = FakeDrive(contents)
+    second, errors = asyncio.run(scan_routes.process_drive_files(drive, _listing(contents)))
+
+    hashes = {f["id"]: f["content_hash"] for f in second}
+    assert not errors
+    assert hashes["a"] == hashes["b"] == hashes["c"] == compute_hash(original)
+    assert hashes["other"] is None
+    assert not any(file_id in ("a", "b") for _, file_id in drive.downloads)
+    assert ("stream", "c") in drive.downloads
+
+
+def test_rescan_skips_files_without_same_size_match(scan_index):
+    contents = {"a": os.urandom(50_000), "b": os.urandom(70_000)}
+    asyncio.run(scan_routes.process_drive_files(FakeDrive(contents), _listing(contents)))
+
+    contents["c"] = os.urandom(90_000)
+    drive = FakeDrive(contents)
+    files, _ = asyncio.run(scan_routes.process_drive_files(drive, _listing(contents)))
+
+    assert {f["id"]: f["content_hash"] for f in files}["c"] is None
+    assert drive.downloads == []
+
+
+def test_reused_text_counts_against_budget(scan_index):
+    contents = {name: (name * 100).encode() for name in ("a", "b", "c")}
+    listing = [dict(f, name=f"{f['id']}.txt", mime_type="text/plain") for f in _listing(contents)]
+    first, _ = asyncio.run(scan_routes.process_drive_files(FakeDrive(contents), listing))
+    assert all(f["extracted_text"] for f in first)
+
+    drive = FakeDrive(contents)
+    budget = ScanBudget(max_text_bytes=250)
+    listing = [dict(f, name=f"{f['id']}.txt", mime_type="text/plain") for f in _listing(contents)]
+    second, _ = asyncio.run(scan_routes.process_drive_files(drive, listing, budget=budget))
+
+    assert [f["id"] for f in second] == ["a", "b"]
+    assert budget.stopped_reason == "max_text_bytes"
+    assert budget.text_bytes == 200
+    assert drive.downloads == []
+
+
+def _record(**overrides):
+    record = {"id": "f1", "last_modified": "2024-01-01T00:00:00Z", "size": 100, "etag": "e1",
+              "content_hash": "h1", "extracted_text": "some text", "fingerprints": {3, 1, 2}}
+    record.update(overrides)
+    return record
+
+
+def test_lookup_round_trips_text_and_fingerprints(tmp_path):
+    index = ScanIndex(str(tmp_path / "index.sqlite"))
+    index.store_many("drive", [_record(), _record(id="f2", extracted_text=None, fingerprints=None)])
+
+    hits = index.lookup_many("drive", [_record(), _record(id="f2")])
+    assert hits["f1"] == {"content_hash": "h1", "extraction_status": "ok",
+                          "extracted_text": "some text", "fingerprints": {1, 2, 3}}
+    assert hits["f2"]["extraction_status"] == "none" and hits["f2"]["extracted_text"] is None
+    assert index.lookup_many("other-provider", [_record()]) == {}
+    index.close()
+
+
+@pytest.mark.parametrize("change", [
+    {"last_modified": "2024-02-01T00:00:00Z"},
+    {"size": 101},
+    {"etag": "e2"},
+])
+def test_changed_files_are_not_reused(tmp_path, change):
+    index = ScanIndex(str(tmp_path / "index.sqlite"))
+    index.store_many("drive", [_record()])
+    assert index.lookup_many("drive", [_record(**change)]) == {}
+    # Providers without ETags still match on modified time and size
+    assert "f1" in index.lookup_many("drive", [_record(etag=None)])
+    index.close()
+
+
+def test_records_without_stored_text_are_not_reused(tmp_path):
+    index = ScanIndex(str(tmp_path / "index.sqlite"), store_text=False)
+    index.store_many("drive", [_record(), _record(id="f2", extracted_text=None), _record(id="f3", content_hash=None)])
+
+    hits = index.lookup_many("drive", [_record(), _record(id="f2"), _record(id="f3")])
+    assert list(hits) == ["f2"]  # Text files must be downloaded again; f3 was never stored
+    index.close()
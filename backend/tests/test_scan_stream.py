@@ -0,0 +1,88 @@
+"""Streaming scan endpoint"""
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import scan as scan_routes
+from app.config import settings
+from app.scanner import job_store, scheduler
+from app.scanner.job_store import JobStore
+
+
+CONTENTS = {
+    "a": b"quarterly report on regional sales figures and targets",
+    "b": b"quarterly report on regional sales figures and targets",
+    "c": b"minutes of the weekly engineering meeting",
+}
+
+
+class FakeDrive:
+    def __init__(self, token):
+        self.token = token
+
+    async def list_all_files(self, folder_ids=None, include_subfolders=True, mode=None):
+        return [
+            {"id": file_id, "name": f"{file_id}.txt", "size": len(content), "mime_type": "text/plain",
+             "last_modified": "2024-01-01T00:00:00Z"}
+            for file_id, content in CONTENTS.items()
+        ]
+
+    async def get_file_content(self, file_id):
+        return CONTENTS[file_id]
+
+    def stream_file_content(self, file_id):
+        raise AssertionError("not expected")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "scan_index_path", "")
+    monkeypatch.setattr(scan_routes, "GoogleDriveClient", FakeDrive)
+    monkeypatch.setattr(job_store, "_job_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(scheduler, "_scheduler", None)
+    app = FastAPI()
+    app.include_router(scan_routes.router)
+    return TestClient(app)
+
+
+def _events(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_reports_progress_groups_and_summary(client):
+    response = client.post("/scan/stream", json={"google_token": "token", "folder_ids": ["root"]})
+    assert response.status_code == 200
+    events = _events(response)
+
+    scan_id = events[0].pop("scan_id")
+    assert events[0] == {"event": "progress", "stage": "accepted"}
+    assert events[-1]["event"] == "summary"
+    assert events[-1]["status"] == "completed"
+    assert events[-1]["total_duplicate_groups"] == 1
+
+    processing = [e["processed"] for e in events if e.get("stage") == "processing"]
+    assert processing == sorted(processing)
+    assert processing[-1] == len(CONTENTS)
+    groups = [e for e in events if e["event"] == "group"]
+    assert [g["stage"] for g in groups] == ["exact"]
+    assert "extracted_text" not in groups[0]["group"]["primary_file"]
+    assert [e["stage"] for e in events if e["event"] == "stage_complete"] == ["exact", "superset_subset", "near"]
+
+    assert scheduler.get_scheduler().scans.in_use == 0
+    assert job_store.get_job_store().get(scan_id)["status"] == "completed"
+
+
+def test_stream_rejects_unknown_format(client):
+    response = client.post("/scan/stream?format=xml", json={"google_token": "token", "folder_ids": ["root"]})
+    assert response.status_code == 400
+
+
+def test_stream_and_scan_share_results(client):
+    body = {"google_token": "token", "folder_ids": ["root"]}
+    summary = _events(client.post("/scan/stream", json=body))[-1]
+    result = client.post("/scan", json=body).json()
+
+    for key in ("total_files", "total_duplicate_groups", "total_duplicate_files", "files_processed", "status"):
+        assert summary[key] == result[key]
@@ -0,0 +1,90 @@
+"""Weighted fair scan admission"""
+import asyncio
+
+import pytest
+
+from app.scanner.scheduler import FairSemaphore, ScanScheduler, current_tenant, tenant_key
+
+
+async def _service_order(semaphore, requests):
+    """Queue (tenant, cost) requests behind a held slot and return the order they are served in"""
+    order = []
+
+    async def worker(tenant, cost):
+        await semaphore.acquire(tenant, cost)
+        order.append(tenant)
+        await asyncio.sleep(0)
+        semaphore.release()
+
+    await semaphore.acquire("holder")
+    tasks = []
+    for tenant, cost in requests:
+        tasks.append(asyncio.create_task(worker(tenant, cost)))
+        await asyncio.sleep(0)  # Enqueue in this order
+    semaphore.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_flooding_tenant_only_delays_itself():
+    semaphore = FairSemaphore(1, weight_for=lambda tenant: 1.0)
+    order = asyncio.run(_service_order(semaphore, [("a", 1)] * 4 + [("b", 1)] * 2))
+    assert order == ["a", "b", "a", "b", "a", "a"]
+
+
+def test_weights_share_slots_proportionally():
+    weights = {"heavy": 2.0, "light": 1.0}
+    semaphore = FairSemaphore(1, weight_for=lambda tenant: weights.get(tenant, 1.0))
+    order = asyncio.run(_service_order(semaphore, [("heavy", 1)] * 6 + [("light", 1)] * 3))
+    assert order[:6].count("heavy") == 4
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        semaphore = FairSemaphore(1, weight_for=lambda tenant: 1.0)
+        await semaphore.acquire("a")
+        waiter = asyncio.create_task(semaphore.acquire("b"))
+        await asyncio.sleep(0)
+        assert semaphore.waiting == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        semaphore.release()
+        return semaphore.in_use, semaphore.waiting
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_on_wait_reports_position_and_can_abandon():
+    async def scenario():
+        semaphore = FairSemaphore(1, weight_for=lambda tenant: 1.0)
+        await semaphore.acquire("a")
+        positions = []
+
+        def on_wait(position):
+            positions.append(position)
+            if len(positions) == 2:
+                raise RuntimeError("cancelled by client")
+
+        with pytest.raises(RuntimeError):
+            await semaphore.acquire("b", on_wait=on_wait, poll_interval=0.01)
+        semaphore.release()
+        return positions, semaphore.in_use
+
+    assert asyncio.run(scenario()) == ([1, 1], 0)
+
+
+def test_admitted_sets_current_tenant():
+    async def scenario():
+        scheduler = ScanScheduler(max_scans=1, download_slots=2)
+        async with scheduler.admitted("t1"):
+            inside = current_tenant.get(), scheduler.stats()["scans_running"]
+        return inside, current_tenant.get(), scheduler.stats()["scans_running"]
+
+    assert asyncio.run(scenario()) == (("t1", 1), None, 0)
+
+
+def test_tenant_key():
+    assert tenant_key("token", "explicit") == "explicit"
+    assert tenant_key("token") == tenant_key("token") != tenant_key("other")
+    assert "token" not in tenant_key("token")[len("token:"):]
@@ -0,0 +1,73 @@
+"""Tiled similarity search against dense all-pairs cosine similarity"""
+from itertools import combinations
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from app.scanner.similarity_search import similar_pairs, tiled_similarity
+
+
+def _embeddings(seed=0):
+    rng = np.random.default_rng(seed)
+    cluster = rng.normal(size=(1, 24)) + 0.1 * rng.normal(size=(40, 24))
+    return np.vstack([cluster, rng.normal(size=(60, 24))]).astype(np.float32)
+
+
+def _dense_pairs(embeddings, threshold):
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = normalized @ normalized.T
+    return {
+        (i, j): float(scores[i, j])
+        for i, j in combinations(range(len(embeddings)), 2)
+        if scores[i, j] >= threshold
+    }
+
+
+def _assert_same_pairs(pairs, expected):
+    assert set(pairs) == set(expected)
+    for key, value in expected.items():
+        assert pairs[key] == pytest.approx(value, abs=1e-5)
+
+
+@pytest.mark.parametrize("block_size", [7, 1024])
+def test_tiled_top_k_matches_dense(block_size):
+    embeddings = _embeddings()
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    dense = normalized @ normalized.T
+    np.fill_diagonal(dense, -np.inf)
+
+    graph = tiled_similarity(embeddings, top_k=5, block_size=block_size).toarray()
+    for row in range(len(embeddings)):
+        kept = np.flatnonzero(graph[row])
+        assert row not in kept
+        assert sorted(kept) == sorted(np.argsort(-dense[row])[:5])
+
+
+def test_similar_pairs_without_cap_matches_dense():
+    embeddings = _embeddings()
+    _assert_same_pairs(similar_pairs(embeddings, 0.6, top_k=None, block_size=16), _dense_pairs(embeddings, 0.6))
+
+
+def test_similar_pairs_rescans_rows_that_hit_the_cap():
+    # Every row of the 40-member cluster has more than 3 neighbours above the threshold
+    embeddings = _embeddings()
+    expected = _dense_pairs(embeddings, 0.6)
+    assert len(expected) > 3 * 40
+    _assert_same_pairs(similar_pairs(embeddings, 0.6, top_k=3, block_size=16), expected)
+
+
+def test_similar_pairs_accepts_sparse_rows():
+    embeddings = _embeddings()
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    pairs = similar_pairs(sparse.csr_matrix(normalized), 0.6, top_k=4, block_size=9)
+    _assert_same_pairs(pairs, _dense_pairs(embeddings, 0.6))
+
+
+def test_tiled_similarity_needs_a_limit():
+    with pytest.raises(ValueError):
+        tiled_similarity(_embeddings(), top_k=None, threshold=None)
+
+
+def test_tiled_similarity_empty_input():
+    assert tiled_similarity(np.zeros((0, 8)), top_k=3).shape == (0, 0)
@@ -0,0 +1,58 @@
+"""Batched chunk containment scoring"""
+import numpy as np
+import pytest
+
+from app.scanner.superset_detector import _allowed_misses, _normalize_rows, containment_scores_batch
+
+
+def _naive_containment(smaller, larger, threshold):
+    contained = 0
+    for row in smaller:
+        if max(float(row @ other) for other in larger) >= threshold:
+            contained += 1
+    return contained / len(smaller)
+
+
+def _candidates(rng, smaller, count):
+    candidates = []
+    for n in range(count):
+        noise = _normalize_rows(rng.normal(size=(int(rng.integers(1, 20)), smaller.shape[1])))
+        keep = smaller[rng.random(len(smaller)) < n / count]  # From none to all of the chunks
+        candidates.append(np.vstack([noise, keep]) if len(keep) else noise)
+    return candidates
+
+
+def test_batch_matches_naive_pairwise():
+    rng = np.random.default_rng(0)
+    smaller = _normalize_rows(rng.normal(size=(25, 16)))
+    candidates = _candidates(rng, smaller, 12)
+
+    scores = containment_scores_batch(smaller, candidates, threshold=0.98, block_size=4)
+    expected = [_naive_containment(smaller, larger, 0.98) for larger in candidates]
+    assert scores == pytest.approx(expected)
+
+
+def test_early_exit_keeps_reachable_scores_exact():
+    rng = np.random.default_rng(1)
+    smaller = _normalize_rows(rng.normal(size=(40, 16)))
+    candidates = _candidates(rng, smaller, 10)
+
+    exact = containment_scores_batch(smaller, candidates, threshold=0.98)
+    bounded = containment_scores_batch(smaller, candidates, threshold=0.98, min_containment=0.6, block_size=8)
+    for full, early in zip(exact, bounded):
+        if full >= 0.6:
+            assert early == pytest.approx(full)
+        else:
+            assert early < 0.6
+
+
+def test_empty_inputs():
+    assert containment_scores_batch(np.zeros((0, 4)), [np.ones((2, 4))]) == [0.0]
+    assert containment_scores_batch(np.ones((2, 4)), []) == []
+
+
+def test_allowed_misses():
+    assert _allowed_misses(10, None) == 10
+    assert _allowed_misses(10, 0.6) == 4
+    assert _allowed_misses(10, 0.7) == 3  # Not 2 from floating-point error
+    assert _allowed_misses(10, 1.0) == 0